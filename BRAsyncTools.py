@@ -0,0 +1,194 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+import httpx
+import pandas as pd
+import requests
+import BRWebscrapeTools as br
+import Instrumentation
+from BRFetchTools import cachedFetch
+
+'''
+BRAsyncTools is an asyncio counterpart of the fetch layer in BRFetchTools, for code that runs in
+an event loop or downloads many pages at once: requests go through one httpx.AsyncClient (a pool
+of keep-alive connections), with a bound on simultaneous requests and a per-host rate limit, and
+share the on-disk ResponseCache of BRFetchTools and its cache logic (BRFetchTools.cachedFetch),
+with the cache's disk I/O run in worker threads so that it does not block the event loop. It also
+contains async versions of the BRWebscrapeTools extractors (HiFOPredict.createAsync is the async
+constructor of HiFOPredict).
+The blocking functions of BRWebscrapeTools and HiFOPredict are unchanged.
+
+Usage:
+    async with AsyncBRFetcher(BRFetchTools.defaultCache(),requestsPerSecond=5.) as fetcher:
+        seasonTable,missingMonths = await extractSeasonsGames('2021',brURL,fetcher)
+'''
+
+class AsyncRateLimiter:
+    '''
+    AsyncRateLimiter spaces out requests so that no more than requestsPerSecond requests are
+    started per second against any single host (the asyncio version of BRFetchTools.RateLimiter).
+    '''
+    def __init__(self,requestsPerSecond=None):
+        self.interval = 1./requestsPerSecond if requestsPerSecond else 0.
+        self._nextSlot = {} # host -> earliest time at which the next request may start
+
+    async def wait(self,url):
+        if self.interval == 0.:
+            return
+        host = urlsplit(url).netloc
+        now = time.monotonic()
+        slot = max(now,self._nextSlot.get(host,now))
+        self._nextSlot[host] = slot + self.interval # reserve this slot (no await in between)
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class AsyncBRFetcher:
+    '''
+    AsyncBRFetcher downloads pages through a ResponseCache with an httpx.AsyncClient. To be used
+    within one event loop; close it with aclose() (or use it as an async context manager).
+    '''
+    def __init__(self,cache=None,requestsPerSecond=None,maxConcurrency=16,timeout=30.):
+        '''
+        cache - BRFetchTools.ResponseCache to use (None to disable caching)
+        requestsPerSecond - maximum request rate per host (None for no limit)
+        maxConcurrency - maximum number of simultaneous requests (and of open connections)
+        timeout - seconds before a request fails
+        '''
+        self.cache = cache
+        self.limiter = AsyncRateLimiter(requestsPerSecond)
+        self.maxConcurrency = maxConcurrency
+        self.client = httpx.AsyncClient(limits=httpx.Limits(max_connections=maxConcurrency,
+                                                            max_keepalive_connections=maxConcurrency),
+                                        timeout=timeout)
+        self._semaphore = asyncio.Semaphore(maxConcurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self,*args):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def _get(self,url,headers=None):
+        async with self._semaphore:
+            await self.limiter.wait(url)
+            return await self.client.get(url,headers=headers)
+
+    async def fetch(self,url):
+        '''
+        fetch returns a BRFetchTools.FetchResult for url, served from the cache when the cached copy
+        is fresh or the server confirms it is unchanged (as BRFetcher.fetch).
+        '''
+        if not Instrumentation.enabled():
+            return await self._fetch(url)
+        tic = time.perf_counter()
+        result = await self._fetch(url)
+        Instrumentation.recordFetch(url,time.perf_counter() - tic,
+                                    len(result.text.encode('utf-8')) if result.text is not None else 0,
+                                    'cache' if result.fromCache else 'download' if result.status == 200 else 'error')
+        return result
+
+    async def _fetch(self,url):
+        # BRFetchTools.runFetch with awaited requests, and cache disk I/O off the event loop
+        steps = cachedFetch(self.cache,url)
+        try:
+            step = next(steps)
+            while True:
+                if step[0] == 'cache':
+                    result = await asyncio.to_thread(step[1],*step[2])
+                else:
+                    result = await self._get(url,step[1])
+                step = steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+
+    async def fetchText(self,url):
+        '''
+        fetchText returns the html of url. Raises requests.HTTPError (as BRFetcher.fetchText) if the
+        server does not return a successful status code.
+        '''
+        result = await self.fetch(url)
+        if result.status != 200:
+            raise requests.HTTPError(str(result.status)+' Error for url: '+url)
+        return result.text
+
+    async def fetchPages(self,urls):
+        '''
+        fetchPages downloads a list of pages concurrently (at most maxConcurrency at a time).
+
+        Outputs:
+        pages - list of html strings, in the same order as urls
+        '''
+        return list(await asyncio.gather(*[self.fetchText(url) for url in urls]))
+
+'''
+ASYNC EXTRACTORS
+'''
+async def extractMonthsGames(url,fetcher):
+    '''
+    extractMonthsGames is the async version of BRWebscrapeTools.extractMonthsGames.
+
+    Inputs:
+    url - the URL of BR webpage for a specific month of a specific season
+    fetcher - AsyncBRFetcher
+
+    Outputs:
+    processedTable - Table containing each matchup and outcome (None if a team name did not match)
+    '''
+    return br.processMonthPage(await fetcher.fetchText(url),url)
+
+async def extractSeasonsGames(season,brURL,fetcher):
+    '''
+    extractSeasonsGames is the async version of BRWebscrapeTools.extractSeasonsGames: the month
+    pages are downloaded concurrently.
+
+    Inputs:
+    season - string with second year of season (e.g. for 2000-2001 season, '2001')
+    brURL - https://www.basketball-reference.com
+    fetcher - AsyncBRFetcher
+
+    Outputs: (None,None if the season page could not be downloaded)
+    seasonTable - pd DataFrame containing all the games and outcomes for single NBA season
+    missingMonths - bool indicating if any month's data was excluded from the table
+    '''
+    seasonURL = brURL + '/leagues/NBA_' + season + '_games.html'
+    response = await fetcher.fetch(seasonURL)
+    if response.status != 200:
+        print('From',seasonURL,'unexpected status code',response.status)
+        return None,None
+
+    monthURLs,monthNames,_ = br.monthURLsFromPage(response.text,brURL)
+    responses = await asyncio.gather(*[fetcher.fetch(url) for url in monthURLs])
+    monthTables = []
+    for name,url,response in zip(monthNames,monthURLs,responses):
+        if response.status != 200:
+            print('Warning: Bad link. Status code',response.status)
+            print('Bad link for',name,':',url)
+            print('Skipping and proceeding.')
+            continue
+        processedTable = br.processMonthPage(response.text,url)
+        if processedTable is not None:
+            monthTables.append(processedTable)
+        else:
+            print('Excluding',name)
+
+    missingMonths = len(monthTables) < len(monthNames)
+    if len(monthTables) > 0:
+        seasonTable = pd.concat(monthTables)
+    else:
+        print('No months loaded')
+        seasonTable = None
+    return seasonTable,missingMonths
+
+def runAsync(extractor,*args,cache=None,requestsPerSecond=None,maxConcurrency=16):
+    '''
+    runAsync runs an async extractor of this module from blocking code, with a new AsyncBRFetcher
+    passed as its last argument and closed at the end, e.g.
+        seasonTable,missingMonths = runAsync(extractSeasonsGames,'2021',brURL)
+    '''
+    async def run():
+        async with AsyncBRFetcher(cache,requestsPerSecond,maxConcurrency) as fetcher:
+            return await extractor(*args,fetcher)
+    return asyncio.run(run())
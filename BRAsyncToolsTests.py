@@ -0,0 +1,148 @@
+import asyncio
+import tempfile
+import time
+import pandas as pd
+import requests
+import BRAsyncTools
+import BRFetchTools
+import Franchises
+import Instrumentation
+import BRWebscrapeTools as br
+from BRStubServer import BRStubServer
+from HiFOPredict import HiFOPredict
+
+'''
+Tests and benchmark of BRAsyncTools against BRStubServer, compared with the blocking functions
+of BRWebscrapeTools and HiFOPredict.
+'''
+
+def testAsyncExtractors():
+    '''
+    testAsyncExtractors checks that the async extractors give the same tables and predictions as
+    the blocking ones, over a handful of keep-alive connections.
+    '''
+    BRFetchTools.setFetcher(BRFetchTools.BRFetcher()) # no cache, so every page is requested
+    date = pd.Timestamp('2020-12-22')
+    with BRStubServer() as server:
+        expectedTable,_ = br.extractSeasonsGames('2021',server.url)
+        expected = HiFOPredict(2021,date,brURL=server.url,fetcher=BRFetchTools.BRFetcher()).predict()
+
+        # test 1: a season's games
+        print('test 1')
+        server.resetCounts()
+        seasonTable,missingMonths = BRAsyncTools.runAsync(BRAsyncTools.extractSeasonsGames,'2021',server.url)
+        print('same season table:',seasonTable.equals(expectedTable),'missingMonths =',missingMonths) # expected: True False
+        print('requests:',server.counts) # expected: 9 GETs (season page + 8 months)
+        print('connections:',server.connections) # expected: at most 9 (fewer if some were reused)
+
+        # test 2: a HiFOPredict built in the event loop; 61 requests on at most 16 connections
+        print('test 2')
+        server.resetCounts()
+        async def build():
+            async with BRAsyncTools.AsyncBRFetcher(maxConcurrency=16) as fetcher:
+                return await HiFOPredict.createAsync(2021,date,brURL=server.url,fetcher=fetcher)
+        predictor = asyncio.run(build())
+        print('same predictions:',predictor.predict().equals(expected)) # expected: True
+        print('requests:',server.counts,'connections:',server.connections) # expected: 61 GETs, at most 16 connections
+
+        # test 3: the async fetcher shares the on-disk cache; a bad page raises HTTPError
+        print('test 3')
+        with tempfile.TemporaryDirectory() as cacheDir:
+            cache = BRFetchTools.ResponseCache(cacheDir)
+            url = server.url+'/leagues/NBA_2021_games-january.html'
+            async def fetchTwice():
+                async with BRAsyncTools.AsyncBRFetcher(cache) as fetcher:
+                    return [await fetcher.fetch(url),await fetcher.fetch(url)]
+            first,second = asyncio.run(fetchTwice())
+            print('second fetch from cache:',second.fromCache,'same page:',first.text == second.text) # expected: True True
+            print('blocking fetcher reads it too:',BRFetchTools.BRFetcher(cache).fetch(url).fromCache) # expected: True
+        try:
+            BRAsyncTools.runAsync(BRAsyncTools.extractMonthsGames,server.url+'/leagues/NBA_2021_games-never.html')
+            print('no error raised')
+        except requests.HTTPError as e:
+            print('HTTPError:',e) # expected: 404 Error
+
+        # test 4: both fetchers run BRFetchTools.cachedFetch, so they record the same counters
+        print('test 4')
+        async def fetchTwiceAsync(cache):
+            async with BRAsyncTools.AsyncBRFetcher(cache) as fetcher:
+                return [await fetcher.fetch(url),await fetcher.fetch(url)]
+        counters = []
+        for fetchTwice in [lambda cache : [BRFetchTools.BRFetcher(cache).fetch(url) for _ in range(2)],
+                           lambda cache : asyncio.run(fetchTwiceAsync(cache))]:
+            with tempfile.TemporaryDirectory() as cacheDir:
+                Instrumentation.reset()
+                Instrumentation.enable()
+                fetchTwice(BRFetchTools.ResponseCache(cacheDir))
+                Instrumentation.disable()
+                counters.append(Instrumentation.report()['counters'])
+        print('same counters:',counters[0] == counters[1],sorted(counters[1])) # expected: True ['bytes downloaded', 'cache hits', 'cache misses', 'requests']
+    BRFetchTools.setFetcher(None)
+
+def benchmarkAsync(latency=0.05,nRequests=300):
+    '''
+    benchmarkAsync compares the blocking and async paths against a stub server with the given
+    per-request latency:
+      - per-request latency of sequential requests: requests.get (new connection each time, as the
+        original code), the pooled BRFetcher session, and the async client (keep-alive)
+      - throughput of nRequests team pages: BRFetcher with 8 threads, and the async client with 8
+        and 32 requests in flight
+      - a season's games (extractSeasonsGames) and a HiFOPredict, blocking and async
+    '''
+    with BRStubServer() as server:
+        url = server.url+'/teams/ATL/stats_per_game_totals.html'
+        server.render('/teams/ATL/stats_per_game_totals.html')
+        async def asyncSequential(n):
+            async with BRAsyncTools.AsyncBRFetcher() as fetcher:
+                for _ in range(n):
+                    await fetcher.fetchText(url)
+        n = 200
+        for name,run in [('requests.get (new connection)',lambda : [requests.get(url) for _ in range(n)]),
+                         ('BRFetcher (pooled session)',lambda : [BRFetchTools.BRFetcher().fetchText(url) for _ in range(1)]
+                                                                 + [fetcher.fetchText(url) for fetcher in [BRFetchTools.BRFetcher()] for _ in range(n)]),
+                         ('AsyncBRFetcher (keep-alive)',lambda : asyncio.run(asyncSequential(n)))]:
+            server.resetCounts()
+            tic = time.perf_counter()
+            run()
+            print('%s: %.2f ms per request, %d connections' % (name,1e3*(time.perf_counter() - tic)/n,server.connections))
+
+    with BRStubServer(latency=latency) as server:
+        urls = [server.url+'/teams/'+abbrev+page for abbrev in Franchises.index.slugs
+                for page in ['/stats_per_game_totals.html','/opp_stats_per_game_totals.html']]
+        urls = (urls*(nRequests//len(urls)+1))[:nRequests]
+        for u in set(urls):
+            server.render(u[len(server.url):])
+        async def asyncPages(concurrency):
+            async with BRAsyncTools.AsyncBRFetcher(maxConcurrency=concurrency) as fetcher:
+                await fetcher.fetchPages(urls)
+        print('throughput, %d pages, %.0f ms latency' % (nRequests,1e3*latency))
+        for name,run in [('BRFetcher, 8 threads',lambda : BRFetchTools.BRFetcher().fetchPages(urls,8)),
+                         ('AsyncBRFetcher, 8 in flight',lambda : asyncio.run(asyncPages(8))),
+                         ('AsyncBRFetcher, 32 in flight',lambda : asyncio.run(asyncPages(32)))]:
+            tic = time.perf_counter()
+            run()
+            print('%s: %.0f pages/s' % (name,nRequests/(time.perf_counter() - tic)))
+
+        BRFetchTools.setFetcher(BRFetchTools.BRFetcher())
+        date = pd.Timestamp('2020-12-22')
+        async def asyncPredictor():
+            async with BRAsyncTools.AsyncBRFetcher(maxConcurrency=32) as fetcher:
+                return await HiFOPredict.createAsync(2021,date,brURL=server.url,fetcher=fetcher)
+        for name,run in [('extractSeasonsGames (blocking)',lambda : br.extractSeasonsGames('2021',server.url)),
+                         ('extractSeasonsGames (async)',
+                          lambda : BRAsyncTools.runAsync(BRAsyncTools.extractSeasonsGames,'2021',server.url)),
+                         ('HiFOPredict (blocking, 8 threads)',
+                          lambda : HiFOPredict(2021,date,brURL=server.url,fetcher=BRFetchTools.BRFetcher())),
+                         ('HiFOPredict.createAsync (32 in flight)',lambda : asyncio.run(asyncPredictor()))]:
+            tic = time.perf_counter()
+            run()
+            print('%s: %.2f s' % (name,time.perf_counter() - tic))
+        BRFetchTools.setFetcher(None)
+
+# run tests
+if __name__ == '__main__':
+    print('Test async extractors')
+    testAsyncExtractors()
+    print('###################################')
+    print('Benchmark async client')
+    benchmarkAsync()
@@ -0,0 +1,245 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import requests
+import BRFetchTools
+import BRTableParser
+import GameStore
+import Instrumentation
+import BRWebscrapeTools as br
+
+'''
+BRBackfill downloads the games of several seasons in parallel, keeping a checkpoint of every
+month it completes so that an interrupted or partly failed backfill can be resumed without
+downloading anything twice. Only final data is checkpointed: the current season (which can still
+gain games and months) is downloaded again on every run, from its season page, and a month of an
+earlier season whose page still has unplayed games (no scores) is downloaded again until it has none.
+
+Files written (dataDir defaults to pyData):
+    dataDir/gamesYYYY.h5                        one table per season, as before
+    dataDir/allGamesXXXX_YYYY.h5                all seasons, once every season is complete
+    dataDir/backfill/manifest.json              progress of each season and month
+    dataDir/backfill/gamesYYYY-<month>.h5       checkpoint of each completed month
+    dataDir/store/YYYY/                         season partition of GameStore (if the store exists)
+'''
+
+# PyTables is not thread-safe, so every HDF read/write goes through this lock
+_hdfLock = threading.Lock()
+
+class BackfillManifest:
+    '''
+    BackfillManifest records the progress of a backfill in a JSON file:
+        {season : {'status' : 'complete' | 'in progress' | 'incomplete' | 'failed',
+                   'months' : [[monthName,url], ...],
+                   'done' : {monthName : number of games},
+                   'bad' : {monthName : reason}}}
+    'in progress': every month was loaded, but some games are still to be played (the current
+    season, or a month with unplayed games), so the season is downloaded again by the next run.
+    It is saved after every change, so it always reflects the last completed month.
+    Safe to share between threads.
+    '''
+    def __init__(self,fileName):
+        self.fileName = fileName
+        self._lock = threading.Lock()
+        self.seasons = {}
+        if os.path.exists(fileName):
+            with open(fileName) as f:
+                self.seasons = json.load(f)
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.fileName),exist_ok=True)
+        tmpFile = self.fileName + '.tmp'
+        with open(tmpFile,'w') as f:
+            json.dump(self.seasons,f,indent=1)
+        os.replace(tmpFile,self.fileName)
+
+    def season(self,season):
+        '''returns (a copy of) the record of season, creating an empty one if needed'''
+        with self._lock:
+            record = self.seasons.setdefault(str(season),{'status' : 'failed','months' : [],'done' : {},'bad' : {}})
+            return json.loads(json.dumps(record))
+
+    def setMonths(self,season,monthNames,monthURLs):
+        with self._lock:
+            self.seasons[str(season)]['months'] = [list(m) for m in zip(monthNames,monthURLs)]
+            self._save()
+
+    def monthDone(self,season,monthName,nGames):
+        with self._lock:
+            record = self.seasons[str(season)]
+            record['done'][monthName] = nGames
+            record['bad'].pop(monthName,None)
+            self._save()
+
+    def monthBad(self,season,monthName,reason):
+        with self._lock:
+            self.seasons[str(season)]['bad'][monthName] = reason
+            self._save()
+
+    def setStatus(self,season,status):
+        with self._lock:
+            self.seasons[str(season)]['status'] = status
+            self._save()
+
+    def isComplete(self,season):
+        with self._lock:
+            return self.seasons.get(str(season),{}).get('status') == 'complete'
+
+def _checkpointFile(checkpointDir,season,monthName):
+    return os.path.join(checkpointDir,'games'+str(season)+'-'+monthName.lower()+'.h5')
+
+def _hasUnplayedGames(webpage):
+    '''_hasUnplayedGames returns True if a month page has games without scores (not played yet)'''
+    table = BRTableParser.parseScheduleTable(webpage)
+    games = table[table['Date'] != 'Playoffs']
+    return bool((games['PTS'].isna() | games['PTS.1'].isna()).any())
+
+def _backfillMonth(season,monthName,url,manifest,checkpointDir,fetcher,final=True):
+    '''
+    _backfillMonth returns the table of one month's games, loaded from its checkpoint if the
+    month was completed by an earlier run (and final), or downloaded otherwise. A downloaded month is
+    checkpointed only if final (not the current season) and every game of its page has been
+    played. Returns (table, True if checkpointed or loaded from a checkpoint); table is None if
+    the month's page could not be downloaded (bad status code or network error) or processed.
+    '''
+    fileName = _checkpointFile(checkpointDir,season,monthName)
+    if final and monthName in manifest.season(season)['done'] and os.path.exists(fileName):
+        with _hdfLock:
+            return pd.read_hdf(fileName,'table'),True
+
+    try:
+        response = fetcher.fetch(url)
+    except requests.RequestException as e: # connection error, timeout: retried with the season
+        print('Failed to download',monthName,season,':',url,repr(e))
+        manifest.monthBad(season,monthName,repr(e))
+        return None,False
+    if response.status != 200:
+        print('Bad link for',monthName,season,':',url,'status code',response.status)
+        manifest.monthBad(season,monthName,'status code '+str(response.status))
+        return None,False
+    processedTable = br.processMonthPage(response.text,url)
+    if processedTable is None:
+        print('Excluding',monthName,season)
+        manifest.monthBad(season,monthName,'team name not matching any keys')
+        return None,False
+
+    if not final or _hasUnplayedGames(response.text):
+        return processedTable,False # downloaded again by the next run
+    with _hdfLock:
+        processedTable.to_hdf(fileName,key='table',mode='w')
+    manifest.monthDone(season,monthName,processedTable.shape[0])
+    return processedTable,True
+
+def _backfillSeason(season,brURL,manifest,checkpointDir,dataDir,fetcher,monthPool,final=True):
+    '''
+    _backfillSeason downloads (or resumes) one season, with its months downloaded in parallel on
+    monthPool, and writes dataDir/gamesYYYY.h5. The month list of the season page is reused from
+    an earlier run only if final (not the current season, which can gain months).
+    Returns True if every month was loaded.
+    '''
+    record = manifest.season(season)
+    if record['months'] and final:
+        monthNames,monthURLs = zip(*record['months']) # known from an earlier run
+    else:
+        seasonURL = brURL + '/leagues/NBA_' + str(season) + '_games.html'
+        try:
+            response = fetcher.fetch(seasonURL)
+        except requests.RequestException as e:
+            print('Failed to download',seasonURL,repr(e))
+            manifest.setStatus(season,'failed')
+            return False
+        if response.status != 200:
+            print('From',seasonURL,'unexpected status code',response.status)
+            manifest.setStatus(season,'failed')
+            return False
+        monthURLs,monthNames,_ = br.monthURLsFromPage(response.text,brURL)
+        manifest.setMonths(season,monthNames,monthURLs)
+
+    futures = [monthPool.submit(_backfillMonth,season,name,url,manifest,checkpointDir,fetcher,final)
+               for name,url in zip(monthNames,monthURLs)]
+    monthTables,checkpointed = zip(*[f.result() for f in futures]) # in month order
+    loaded = [table for table in monthTables if table is not None]
+
+    if len(loaded) == 0:
+        print('No months loaded for',season)
+        manifest.setStatus(season,'failed')
+        return False
+    seasonTable = pd.concat(loaded)
+    with _hdfLock:
+        seasonTable.to_hdf(os.path.join(dataDir,'games'+str(season)+'.h5'),key='table',mode='w')
+        storeDir = os.path.join(dataDir,'store')
+        if os.path.isdir(storeDir): # under the lock too: seasons share the team dictionary
+            GameStore.writeSeasonGames(season,seasonTable,storeDir)
+    complete = len(loaded) == len(monthTables)
+    status = 'incomplete' if not complete else 'complete' if all(checkpointed) else 'in progress'
+    manifest.setStatus(season,status)
+    print('Season',season,{'complete' : 'complete','in progress' : 'saved (in progress)',
+                           'incomplete' : 'saved with missing months'}[status])
+    return complete
+
+def combineSeasons(initialSeason,finalSeason,dataDir='pyData'):
+    '''
+    combineSeasons writes dataDir/allGames<initialSeason>_<finalSeason>.h5 by appending the
+    per-season files one at a time, so only one season is held in memory.
+    '''
+    fileName = os.path.join(dataDir,'allGames'+str(initialSeason)+'_'+str(finalSeason)+'.h5')
+    with _hdfLock, pd.HDFStore(fileName,mode='w') as store:
+        for season in range(initialSeason,finalSeason+1):
+            seasonTable = pd.read_hdf(os.path.join(dataDir,'games'+str(season)+'.h5'),'table')
+            store.append('allGameData',seasonTable,min_itemsize={'values' : 24})
+    return fileName
+
+def runBackfill(initialSeason,finalSeason,brURL='https://www.basketball-reference.com',
+                maxSeasons=4,maxWorkers=8,retries=2,dataDir='pyData',fetcher=None,currentSeason=None):
+    '''
+    runBackfill downloads the games of every season from initialSeason to finalSeason, running
+    seasons, and months within a season, in parallel. Seasons completed by an earlier run are
+    skipped, and months completed by an earlier run are loaded from their checkpoints. Seasons
+    that fail (bad link, missing month) are retried up to retries times, without redoing the
+    seasons and months that succeeded (network errors count as failures). The current season, and months with unplayed games, are
+    never checkpointed, so each run downloads them again.
+
+    Inputs:
+    initialSeason, finalSeason - range of seasons (second year of season, inclusive)
+    brURL - https://www.basketball-reference.com
+    maxSeasons - number of seasons downloaded simultaneously
+    maxWorkers - number of month pages downloaded simultaneously (over all seasons)
+    retries - number of extra attempts for seasons that failed
+    dataDir - directory in which the season files, combined file and checkpoints are written
+    fetcher - BRFetchTools.BRFetcher to download with (defaults to the shared one)
+    currentSeason - season in progress (defaults to BRFetchTools.currentSeason())
+
+    Outputs:
+    badSeasons - list of seasons that could not be completed
+    '''
+    fetcher = fetcher or BRFetchTools.getFetcher()
+    currentSeason = currentSeason or BRFetchTools.currentSeason()
+    checkpointDir = os.path.join(dataDir,'backfill')
+    os.makedirs(checkpointDir,exist_ok=True)
+    manifest = BackfillManifest(os.path.join(checkpointDir,'manifest.json'))
+
+    seasons = list(range(initialSeason,finalSeason+1))
+    loaded = set() # seasons with every month loaded by this run
+    with ThreadPoolExecutor(max_workers=maxWorkers) as monthPool, \
+         ThreadPoolExecutor(max_workers=maxSeasons) as seasonPool:
+        for attempt in range(retries+1):
+            pending = [season for season in seasons if not manifest.isComplete(season) and season not in loaded]
+            if len(pending) == 0:
+                break
+            if attempt > 0:
+                print('Retrying seasons',pending)
+                Instrumentation.count('season retries',len(pending))
+            results = seasonPool.map(lambda season : _backfillSeason(season,brURL,manifest,checkpointDir,dataDir,
+                                                                     fetcher,monthPool,season != currentSeason),pending)
+            loaded.update(season for season,ok in zip(pending,results) if ok)
+
+    badSeasons = [season for season in seasons if not manifest.isComplete(season) and season not in loaded]
+    # if all data was downloaded perfectly, combine into a single table
+    if len(badSeasons) == 0:
+        print('Saving all data to a single table!')
+        combineSeasons(initialSeason,finalSeason,dataDir)
+    else:
+        print('Incomplete seasons:',badSeasons)
+    return badSeasons
@@ -0,0 +1,466 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from urllib.parse import urlsplit
+import requests
+import Instrumentation
+
+'''
+BRFetchTools is the fetch layer shared by BRWebscrapeTools and HiFOPredict. Every page download
+goes through a BRFetcher, which keeps an on-disk cache of the responses so that pages are not
+downloaded again on every run:
+    - bodies are stored content-addressed (by sha256), so identical pages share one file
+    - each page type has its own time to live (see pageTTL); schedules of finished seasons never expire
+    - stale entries are revalidated with If-None-Match/If-Modified-Since, so unchanged pages cost a 304
+    - the cache is bounded in size, evicting the least recently used entries first
+'''
+
+'''
+CACHE POLICY
+'''
+HOUR = 3600.
+DAY = 24*HOUR
+
+def currentSeason(today=None):
+    '''
+    currentSeason returns the second year of the NBA season in progress (or next to start) on
+    today, e.g. 2022 for any date from August 2021 to July 2022.
+    '''
+    today = today or date.today()
+    return today.year + 1 if today.month >= 8 else today.year
+
+seasonPagePattern = re.compile(r'/leagues/NBA_(\d{4})_games(-[a-z]+)?\.html$')
+teamPagePattern = re.compile(r'/teams/[A-Z]{3}/(opp_)?stats_per_game_totals\.html$')
+
+def pageTTL(url,today=None):
+    '''
+    pageTTL returns the number of seconds a cached copy of url can be used without revalidation,
+    or None if it never needs revalidating.
+        - schedule pages of seasons that have finished : never expire
+        - schedule pages of the current season : 1 hour (results are added through the day)
+        - team season-average pages : 6 hours (updated once per day after games)
+        - anything else : 1 day
+    '''
+    path = urlsplit(url).path
+    match = seasonPagePattern.search(path)
+    if match:
+        if int(match.group(1)) < currentSeason(today):
+            return None
+        return HOUR
+    if teamPagePattern.search(path):
+        return 6*HOUR
+    return DAY
+
+'''
+CACHE
+'''
+class ResponseCache:
+    '''
+    ResponseCache stores page bodies on disk under cacheDir/objects, named by the sha256 of their
+    content, with an index mapping each URL to its body and validators:
+        url -> {'hash', 'size', 'etag', 'lastModified', 'fetched', 'lastUsed'}
+    The index is a snapshot (cacheDir/index.json) and a journal of the entries changed since
+    (cacheDir/index.log, one [url, entry or null] line per change), so storing or reading a page
+    appends one line instead of rewriting the index; the journal is folded into the snapshot once
+    it has as many lines as the index has entries. When the bodies take up more than maxBytes, the
+    least recently used URLs are dropped, those with a TTL before those that never expire. Safe to
+    share between threads.
+    '''
+    def __init__(self,cacheDir='pyData/httpCache',maxBytes=512*2**20,ttl=pageTTL,minCompaction=1024):
+        '''
+        cacheDir - directory in which the cache is kept
+        maxBytes - maximum total size of the stored bodies
+        ttl - function url -> seconds until a cached copy needs revalidation (None: never)
+        minCompaction - journal lines below which the journal is never folded into the snapshot
+        '''
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        self.ttl = ttl
+        self.minCompaction = minCompaction
+        self._indexFile = os.path.join(cacheDir,'index.json')
+        self._logFile = os.path.join(cacheDir,'index.log')
+        self._lock = threading.RLock()
+        self._index = {}
+        self._refs = {} # hash -> [number of URLs with that body, size]
+        self._bytes = 0 # total size of the distinct bodies
+        self._logLines = 0
+        index = {}
+        if os.path.exists(self._indexFile):
+            with open(self._indexFile) as f:
+                index = json.load(f)
+        if os.path.exists(self._logFile):
+            with open(self._logFile) as f:
+                for line in f:
+                    try:
+                        url,entry = json.loads(line)
+                    except ValueError: # last line cut short by an interrupted run
+                        break
+                    index[url] = entry
+                    self._logLines += 1
+        for url,entry in index.items():
+            if entry is not None:
+                self._setEntry(url,entry)
+
+    def _objectPath(self,digest):
+        return os.path.join(self.cacheDir,'objects',digest[:2],digest)
+
+    def _setEntry(self,url,entry):
+        '''sets (entry) or removes (None) the index entry of url, keeping the body counts'''
+        old = self._index.pop(url,None)
+        if old is not None:
+            refs = self._refs[old['hash']]
+            refs[0] -= 1
+            if refs[0] == 0:
+                del self._refs[old['hash']]
+                self._bytes -= refs[1]
+        if entry is not None:
+            self._index[url] = entry
+            refs = self._refs.setdefault(entry['hash'],[0,entry['size']])
+            if refs[0] == 0:
+                self._bytes += entry['size']
+            refs[0] += 1
+
+    def _record(self,url):
+        '''appends the current entry of url to the journal, folding it into the snapshot when long'''
+        if self._logLines >= max(self.minCompaction,len(self._index)):
+            self._saveIndex()
+            return
+        os.makedirs(self.cacheDir,exist_ok=True)
+        with open(self._logFile,'a') as f:
+            f.write(json.dumps([url,self._index.get(url)])+'\n')
+        self._logLines += 1
+
+    def _saveIndex(self):
+        os.makedirs(self.cacheDir,exist_ok=True)
+        tmpFile = self._indexFile + '.tmp'
+        with open(tmpFile,'w') as f:
+            json.dump(self._index,f)
+        os.replace(tmpFile,self._indexFile) # atomic, so an interrupted run never leaves a broken index
+        open(self._logFile,'w').close() # replaying the journal over the new snapshot would change nothing
+        self._logLines = 0
+
+    def lookup(self,url):
+        '''
+        lookup returns (entry,fresh) for url, where entry is the index entry (None if url is not
+        cached) and fresh is True if the entry can be used without revalidation.
+        '''
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is None or not os.path.exists(self._objectPath(entry['hash'])):
+                return None,False
+            ttl = self.ttl(url)
+            fresh = ttl is None or time.time() - entry['fetched'] < ttl
+            return dict(entry),fresh
+
+    def read(self,url):
+        '''
+        read returns the cached body of url and marks it as recently used, or None if url has
+        been evicted in the meantime.
+        '''
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is None:
+                return None
+            entry['lastUsed'] = time.time()
+            self._record(url)
+            with open(self._objectPath(entry['hash']),'rb') as f:
+                return f.read().decode('utf-8')
+
+    def revalidated(self,url):
+        '''
+        revalidated records that the server confirmed (304) the cached copy of url is current.
+        '''
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is not None:
+                entry['fetched'] = entry['lastUsed'] = time.time()
+                self._record(url)
+
+    def expire(self,match):
+        '''
+        expire marks the cached copies of the URLs for which match(url) is True as stale, so that
+        their next fetch revalidates them (a conditional request) whatever their age. URLs that
+        never expire (TTL None) are left as they are.
+        '''
+        with self._lock:
+            for url,entry in self._index.items():
+                if entry['fetched'] > 0 and self.ttl(url) is not None and match(url):
+                    entry['fetched'] = 0
+                    self._record(url)
+
+    def store(self,url,text,etag=None,lastModified=None):
+        '''
+        store saves the body of url along with its validators, then evicts entries if the
+        cache has grown beyond maxBytes.
+        '''
+        body = text.encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            path = self._objectPath(digest)
+            if not os.path.exists(path): # identical bodies are only stored once
+                os.makedirs(os.path.dirname(path),exist_ok=True)
+                with open(path,'wb') as f:
+                    f.write(body)
+            now = time.time()
+            old = self._index.get(url)
+            self._setEntry(url,{'hash' : digest,
+                                'size' : len(body),
+                                'etag' : etag,
+                                'lastModified' : lastModified,
+                                'fetched' : now,
+                                'lastUsed' : now})
+            self._record(url)
+            if old is not None and old['hash'] != digest:
+                self._removeObject(old['hash'])
+            self._evict()
+
+    def _removeObject(self,digest):
+        '''deletes a body file unless another URL still refers to it'''
+        if digest in self._refs:
+            return
+        try:
+            os.remove(self._objectPath(digest))
+        except FileNotFoundError:
+            pass
+
+    def totalBytes(self):
+        '''total size of the distinct bodies in the cache'''
+        with self._lock:
+            return self._bytes
+
+    def _evict(self):
+        '''drops least recently used entries (expiring ones first) until within maxBytes'''
+        if self._bytes <= self.maxBytes:
+            return
+        order = sorted(self._index,key=lambda url : (self.ttl(url) is None,self._index[url]['lastUsed']))
+        for url in order:
+            if self._bytes <= self.maxBytes:
+                break
+            digest = self._index[url]['hash']
+            self._setEntry(url,None)
+            self._record(url)
+            self._removeObject(digest)
+
+    def clear(self):
+        '''removes every entry from the cache'''
+        with self._lock:
+            index = self._index
+            self._index,self._refs,self._bytes = {},{},0
+            for entry in index.values():
+                self._removeObject(entry['hash'])
+            self._saveIndex()
+
+'''
+FETCHING
+'''
+class RateLimiter:
+    '''
+    RateLimiter spaces out requests so that no more than requestsPerSecond requests are started
+    per second against any single host. Safe to share between threads.
+    '''
+    def __init__(self,requestsPerSecond=None):
+        '''
+        requestsPerSecond - maximum request rate per host (None or 0 for no limit)
+        '''
+        self.interval = 1./requestsPerSecond if requestsPerSecond else 0.
+        self._nextSlot = {} # host -> earliest time at which the next request may start
+        self._lock = threading.Lock()
+
+    def wait(self,url):
+        '''
+        wait blocks until a request to url's host is allowed to start.
+        '''
+        if self.interval == 0.:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now,self._nextSlot.get(host,now))
+            self._nextSlot[host] = slot + self.interval # reserve this slot
+        if slot > now:
+            time.sleep(slot - now)
+
+'''
+FetchResult: outcome of BRFetcher.fetch
+    url - requested URL
+    status - HTTP status code (200 for pages served from the cache)
+    text - page html (None unless status is 200)
+    fromCache - True if the body came from the cache (fresh, or revalidated with a 304)
+'''
+FetchResult = namedtuple('FetchResult',['url','status','text','fromCache'])
+
+def cachedFetch(cache,url):
+    '''
+    cachedFetch is the cache and revalidation logic of a fetch, shared by BRFetcher and
+    BRAsyncTools.AsyncBRFetcher, which differ only in how they send requests and call the cache.
+    It is a generator driven by the fetcher (see runFetch): it yields
+        ('cache',method,args) - a call of a ResponseCache method, to be sent back its result
+        ('get',headers) - a GET request of url, to be sent back the response (requests or httpx)
+    and returns the FetchResult.
+
+    Inputs:
+    cache - ResponseCache (None to disable caching)
+    url - page URL
+    '''
+    entry,fresh = (yield ('cache',cache.lookup,(url,))) if cache is not None else (None,False)
+    if entry is not None and fresh:
+        text = yield ('cache',cache.read,(url,))
+        if text is not None:
+            return FetchResult(url,200,text,True)
+        entry = None # evicted by another thread since the lookup
+
+    # conditional request if we hold a stale copy
+    headers = {}
+    if entry is not None:
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['lastModified']:
+            headers['If-Modified-Since'] = entry['lastModified']
+    r = yield ('get',headers)
+    Instrumentation.count('requests')
+
+    if r.status_code == 304 and entry is not None:
+        Instrumentation.count('revalidations')
+        yield ('cache',cache.revalidated,(url,))
+        text = yield ('cache',cache.read,(url,))
+        if text is not None:
+            return FetchResult(url,200,text,True)
+        r = yield ('get',{}) # evicted by another thread, download unconditionally
+        Instrumentation.count('requests')
+        Instrumentation.count('retries')
+    Instrumentation.count('bytes downloaded',len(r.content))
+    if r.status_code != 200:
+        return FetchResult(url,r.status_code,None,False)
+    if cache is not None:
+        yield ('cache',cache.store,(url,r.text,r.headers.get('ETag'),r.headers.get('Last-Modified')))
+    return FetchResult(url,200,r.text,False)
+
+def runFetch(steps,get):
+    '''
+    runFetch drives a cachedFetch generator with blocking calls: get(headers) sends the request,
+    and cache methods are called directly. Returns the FetchResult.
+    '''
+    try:
+        step = next(steps)
+        while True:
+            step = steps.send(step[1](*step[2]) if step[0] == 'cache' else get(step[1]))
+    except StopIteration as stop:
+        return stop.value
+
+class BRFetcher:
+    '''
+    BRFetcher downloads pages through a ResponseCache, using a pooled requests.Session and a
+    per-host RateLimiter. Safe to share between threads.
+    '''
+    def __init__(self,cache=None,requestsPerSecond=None,poolSize=16,timeout=30.):
+        '''
+        cache - ResponseCache to use (None to disable caching)
+        requestsPerSecond - maximum request rate per host (None for no limit)
+        poolSize - number of connections kept open per host
+        timeout - seconds before a request fails (requests.Timeout), so a stalled connection
+                  cannot hang a worker
+        '''
+        self.cache = cache
+        self.timeout = timeout
+        self.limiter = RateLimiter(requestsPerSecond)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=poolSize,pool_maxsize=poolSize)
+        self.session.mount('http://',adapter)
+        self.session.mount('https://',adapter)
+
+    def fetch(self,url):
+        '''
+        fetch returns a FetchResult for url, served from the cache when the cached copy is fresh
+        or the server confirms it is unchanged.
+        '''
+        if not Instrumentation.enabled():
+            return self._fetch(url)
+        tic = time.perf_counter()
+        result = self._fetch(url)
+        Instrumentation.recordFetch(url,time.perf_counter() - tic,
+                                    len(result.text.encode('utf-8')) if result.text is not None else 0,
+                                    'cache' if result.fromCache else 'download' if result.status == 200 else 'error')
+        return result
+
+    def _get(self,url,headers):
+        self.limiter.wait(url)
+        return self.session.get(url,headers=headers,timeout=self.timeout)
+
+    def _fetch(self,url):
+        return runFetch(cachedFetch(self.cache,url),lambda headers : self._get(url,headers))
+
+    def fetchText(self,url):
+        '''
+        fetchText returns the html of url. Raises requests.HTTPError if the server does not
+        return a successful status code.
+        '''
+        result = self.fetch(url)
+        if result.status != 200:
+            raise requests.HTTPError(str(result.status)+' Error for url: '+url)
+        return result.text
+
+    def fetchPages(self,urls,maxWorkers=8):
+        '''
+        fetchPages downloads a list of pages concurrently using a bounded pool of worker threads.
+        Only network I/O happens in the workers; parsing is left to the caller.
+
+        Inputs:
+        urls - list of page URLs
+        maxWorkers - maximum number of simultaneous requests
+
+        Outputs:
+        pages - list of html strings, in the same order as urls
+        '''
+        if maxWorkers <= 1:
+            return [self.fetchText(url) for url in urls]
+        with ThreadPoolExecutor(max_workers=maxWorkers) as pool:
+            return list(pool.map(self.fetchText,urls))
+
+'''
+DEFAULT FETCHER
+'''
+_defaultCache = None
+_defaultFetcher = None
+_defaultLock = threading.Lock()
+
+def defaultCache():
+    '''
+    defaultCache returns the ResponseCache in pyData/httpCache shared by every fetcher of this
+    process (several ResponseCache objects on one directory would overwrite each other's index).
+    '''
+    global _defaultCache
+    with _defaultLock:
+        if _defaultCache is None:
+            _defaultCache = ResponseCache()
+        return _defaultCache
+
+def getFetcher():
+    '''
+    getFetcher returns the BRFetcher used by BRWebscrapeTools and HiFOPredict by default.
+    '''
+    global _defaultFetcher
+    if _defaultFetcher is None:
+        cache = defaultCache()
+        with _defaultLock:
+            if _defaultFetcher is None:
+                _defaultFetcher = BRFetcher(cache)
+    return _defaultFetcher
+
+def setFetcher(fetcher):
+    '''
+    setFetcher replaces the default BRFetcher (e.g. to use another cache directory in tests).
+    '''
+    global _defaultFetcher
+    _defaultFetcher = fetcher
+
+def fetchPages(urls,maxWorkers=8):
+    '''
+    fetchPages downloads urls concurrently with the default fetcher (see BRFetcher.fetchPages).
+    '''
+    return getFetcher().fetchPages(urls,maxWorkers)
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import time
+import BRFetchTools
+from BRStubServer import BRStubServer
+
+'''
+Tests of the BRFetchTools cache, run against BRStubServer with the cache in a temporary directory.
+'''
+
+def testResponseCache():
+    '''
+    testResponseCache tests that BRFetcher serves repeated requests from its on-disk cache,
+    revalidates stale entries with conditional requests, and does not cache failed requests.
+    '''
+    with BRStubServer() as server, tempfile.TemporaryDirectory() as cacheDir:
+        # test 1: a finished season's page is downloaded once, then served from the cache
+        print('test 1')
+        url = server.url + '/leagues/NBA_2021_games-january.html'
+        fetcher = BRFetchTools.BRFetcher(BRFetchTools.ResponseCache(cacheDir))
+        first = fetcher.fetch(url)
+        second = fetcher.fetch(url)
+        print('second fetch from cache:',second.fromCache) # expected: True
+        print('same page:',first.text == second.text) # expected: True
+        print('GET requests:',server.counts.get('GET')) # expected: 1
+
+        # test 2: the cache persists on disk, for a new fetcher on the same directory
+        print('test 2')
+        fetcher = BRFetchTools.BRFetcher(BRFetchTools.ResponseCache(cacheDir))
+        print('served from disk cache:',fetcher.fetch(url).fromCache) # expected: True
+        print('GET requests:',server.counts.get('GET')) # expected: 1
+
+        # test 3: an expired entry is revalidated and the server answers 304
+        print('test 3')
+        fetcher = BRFetchTools.BRFetcher(BRFetchTools.ResponseCache(cacheDir,ttl=lambda url : 0))
+        result = fetcher.fetch(url)
+        print('revalidated copy used:',result.fromCache and result.text == first.text) # expected: True
+        print('304 responses:',server.notModified) # expected: 1
+
+        # test 4: failed requests are reported and not cached
+        print('test 4')
+        result = fetcher.fetch(server.url + '/leagues/NBA_202_games.html')
+        print('status:',result.status,'text is None:',result.text is None) # expected: 404 True
+
+def testCacheEviction():
+    '''
+    testCacheEviction tests that the cache stays within maxBytes by dropping the least recently
+    used pages.
+    '''
+    with BRStubServer() as server, tempfile.TemporaryDirectory() as cacheDir:
+        urls = [server.url + '/leagues/NBA_2021_games-' + m + '.html' for m in ['january','february','march']]
+        pageSize = len(BRFetchTools.BRFetcher().fetchText(urls[0]).encode('utf-8'))
+        cache = BRFetchTools.ResponseCache(cacheDir,maxBytes=int(2.5*pageSize))
+        fetcher = BRFetchTools.BRFetcher(cache)
+        for url in urls:
+            fetcher.fetch(url)
+        print('within maxBytes:',cache.totalBytes() <= cache.maxBytes) # expected: True
+        print('oldest page evicted:',cache.lookup(urls[0])[0] is None) # expected: True
+        print('newest page kept:',cache.lookup(urls[-1])[0] is not None) # expected: True
+
+def testCacheIndex():
+    '''
+    testCacheIndex tests that index changes are appended to the journal rather than rewriting the
+    index, that a new cache on the same directory sees every change (including the last use of
+    each page, so that eviction by another process drops the right pages), and the timeout.
+    '''
+    with tempfile.TemporaryDirectory() as cacheDir:
+        # test 1: each change appends a line to the journal, folded into the snapshot once it has as
+        # many lines as the index has entries
+        print('test 1')
+        cache = BRFetchTools.ResponseCache(cacheDir,minCompaction=8)
+        pages = {'http://stub/page'+str(i) : ('%02d' % i)*1000 for i in range(20)}
+        for url,text in pages.items():
+            cache.store(url,text)
+        journalLines = lambda : len(open(os.path.join(cacheDir,'index.log')).readlines())
+        print('journal lines:',journalLines(),os.path.exists(os.path.join(cacheDir,'index.json'))) # expected: 20 False
+        cache.read('http://stub/page0')
+        print('after one more change:',journalLines(),os.path.exists(os.path.join(cacheDir,'index.json'))) # expected: 0 True
+        reloaded = BRFetchTools.ResponseCache(cacheDir)
+        print('same index:',reloaded._index == cache._index,reloaded.totalBytes() == cache.totalBytes()) # expected: True True
+
+        # test 2: reads are persisted, and a new cache evicts the least recently used pages
+        print('test 2')
+        urls = list(pages)
+        for url in urls[:10]:
+            time.sleep(0.001)
+            cache.read(url)
+        size = cache._index[urls[0]]['size']
+        other = BRFetchTools.ResponseCache(cacheDir,maxBytes=15*size)
+        other.store('http://stub/new','nw'*1000)
+        print('pages read kept:',all(other.lookup(url)[0] is not None for url in urls[:10])) # expected: True
+        print('oldest evicted:',[url[len('http://stub/'):] for url in urls if other.lookup(url)[0] is None])
+        # expected: page10 to page15
+    print('default timeout:',BRFetchTools.BRFetcher().timeout) # expected: 30.0
+
+# run tests
+if __name__ == '__main__':
+    print('Test ResponseCache')
+    testResponseCache()
+    print('###################################')
+    print('Test cache eviction')
+    testCacheEviction()
+    print('###################################')
+    print('Test cache index')
+    testCacheIndex()
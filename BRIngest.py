@@ -0,0 +1,189 @@
+import glob
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import BRFetchTools
+import BRTableParser
+import Franchises
+import GameStore
+import BRWebscrapeTools as br
+
+'''
+BRIngest adds newly played games to the stored game tables without re-scraping the season.
+It finds the last game date already stored in pyData/gamesYYYY.h5, downloads only the month
+pages from that date to today (normally just the current month: one request), and appends the
+new games to the season table and to the combined allGames table that covers the season.
+It also downloads the teams' game logs (box scores of every game) of a season to
+pyData/gameLogsYYYY.h5, the season-to-date stats used by Backtest.
+'''
+
+dateFormat = '%a, %b %d, %Y' # BR schedule dates, e.g. 'Tue, Dec 22, 2020'
+
+def _seasonFile(season,dataDir):
+    return os.path.join(dataDir,'games'+str(season)+'.h5')
+
+def lastIngestedDate(season,dataDir='pyData'):
+    '''
+    lastIngestedDate returns the date (pd Timestamp) of the latest game stored for season, or
+    None if nothing has been stored for that season yet.
+    '''
+    fileName = _seasonFile(season,dataDir)
+    if not os.path.exists(fileName):
+        return None
+    table = pd.read_hdf(fileName,'table')
+    if table.empty:
+        return None
+    return pd.to_datetime(table['Date'],format=dateFormat).max()
+
+def _combinedFile(season,dataDir):
+    '''returns the allGames file whose range of seasons includes season (None if there is none)'''
+    for fileName in sorted(glob.glob(os.path.join(dataDir,'allGames*_*.h5'))):
+        first,last = os.path.basename(fileName)[len('allGames'):-len('.h5')].split('_')
+        if int(first) <= season <= int(last):
+            return fileName
+    return None
+
+def _appendCombined(fileName,newGames):
+    '''
+    _appendCombined appends rows to the combined table. Files written by BRBackfill are in table
+    format and are appended to in place; older (fixed format) files are rewritten once in table
+    format so that later appends are in place.
+    '''
+    with pd.HDFStore(fileName) as store:
+        if store.get_storer('allGameData').is_table:
+            store.append('allGameData',newGames,min_itemsize={'values' : 24})
+            return
+        allGames = pd.concat([store['allGameData'],newGames])
+    with pd.HDFStore(fileName,mode='w') as store:
+        store.append('allGameData',allGames,min_itemsize={'values' : 24})
+
+def ingestNewGames(season,date=None,brURL='https://www.basketball-reference.com',dataDir='pyData',fetcher=None):
+    '''
+    ingestNewGames appends the games of season played up to date that are not stored yet to
+    dataDir/gamesYYYY.h5 and to the allGames file covering season. If nothing is stored for the
+    season yet, only date's month is ingested (use BRWebscrapeTools.downloadGameData for a full season).
+
+    Inputs:
+    season - second year of the season (e.g. 2022 for 2021-22)
+    date - pd Timestamp of the last day to ingest (defaults to today)
+    brURL - https://www.basketball-reference.com
+    dataDir - directory of the game tables
+    fetcher - BRFetchTools.BRFetcher to download with (defaults to the shared one)
+
+    Outputs:
+    newGames - pd DataFrame of the games added (same columns as convertWL output; empty if there
+               are none, e.g. for a date before the last stored game); None if a month page could
+               not be downloaded or processed
+    '''
+    fetcher = fetcher or BRFetchTools.getFetcher()
+    date = date if date is not None else pd.to_datetime('today').normalize()
+    lastDate = lastIngestedDate(season,dataDir)
+    if lastDate is not None and date < lastDate: # every game up to date is already stored
+        print('No new games for',season,'up to',date.strftime('%Y-%m-%d'))
+        return pd.DataFrame(columns=['Date','Visitor/Neutral','Home/Neutral','VisitorWin'])
+    firstDate = lastDate if lastDate is not None else date
+
+    # month pages from the last stored game's month to date's month (normally just one)
+    monthTables = []
+    for month in pd.period_range(firstDate,date,freq='M'):
+        url = brURL + '/leagues/NBA_' + str(season) + '_games-' + month.strftime('%B').lower() + '.html'
+        response = fetcher.fetch(url)
+        if response.status != 200:
+            print('From',url,'unexpected status code',response.status)
+            return None
+        monthTables.append(BRTableParser.parseScheduleTable(response.text))
+    raw = pd.concat(monthTables)
+
+    # keep games played between the last stored date and date
+    gameDates = pd.to_datetime(raw['Date'],format=dateFormat,errors='coerce')
+    played = raw['PTS'].notna() & raw['PTS.1'].notna() & (gameDates <= date)
+    if lastDate is not None:
+        played &= gameDates >= lastDate # the last stored day may have been partly ingested
+    newGames = br.convertWL(raw[played],season)
+    if newGames is None:
+        return None
+
+    seasonFile = _seasonFile(season,dataDir)
+    if lastDate is not None:
+        # drop games of the last stored day that are already stored
+        stored = pd.read_hdf(seasonFile,'table')
+        keys = ['Date','Visitor/Neutral','Home/Neutral']
+        storedKeys = pd.MultiIndex.from_frame(stored[keys])
+        newGames = newGames[~pd.MultiIndex.from_frame(newGames[keys]).isin(storedKeys)]
+    if newGames.empty:
+        print('No new games for',season,'up to',date.strftime('%Y-%m-%d'))
+        return newGames
+
+    # update the season and combined tables
+    seasonTable = newGames if lastDate is None else pd.concat([stored,newGames])
+    seasonTable.to_hdf(seasonFile,key='table',mode='w')
+    storeDir = os.path.join(dataDir,'store')
+    if os.path.isdir(storeDir):
+        GameStore.writeSeasonGames(season,seasonTable,storeDir)
+    combinedFile = _combinedFile(season,dataDir)
+    if combinedFile is not None:
+        _appendCombined(combinedFile,newGames)
+    print('Added',newGames.shape[0],'games to',season)
+    return newGames
+
+'''
+GAME LOGS
+'''
+def _gameLogFile(season,dataDir):
+    return os.path.join(dataDir,'gameLogs'+str(season)+'.h5')
+
+def gameLogURL(abbreviation,season,brURL='https://www.basketball-reference.com'):
+    '''gameLogURL returns the URL of a team's game log page, e.g. /teams/GSW/2021/gamelog/'''
+    return brURL + '/teams/' + abbreviation + '/' + str(season) + '/gamelog/'
+
+def downloadGameLogs(season,brURL='https://www.basketball-reference.com',dataDir='pyData',fetcher=None,maxWorkers=8):
+    '''
+    downloadGameLogs downloads the game log page of every team of season (one request per team,
+    concurrently, none for pages cached and unchanged) and saves the games to
+    dataDir/gameLogsYYYY.h5. Run it again during a season to add the games played since.
+
+    Inputs:
+    season - second year of the season (e.g. 2022 for 2021-22)
+    brURL - https://www.basketball-reference.com
+    dataDir - directory of the game tables
+    fetcher - BRFetchTools.BRFetcher to download with (defaults to the shared one)
+    maxWorkers - maximum number of simultaneous requests
+
+    Outputs:
+    gameLogs - pd DataFrame with columns Tm (as in the game tables), Date, Opp and the counting
+               stats of the team and its opponent (see BRTableParser.parseGameLog), in date order;
+               None if a page could not be downloaded or processed (nothing is saved)
+    '''
+    fetcher = fetcher or BRFetchTools.getFetcher()
+    franchises = np.arange(len(Franchises.index))
+    franchises = franchises[Franchises.index.abbreviations(franchises,season) != None] # teams of the season
+    urls = [gameLogURL(abbreviation,season,brURL) for abbreviation in Franchises.index.abbreviations(franchises,season)]
+    with ThreadPoolExecutor(max_workers=maxWorkers) as pool:
+        responses = list(pool.map(fetcher.fetch,urls))
+
+    gameLogs = []
+    for label,response in zip(Franchises.gameLabels(franchises,season),responses):
+        if response.status != 200:
+            print('From',response.url,'unexpected status code',response.status)
+            return None
+        table = BRTableParser.parseGameLog(response.text)
+        if table is None:
+            print('Warning: no table found in',response.url)
+            return None
+        table.insert(0,'Tm',label)
+        gameLogs.append(table)
+    gameLogs = pd.concat(gameLogs).sort_values('Date',kind='stable',ignore_index=True)
+    gameLogs.to_hdf(_gameLogFile(season,dataDir),key='table',mode='w')
+    print('Saved',gameLogs.shape[0],'game log rows of',len(franchises),'teams for',season)
+    return gameLogs
+
+def loadGameLogs(season,dataDir='pyData'):
+    '''
+    loadGameLogs returns the game logs of season saved by downloadGameLogs, or None if they have
+    not been downloaded.
+    '''
+    fileName = _gameLogFile(season,dataDir)
+    if not os.path.exists(fileName):
+        return None
+    return pd.read_hdf(fileName,'table')
@@ -0,0 +1,327 @@
+import functools
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+import BRTableParser
+import Franchises
+from RollingStats import countColumns, oppCountColumns
+
+'''
+BRStubServer is a local stand-in for basketball-reference.com used by the tests and benchmarks.
+It serves pages with the same table layout as BR, rendered from the data already stored in this
+repository (regSeasonData/*.csv for team pages, pyData/gamesYYYY.h5 for schedule pages, and
+synthetic box scores of those games for game log pages), so that the scraping code can be
+exercised without touching the network.
+'''
+
+# BR team URL slugs whose regSeasonData file is stored under the current abbreviation
+slugToFile = {'NJN' : 'BRK',
+              'NOH' : 'NOP'}
+
+monthOrder = ['october','november','december','january','february','march',
+              'april','may','june','july','august','september']
+
+def renderTable(columns,rows,tableID):
+    '''
+    renderTable renders a BR style stats table: a single header row followed by one body row
+    per entry of rows. The first cell of each body row is a th tag, as on BR.
+
+    Inputs:
+    columns - header labels
+    rows - list of lists of cell strings
+    tableID - id attribute of the table tag
+    '''
+    header = ''.join('<th scope="col">'+c+'</th>' for c in columns)
+    body = []
+    for row in rows:
+        cells = '<th scope="row">'+row[0]+'</th>' + ''.join('<td>'+c+'</td>' for c in row[1:])
+        body.append('<tr>'+cells+'</tr>')
+    return ('<table class="sortable stats_table" id="'+tableID+'">'
+            '<thead><tr>'+header+'</tr></thead>'
+            '<tbody>'+''.join(body)+'</tbody></table>')
+
+def renderPage(content):
+    '''renderPage wraps content in a minimal html document.'''
+    return '<html><head><title>Stub</title></head><body><div id="content">'+content+'</div></body></html>'
+
+def _cell(value):
+    '''formats a single table entry the way BR prints it'''
+    if pd.isna(value):
+        return ''
+    if isinstance(value,float):
+        return ('%.3f' % value).lstrip('0') if value < 1 else '%.1f' % value
+    return str(value)
+
+def renderTeamPage(slug,label):
+    '''
+    renderTeamPage renders a team's stats_per_game_totals (label 'o') or opp_stats_per_game_totals
+    (label 'd') page from the regSeasonData csv files. Returns None for unknown teams.
+    '''
+    abbrev = slugToFile.get(slug,slug)
+    try:
+        df = pd.read_csv('regSeasonData/'+abbrev+label+'.csv')
+    except FileNotFoundError:
+        return None
+    columns = ['' if c.startswith('Unnamed') else c for c in df.columns]
+    rows = [[_cell(v) for v in row] for row in df.itertuples(index=False,name=None)]
+    return renderPage(renderTable(columns,rows,'stats'))
+
+def renderSchedulePage(season,month=None,today=None):
+    '''
+    renderSchedulePage renders a season's schedule page (month=None), which contains the month
+    filter div and the first month's games, or the page for a single month of games. Scores are
+    synthetic (winner 110, loser 100) but consistent with the stored VisitorWin outcomes. As on BR,
+    a 'Playoffs' row (the word in every cell) precedes the first playoff game, taken to be the first
+    game after the last day with more than 4 games. Games after today (pd Timestamp, None: none)
+    are not played yet, and have no scores.
+    Returns None if there are no games for that season/month.
+    '''
+    try:
+        table = pd.read_hdf('pyData/games'+str(season)+'.h5','table')
+    except FileNotFoundError:
+        return None
+    dates = pd.to_datetime(table['Date'],format='%a, %b %d, %Y')
+    months = dates.dt.month_name().str.lower()
+    gamesPerDay = dates.value_counts()
+    playoffs = dates > gamesPerDay.index[gamesPerDay > 4].max()
+    firstPlayoffGame = playoffs.to_numpy().argmax() if playoffs.any() else -1 # position in table
+    seasonMonths = [m for m in monthOrder if (months == m).any()]
+    if month is None:
+        month = seasonMonths[0]
+    positions = (months == month).to_numpy().nonzero()[0]
+    games = table.iloc[positions]
+    if games.empty:
+        return None
+
+    # month filter div; no whitespace between the month div tags, as on BR
+    divs = ''.join('<div class="'+(' current' if m == month else '')+'"><a href="/leagues/NBA_'+str(season)
+                   +'_games-'+m+'.html">'+m.capitalize()+'</a></div>' for m in seasonMonths)
+    filterDiv = '<div class="filter">'+divs+'</div>'
+
+    columns = ['Date','Start (ET)','Visitor/Neutral','PTS','Home/Neutral','PTS','','','Attend.','Notes']
+    # full team names of the season (the games tables store abbreviations)
+    names = {column : Franchises.index.names(Franchises.index.codes(games[column],season),season)
+             for column in ['Visitor/Neutral','Home/Neutral']}
+    rows = []
+    unplayed = (dates > today).to_numpy() if today is not None else np.zeros(len(table),dtype=bool)
+    for game,date,vis,home,visWin in zip(positions,games['Date'],names['Visitor/Neutral'],names['Home/Neutral'],
+                                         games['VisitorWin']):
+        if game == firstPlayoffGame:
+            rows.append(['Playoffs']*len(columns))
+        visPTS,homPTS = ('','') if unplayed[game] else ('110','100') if visWin else ('100','110')
+        rows.append([date,'7:30p',vis,visPTS,home,homPTS,
+                     'Box Score','','18,000',''])
+    return renderPage(filterDiv+renderTable(columns,rows,'schedule'))
+
+@functools.lru_cache(maxsize=None)
+def _syntheticBoxScores(season,seed):
+    '''syntheticGameLogs, with the opponent of each game in column Opp (read-only, shared)'''
+    games = pd.read_hdf('pyData/games'+str(season)+'.h5','table')
+    dates = pd.to_datetime(games['Date'],format='%a, %b %d, %Y')
+    rng = np.random.default_rng(seed)
+    n = 2*games.shape[0] # visitor rows then home rows
+    box = pd.DataFrame({'3PA' : rng.poisson(34,n),'2PA' : rng.poisson(54,n),'FTA' : rng.poisson(22,n)})
+    box['3P'] = rng.binomial(box['3PA'],0.36)
+    box['2P'] = rng.binomial(box['2PA'],0.52)
+    box['FT'] = rng.binomial(box['FTA'],0.78)
+    box['FG'] = box['2P'] + box['3P']
+    box['FGA'] = box['2PA'] + box['3PA']
+    box['ORB'] = rng.poisson(10,n)
+    box['TRB'] = box['ORB'] + rng.poisson(34,n)
+    for c,mean in [('AST',24),('STL',7),('BLK',5),('TOV',13),('PF',20)]:
+        box[c] = rng.poisson(mean,n)
+    box['PTS'] = 2*box['2P'] + 3*box['3P'] + box['FT']
+
+    # make the winner score more (extra free throws)
+    visitorWin = games['VisitorWin'].to_numpy(dtype=bool)
+    winner = np.where(visitorWin,np.arange(n//2),np.arange(n//2)+n//2)
+    loser = np.where(visitorWin,np.arange(n//2)+n//2,np.arange(n//2))
+    extra = np.maximum(box['PTS'].to_numpy()[loser] - box['PTS'].to_numpy()[winner] + 1,0)
+    for c in ['FT','FTA','PTS']:
+        box.loc[winner,c] += extra
+    box = box[countColumns]
+
+    teams = np.concatenate([games['Visitor/Neutral'],games['Home/Neutral']])
+    opponent = np.concatenate([np.arange(n//2)+n//2,np.arange(n//2)])
+    logs = pd.concat([box,box.iloc[opponent].set_axis(oppCountColumns,axis=1).reset_index(drop=True)],axis=1)
+    logs.insert(0,'Date',np.concatenate([dates,dates]))
+    logs.insert(0,'Tm',teams)
+    logs['Opp'] = teams[opponent]
+    return logs.sort_values('Date',kind='stable').reset_index(drop=True)
+
+def syntheticGameLogs(season=2021,seed=0):
+    '''
+    syntheticGameLogs draws box scores for every game of pyData/gamesYYYY.h5, consistent with the
+    stored outcomes (the repository has no box scores). Returns the game logs (one row per team and
+    game: Tm, Date, countColumns, oppCountColumns) in date order.
+    '''
+    return _syntheticBoxScores(season,seed).drop(columns='Opp')
+
+def renderGameLogPage(abbreviation,season,today=None):
+    '''
+    renderGameLogPage renders a team's game log page (/teams/XXX/YYYY/gamelog/) from the box scores
+    of syntheticGameLogs: the opponent's stats follow the team's in a second group of columns, and
+    the header row is repeated every 20 games, as on BR. Games after today (pd Timestamp, None:
+    none) are not listed yet. Returns None if the team did not play that season.
+    '''
+    try:
+        logs = _syntheticBoxScores(int(season),0)
+    except FileNotFoundError:
+        return None
+    franchise = Franchises.index.codes([abbreviation],int(season))[0]
+    teams = Franchises.index.codes(logs['Tm'],int(season))
+    if franchise < 0 or not (teams == franchise).any():
+        return None
+    gameLog = logs[teams == franchise]
+    if today is not None:
+        gameLog = gameLog[gameLog['Date'] <= today]
+    opponents = Franchises.index.abbreviations(Franchises.index.codes(gameLog['Opp'],int(season)),int(season))
+
+    columns = (['Rk','G','Date','','Opp','W/L','Tm','Opp'] + BRTableParser.gameLogColumns + ['']
+               + BRTableParser.gameLogColumns)
+    rows = []
+    for i,(row,opponent) in enumerate(zip(gameLog.to_dict('records'),opponents)):
+        if i > 0 and i % 20 == 0:
+            rows.append(columns) # repeated header row
+        rows.append([str(i+1),str(i+1),row['Date'].strftime('%Y-%m-%d'),'',opponent,'W' if row['PTS'] > row['oppPTS'] else 'L',
+                     str(row['PTS']),str(row['oppPTS'])] + [str(row[c]) for c in BRTableParser.gameLogColumns] + ['']
+                    + [str(row['opp'+c]) for c in BRTableParser.gameLogColumns])
+    return renderPage(renderTable(columns,rows,'tgl_basic'))
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128 # many clients connect at once
+
+class BRStubServer:
+    '''
+    BRStubServer runs a local HTTP server that answers the BR URLs used by BRWebscrapeTools and
+    HiFOPredict. It records the number of requests by method, answers conditional requests
+    (If-None-Match) with 304 when the page is unchanged, and can add an artificial latency to
+    every response to mimic a remote server.
+
+    Usage:
+        with BRStubServer(latency=0.05) as server:
+            HiFOPredict(2021,date,brURL=server.url)
+    '''
+    def __init__(self,latency=0.,today=None):
+        self.latency = latency
+        self.today = today # pd Timestamp: games after it are rendered unplayed (None: every game played)
+        self.counts = {} # request method -> number of requests
+        self.paths = [] # (method,path) of each request received
+        self.notModified = 0 # number of conditional requests answered with 304
+        self.connections = 0 # number of TCP connections accepted (requests share keep-alive connections)
+        self.brokenPaths = set() # paths answered with 404 even though the page exists
+        self.lastModified = time.strftime('%a, %d %b %Y %H:%M:%S GMT',time.gmtime())
+        self._pages = {} # rendered page cache, (path,today) -> html
+        self._lock = threading.Lock()
+        self._server = _StubHTTPServer(('127.0.0.1',0),self._makeHandler())
+        self._thread = None
+
+    @property
+    def url(self):
+        '''base URL of the server, used in place of https://www.basketball-reference.com'''
+        return 'http://127.0.0.1:'+str(self._server.server_address[1])
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self,*args):
+        self.stop()
+
+    def resetCounts(self):
+        with self._lock:
+            self.counts = {}
+            self.paths = []
+            self.notModified = 0
+            self.connections = 0
+
+    def render(self,path):
+        '''returns the html for path, or None if the path does not exist on the stub'''
+        key = (path,self.today)
+        with self._lock:
+            if key in self._pages:
+                return self._pages[key]
+        parts = path.strip('/').split('/')
+        html = None
+        if len(parts) == 3 and parts[0] == 'teams':
+            if parts[2] == 'stats_per_game_totals.html':
+                html = renderTeamPage(parts[1],'o')
+            elif parts[2] == 'opp_stats_per_game_totals.html':
+                html = renderTeamPage(parts[1],'d')
+        elif len(parts) == 4 and parts[0] == 'teams' and parts[2].isdigit() and parts[3] == 'gamelog':
+            html = renderGameLogPage(parts[1],parts[2],self.today)
+        elif len(parts) == 2 and parts[0] == 'leagues' and parts[1].startswith('NBA_'):
+            name = parts[1][len('NBA_'):-len('.html')] # e.g. 2021_games or 2021_games-january
+            season,_,rest = name.partition('_')
+            if season.isdigit() and rest == 'games':
+                html = renderSchedulePage(season,today=self.today)
+            elif season.isdigit() and rest.startswith('games-'):
+                html = renderSchedulePage(season,rest[len('games-'):],self.today)
+        with self._lock:
+            self._pages[key] = html
+        return html
+
+    def _makeHandler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # keep-alive, as BR
+            disable_nagle_algorithm = True # headers and body are written separately
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def _respond(self,sendBody):
+                with stub._lock:
+                    stub.counts[self.command] = stub.counts.get(self.command,0) + 1
+                    stub.paths.append((self.command,self.path))
+                if stub.latency > 0:
+                    time.sleep(stub.latency)
+                html = None if self.path in stub.brokenPaths else stub.render(self.path)
+                if html is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length','0')
+                    self.end_headers()
+                    return
+                body = html.encode('utf-8')
+                etag = '"'+hashlib.sha1(body).hexdigest()+'"'
+                if self.headers.get('If-None-Match') == etag:
+                    with stub._lock:
+                        stub.notModified += 1
+                    self.send_response(304)
+                    self.send_header('ETag',etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type','text/html; charset=utf-8')
+                self.send_header('ETag',etag)
+                self.send_header('Last-Modified',stub.lastModified)
+                self.send_header('Content-Length',str(len(body)))
+                self.end_headers()
+                if sendBody:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                self._respond(True)
+
+            def do_HEAD(self):
+                self._respond(False)
+
+            def log_message(self,*args):
+                pass # keep test output quiet
+
+        return Handler
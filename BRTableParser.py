@@ -0,0 +1,256 @@
+import re
+from html.parser import HTMLParser
+import pandas as pd
+
+'''
+BRTableParser extracts tables from basketball-reference pages without building a DOM. It is used
+in place of pd.read_html(...,flavor='bs4') and BeautifulSoup on the pages we scrape every day:
+only the first table of the page is scanned (and only its first rows when that is all we need),
+cells are collected as plain strings, and only the requested columns are kept.
+Column names follow pd.read_html: a repeated name gets a '.1' suffix (e.g. 'PTS.1') and an empty
+header cell becomes 'Unnamed: <position>'.
+'''
+
+# columns of the schedule tables (month pages) used by BRWebscrapeTools and HiFOPredict
+scheduleColumns = ['Date','Start (ET)','Visitor/Neutral','PTS','Home/Neutral','PTS.1']
+
+class _TableParser(HTMLParser):
+    '''
+    _TableParser collects the header (last row of thead) and the body rows of a single table as
+    lists of strings. Cells with a colspan are repeated, as pd.read_html does.
+    '''
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.header = None
+        self.rows = []
+        self._inHead = False
+        self._row = None
+        self._cell = None
+        self._colspan = 1
+
+    def handle_starttag(self,tag,attrs):
+        if tag == 'tr':
+            self._row = []
+        elif (tag == 'th' or tag == 'td') and self._row is not None:
+            self._cell = []
+            colspan = dict(attrs).get('colspan')
+            self._colspan = int(colspan) if colspan and colspan.isdigit() else 1
+        elif tag == 'thead':
+            self._inHead = True
+
+    def handle_data(self,data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def handle_endtag(self,tag):
+        if (tag == 'th' or tag == 'td') and self._cell is not None:
+            self._row.extend([''.join(self._cell).strip()]*self._colspan)
+            self._cell = None
+        elif tag == 'tr' and self._row is not None:
+            if self._inHead:
+                self.header = self._row # keep the last header row (skips over_header rows)
+            else:
+                self.rows.append(self._row)
+            self._row = None
+        elif tag == 'thead':
+            self._inHead = False
+
+def _columnNames(header):
+    '''de-duplicates and fills in header names the way pd.read_html does'''
+    names = []
+    seen = {}
+    for i,name in enumerate(header):
+        if name == '':
+            name = 'Unnamed: '+str(i)
+        if name in seen:
+            seen[name] += 1
+            name = name+'.'+str(seen[name])
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def _firstTable(html,maxRows=None):
+    '''
+    _firstTable returns the html of the first table in the page, cut after maxRows body rows if
+    maxRows is given. Returns None if the page has no table.
+    '''
+    start = html.find('<table')
+    if start < 0:
+        return None
+    end = html.find('</table>',start)
+    end = len(html) if end < 0 else end + len('</table>')
+    if maxRows is not None:
+        cut = html.find('<tbody',start,end)
+        for _ in range(maxRows):
+            if cut < 0:
+                break
+            cut = html.find('</tr>',cut+1,end)
+        if cut >= 0:
+            end = cut + len('</tr>') if maxRows > 0 else cut
+    return html[start:end]
+
+def _columnIndex(names,column,html,start=0):
+    '''
+    _columnIndex returns the position of column in names (from start), raising a ValueError that
+    names the column and the table if the page does not have it (e.g. BR changed its layout).
+    '''
+    try:
+        return names.index(column,start)
+    except ValueError:
+        match = re.search(r'<table[^>]*\bid="([^"]*)"',html)
+        raise ValueError('Column '+repr(column)+' not found in table '+(repr(match.group(1)) if match else '(no id)')
+                         +' with columns '+str(names)) from None
+
+def _parseRows(html,maxRows=None):
+    '''
+    _parseRows returns the column names and the body rows (lists of strings, one entry per
+    column) of the first table of the page, or (None,None) if the page has no table.
+    '''
+    tableHTML = _firstTable(html,maxRows)
+    if tableHTML is None:
+        return None,None
+    parser = _TableParser()
+    parser.feed(tableHTML)
+    parser.close()
+    header = parser.header
+    rows = parser.rows
+    if header is None: # no thead; first row is the header
+        header,rows = rows[0],rows[1:]
+    width = len(header)
+    rows = [row[:width] if len(row) >= width else row + ['']*(width-len(row)) for row in rows]
+    return _columnNames(header),rows
+
+def parseTable(html,columns=None,numeric=(),maxRows=None):
+    '''
+    parseTable extracts the first table of a page.
+
+    Inputs:
+    html - page html
+    columns - names of the columns to keep (default: all)
+    numeric - names of the columns to convert to numbers (blank cells become NaN)
+    maxRows - number of body rows to read (default: all)
+
+    Outputs:
+    table - pd DataFrame of the table (None if the page has no table)
+    '''
+    names,rows = _parseRows(html,maxRows)
+    if names is None:
+        return None
+    keep = range(len(names)) if columns is None else [_columnIndex(names,c,html) for c in columns]
+    table = pd.DataFrame({names[j] : [row[j] for row in rows] for j in keep})
+    for c in numeric:
+        table[c] = pd.to_numeric(table[c].str.replace(',','',regex=False),errors='coerce')
+    return table
+
+def parseScheduleTable(html):
+    '''
+    parseScheduleTable extracts the games of a BR schedule (month) page.
+
+    Outputs:
+    table - pd DataFrame with columns Date, Start (ET), Visitor/Neutral, PTS, Home/Neutral, PTS.1
+            (PTS are NaN for games not yet played)
+    '''
+    return parseTable(html,scheduleColumns,numeric=['PTS','PTS.1'])
+
+def parseTeamTotals(html):
+    '''
+    parseTeamTotals extracts the most recent season (first row) of a BR team's
+    (opp_)stats_per_game_totals page, reading only that row of the table.
+
+    Outputs:
+    latestSeason - pd Series containing W, L and the FG to PTS stats (floats, NaN for blank cells)
+    '''
+    names,rows = _parseRows(html,maxRows=1)
+    if names is None or not rows:
+        raise ValueError('No team totals table in the page')
+    first = _columnIndex(names,'FG',html)
+    keep = [_columnIndex(names,'W',html),_columnIndex(names,'L',html)] + list(range(first,_columnIndex(names,'PTS',html,first)+1))
+    return pd.Series(pd.to_numeric([rows[0][j] for j in keep],errors='coerce').astype(float),index=[names[j] for j in keep])
+
+# counting stats of the game log tables (the team's, then the opponent's with a '.1' suffix)
+gameLogColumns = ['FG','FGA','3P','3PA','FT','FTA','ORB','TRB','AST','STL','BLK','TOV','PF']
+
+def parseGameLog(html):
+    '''
+    parseGameLog extracts the games of a BR team game log page (/teams/XXX/YYYY/gamelog/). The
+    header rows repeated inside the table are skipped.
+
+    Outputs:
+    table - pd DataFrame with columns Date (Timestamp), Opp, 'FG' to 'PTS' and 'oppFG' to 'oppPTS'
+            (counting stats of RollingStats.countColumns)
+    '''
+    names,rows = _parseRows(html)
+    if names is None:
+        return None
+    dateIndex = _columnIndex(names,'Date',html)
+    oppIndex = _columnIndex(names,'Opp',html)
+    rows = [row for row in rows if row[dateIndex] not in ('','Date')]
+    table = pd.DataFrame({'Date' : pd.to_datetime([row[dateIndex] for row in rows]),
+                          'Opp' : [row[oppIndex] for row in rows]})
+    # team points are in column Tm and opponent points in the second Opp column
+    for prefix,suffix,points in [('','','Tm'),('opp','.1','Opp.1')]:
+        for c in gameLogColumns+['PTS']:
+            j = _columnIndex(names,points if c == 'PTS' else c+suffix,html)
+            table[prefix+c] = pd.to_numeric([row[j] for row in rows],errors='coerce')
+    return table
+
+class _FilterLinkParser(HTMLParser):
+    '''
+    _FilterLinkParser collects the (text,href) of each link inside the first div of class filter.
+    '''
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links = []
+        self._depth = 0 # div depth inside the filter div (0: outside)
+        self.done = False
+        self._href = None
+        self._text = []
+
+    def handle_starttag(self,tag,attrs):
+        if self.done:
+            return
+        if tag == 'div':
+            if self._depth > 0:
+                self._depth += 1
+            elif 'filter' in (dict(attrs).get('class') or '').split():
+                self._depth = 1
+        elif tag == 'a' and self._depth > 0:
+            self._href = dict(attrs).get('href')
+            self._text = []
+
+    def handle_data(self,data):
+        if self._href is not None:
+            self._text.append(data)
+
+    def handle_endtag(self,tag):
+        if tag == 'a' and self._href is not None:
+            self.links.append((''.join(self._text).strip(),self._href))
+            self._href = None
+        elif tag == 'div' and self._depth > 0:
+            self._depth -= 1
+            self.done = self._depth == 0
+
+filterClassPattern = re.compile(r'class="[^"]*\bfilter\b')
+
+def parseMonthLinks(html,brURL):
+    '''
+    parseMonthLinks extracts the month names and links from the filter div of a BR season page.
+
+    Outputs:
+    monthURLs - links to each month of the season's games
+    monthNames - month names
+    '''
+    match = filterClassPattern.search(html)
+    if match is None:
+        return [],[]
+    parser = _FilterLinkParser()
+    start = html.rfind('<div',0,match.start())
+    chunk = 4096
+    while not parser.done and start < len(html): # feed only as much of the page as needed
+        parser.feed(html[start:start+chunk])
+        start += chunk
+    parser.close()
+    monthNames = [text for text,href in parser.links]
+    monthURLs = [brURL+href for text,href in parser.links]
+    return monthURLs,monthNames
@@ -0,0 +1,110 @@
+import time
+from io import StringIO
+import pandas as pd
+from bs4 import BeautifulSoup
+import BRTableParser
+import BRWebscrapeTools as br
+import BRStubServer
+
+'''
+Tests and benchmarks of BRTableParser against pd.read_html(...,flavor='bs4') and BeautifulSoup,
+on pages rendered by BRStubServer from the data in this repository.
+'''
+
+# fixtures: a schedule page, a season page (with the month filter div) and a team totals page
+schedulePage = BRStubServer.renderSchedulePage(2021,'january')
+seasonPage = BRStubServer.renderSchedulePage(2021)
+teamPage = BRStubServer.renderTeamPage('ATL','o')
+
+def testParseScheduleTable():
+    '''
+    testParseScheduleTable checks that parseScheduleTable() gives the same table, and the same
+    convertWL() output, as pd.read_html.
+    '''
+    expected = pd.read_html(StringIO(schedulePage),flavor='bs4')[0]
+    table = BRTableParser.parseScheduleTable(schedulePage)
+    print('same columns as read_html:',table.equals(expected[BRTableParser.scheduleColumns])) # expected: True
+    print('same convertWL output:',br.convertWL(table).equals(br.convertWL(expected))) # expected: True
+
+def testParseTeamTotals():
+    '''
+    testParseTeamTotals checks that parseTeamTotals() gives the same W, L and FG to PTS values as
+    the first row of the pd.read_html table.
+    '''
+    expected = pd.read_html(StringIO(teamPage),flavor='bs4')[0].iloc[0]
+    latestSeason = BRTableParser.parseTeamTotals(teamPage)
+    sameStats = (latestSeason['FG':'PTS'] == expected['FG':'PTS'].map(float)).all()
+    print('same stats:',sameStats) # expected: True
+    print('same W/L:',latestSeason['W'] == expected['W'] and latestSeason['L'] == expected['L']) # expected: True
+
+def testMalformedTables():
+    '''
+    testMalformedTables checks that a blank cell of a team totals row is read as NaN, and that a
+    missing column raises a ValueError naming the column and the table.
+    '''
+    page = ('<table id="stats"><thead><tr><th>Season</th><th>W</th><th>L</th><th>FG</th><th>FGA</th>'
+            '<th>PTS</th></tr></thead><tbody><tr><th>2020-21</th><td>41</td><td>31</td><td></td>'
+            '<td>87.6</td><td>113.7</td></tr></tbody></table>')
+    latestSeason = BRTableParser.parseTeamTotals(page)
+    print('blank FG:',latestSeason['FG'],'FGA:',latestSeason['FGA']) # expected: blank FG: nan FGA: 87.6
+    try:
+        BRTableParser.parseTable(schedulePage,['Date','Attendance'])
+    except ValueError as e:
+        print(e) # expected: Column 'Attendance' not found in table 'schedule' with columns [...]
+    try:
+        BRTableParser.parseTeamTotals(page.replace('<th>L</th>','<th>Losses</th>'))
+    except ValueError as e:
+        print(e) # expected: Column 'L' not found in table 'stats' with columns [...]
+
+def testParseMonthLinks():
+    '''
+    testParseMonthLinks checks that parseMonthLinks() finds the same links as processDivTag() on
+    a BeautifulSoup of the page.
+    '''
+    brURL = 'https://www.basketball-reference.com'
+    monthURLs,monthNames = BRTableParser.parseMonthLinks(seasonPage,brURL)
+    months = BeautifulSoup(seasonPage,'html5lib').find_all(class_='filter')
+    expectedURLs,expectedNames,_ = br.processDivTag(months,brURL)
+    print('same links:',monthURLs == expectedURLs and monthNames == expectedNames) # expected: True
+
+def _timeit(f,repeat):
+    tic = time.perf_counter()
+    for _ in range(repeat):
+        f()
+    return (time.perf_counter() - tic)/repeat
+
+def benchmarkParsers(repeat=20):
+    '''
+    benchmarkParsers times each page type with the current parse and with BRTableParser.
+    '''
+    cases = [('schedule page',
+              lambda : pd.read_html(StringIO(schedulePage),flavor='bs4')[0],
+              lambda : BRTableParser.parseScheduleTable(schedulePage)),
+             ('team totals page',
+              lambda : pd.read_html(StringIO(teamPage),flavor='bs4')[0].iloc[0],
+              lambda : BRTableParser.parseTeamTotals(teamPage)),
+             ('season page links',
+              lambda : BeautifulSoup(seasonPage,'html5lib').find_all(class_='filter'),
+              lambda : BRTableParser.parseMonthLinks(seasonPage,''))]
+    for name,current,fast in cases:
+        tCurrent = _timeit(current,repeat)
+        tFast = _timeit(fast,repeat)
+        print('%s: current (read_html/bs4) %.2f ms, BRTableParser %.2f ms, speedup %.0fx'
+              % (name,1e3*tCurrent,1e3*tFast,tCurrent/tFast))
+
+# run tests
+if __name__ == '__main__':
+    print('Test parseScheduleTable()')
+    testParseScheduleTable()
+    print('###################################')
+    print('Test parseTeamTotals()')
+    testParseTeamTotals()
+    print('###################################')
+    print('Test malformed tables')
+    testMalformedTables()
+    print('###################################')
+    print('Test parseMonthLinks()')
+    testParseMonthLinks()
+    print('###################################')
+    print('Benchmark parsers')
+    benchmarkParsers()
@@ -1,7 +1,16 @@
+import os
+import tempfile
+import threading
+from urllib.parse import urlsplit
 import pandas as pd
 from bs4 import BeautifulSoup
 import requests
 import BRWebscrapeTools as br
+import BRBackfill
+import BRFetchTools
+import BRIngest
+import GameStore
+from BRStubServer import BRStubServer, syntheticGameLogs
 
 def testExtractMonthURLs():
     '''
@@ -101,6 +110,188 @@ def testExtractSeasonsGames():
     # note: there are several clauses that remain unvisited by this test
 
 
+def testRequestCounts():
+    '''
+    testRequestCounts counts the requests extractSeasonsGames() sends for one season, using the
+    local stub server and a fetcher without a cache. Each page should be requested once, with a
+    single GET and no HEAD probes.
+    '''
+    BRFetchTools.setFetcher(BRFetchTools.BRFetcher()) # no cache, so every page is requested
+    with BRStubServer() as server:
+        # test 1: every link good
+        print('test 1')
+        seasonTable,missingMonths = br.extractSeasonsGames('2021',server.url)
+        nMonths = len([path for method,path in server.paths if '_games-' in path])
+        print('requests by method:',server.counts) # expected: 9 GETs (season page + 8 months), no HEADs
+        print('requests per page:',sum(server.counts.values())/(nMonths+1)) # expected: 1.0 (previously 2.0)
+        print('missingMonths =',missingMonths) # expected: False
+
+        # test 2: a month link that is bad is reported through missingMonths
+        print('test 2')
+        server.resetCounts()
+        server.brokenPaths.add('/leagues/NBA_2021_games-january.html')
+        brokenTable,missingMonths = br.extractSeasonsGames('2021',server.url)
+        print('requests by method:',server.counts) # expected: 9 GETs, no HEADs
+        print('missingMonths =',missingMonths) # expected: True
+        print('January excluded:',brokenTable.shape[0] < seasonTable.shape[0]) # expected: True
+    BRFetchTools.setFetcher(None)
+
+def testDownloadGameData():
+    '''
+    testDownloadGameData tests the parallel backfill of downloadGameData() against the stub
+    server: a season with a bad month is retried and reported, and a second run resumes from
+    the checkpoints, downloading only the month that was missing.
+    '''
+    BRFetchTools.setFetcher(BRFetchTools.BRFetcher()) # no cache, so every page is requested
+    with BRStubServer() as server, tempfile.TemporaryDirectory() as dataDir:
+        # test 1: January 2021 broken; 2020 completes, 2021 is saved without January
+        print('test 1')
+        server.brokenPaths.add('/leagues/NBA_2021_games-january.html')
+        badSeasons = br.downloadGameData(2020,2021,brURL=server.url,dataDir=dataDir,retries=1)
+        print('badSeasons =',badSeasons) # expected: [2021]
+        print('combined file written:',os.path.exists(dataDir+'/allGames2020_2021.h5')) # expected: False
+
+        # test 2: resume after the link is fixed; only January is downloaded
+        print('test 2')
+        server.brokenPaths.clear()
+        server.resetCounts()
+        badSeasons = br.downloadGameData(2020,2021,brURL=server.url,dataDir=dataDir)
+        print('badSeasons =',badSeasons) # expected: []
+        print('requests:',server.paths) # expected: a single GET of January 2021
+        allGames = pd.read_hdf(dataDir+'/allGames2020_2021.h5')
+        print('combined table has every game:',allGames.shape[0] == 1143 + 1171) # expected: True
+    BRFetchTools.setFetcher(None)
+
+def testBackfillInProgress():
+    '''
+    testBackfillInProgress tests that downloadGameData() does not freeze a season that is still
+    being played: the current season is downloaded again on every run, from its season page, and
+    months with unplayed games are not checkpointed until they have been played.
+    '''
+    BRFetchTools.setFetcher(BRFetchTools.BRFetcher()) # no cache, so every page is requested
+    with BRStubServer(today=pd.Timestamp('2021-01-15')) as server, tempfile.TemporaryDirectory() as dataDir:
+        checkpoints = lambda : sorted(f for f in os.listdir(dataDir+'/backfill') if f.endswith('.h5'))
+        status = lambda : BRBackfill.BackfillManifest(dataDir+'/backfill/manifest.json').season(2021)['status']
+
+        # test 1: the current season is downloaded again on every run
+        print('test 1')
+        for _ in range(2):
+            server.resetCounts()
+            badSeasons = br.downloadGameData(2021,2021,brURL=server.url,dataDir=dataDir,currentSeason=2021)
+            print('requests:',len(server.paths),'badSeasons =',badSeasons) # expected: 9 [] (season page + 8 months), twice
+        print('status:',status(),'checkpoints:',checkpoints()) # expected: in progress []
+
+        # test 2: an earlier season; only the months already played are checkpointed
+        print('test 2')
+        server.today = pd.Timestamp('2021-03-01')
+        br.downloadGameData(2021,2021,brURL=server.url,dataDir=dataDir,currentSeason=2022)
+        print('status:',status(),'checkpoints:',checkpoints()) # expected: in progress, december to february
+
+        # test 3: once played, the other months are downloaded, and the season is complete
+        print('test 3')
+        server.today = None
+        server.resetCounts()
+        badSeasons = br.downloadGameData(2021,2021,brURL=server.url,dataDir=dataDir,currentSeason=2022)
+        print('requests:',len(server.paths),'badSeasons =',badSeasons) # expected: 5 [] (march to july)
+        print('status:',status()) # expected: complete
+        stored = pd.read_hdf(dataDir+'/games2021.h5','table')
+        print('every game stored:',stored.reset_index(drop=True).equals(
+            pd.read_hdf('pyData/games2021.h5','table').reset_index(drop=True))) # expected: True
+        server.resetCounts()
+        br.downloadGameData(2021,2021,brURL=server.url,dataDir=dataDir,currentSeason=2022)
+        print('nothing downloaded again:',server.paths) # expected: []
+    BRFetchTools.setFetcher(None)
+
+class FlakyFetcher(BRFetchTools.BRFetcher):
+    '''BRFetcher whose first request of each of failPaths raises a ConnectionError'''
+    def __init__(self,failPaths):
+        super().__init__()
+        self.failPaths = set(failPaths)
+        self._lock = threading.Lock()
+
+    def fetch(self,url):
+        path = urlsplit(url).path
+        with self._lock:
+            fail = path in self.failPaths
+            self.failPaths.discard(path)
+        if fail:
+            raise requests.ConnectionError('Connection reset by the test: '+url)
+        return super().fetch(url)
+
+def testBackfillNetworkErrors():
+    '''
+    testBackfillNetworkErrors tests that network errors (a season page and a month page) do not stop
+    downloadGameData(): the seasons are marked failed, and completed by the retries.
+    '''
+    failPaths = ['/leagues/NBA_2020_games.html','/leagues/NBA_2021_games-january.html']
+    with BRStubServer() as server:
+        for retries,expected in [(0,[2020,2021]),(1,[])]:
+            with tempfile.TemporaryDirectory() as dataDir:
+                badSeasons = br.downloadGameData(2020,2021,brURL=server.url,dataDir=dataDir,retries=retries,
+                                                 fetcher=FlakyFetcher(failPaths),currentSeason=2022)
+                manifest = BRBackfill.BackfillManifest(dataDir+'/backfill/manifest.json')
+                print('retries =',retries,'badSeasons =',badSeasons,badSeasons == expected,'status:',
+                      manifest.season(2020)['status'],manifest.season(2021)['status'])
+                # expected: True failed incomplete (no retry), then True complete complete
+
+def testIngestNewGames():
+    '''
+    testIngestNewGames tests the incremental ingestion of BRIngest.ingestNewGames() against the
+    stub server, starting from a copy of the 2021 season stored up to Jan 15, 2021 (with only
+    some of that day's games).
+    '''
+    BRFetchTools.setFetcher(BRFetchTools.BRFetcher()) # no cache, so every page is requested
+    fullSeason = pd.read_hdf('pyData/games2021.h5','table')
+    gameDates = pd.to_datetime(fullSeason['Date'],format=BRIngest.dateFormat)
+    stored = pd.concat([fullSeason[gameDates < '2021-01-15'],fullSeason[gameDates == '2021-01-15'][:2]])
+    expected = fullSeason[(gameDates >= '2021-01-15') & (gameDates <= '2021-01-20')].shape[0] - 2
+    with BRStubServer() as server, tempfile.TemporaryDirectory() as dataDir:
+        stored.to_hdf(dataDir+'/games2021.h5',key='table',mode='w')
+        os.makedirs(dataDir+'/store') # the GameStore partition is updated too
+        pd.read_hdf('pyData/games2020.h5','table').to_hdf(dataDir+'/allGames2021_2021.h5',key='allGameData',mode='w')
+        print('last ingested date:',BRIngest.lastIngestedDate(2021,dataDir)) # expected: 2021-01-15
+        newGames = BRIngest.ingestNewGames(2021,pd.Timestamp('2021-01-20'),brURL=server.url,dataDir=dataDir)
+        print('requests:',server.paths) # expected: a single GET of January 2021
+        print('new games added:',newGames.shape[0] == expected) # expected: True
+        print('last ingested date:',BRIngest.lastIngestedDate(2021,dataDir)) # expected: 2021-01-20
+        seasonTable = pd.read_hdf(dataDir+'/games2021.h5','table')
+        print('no duplicates:',not seasonTable.duplicated().any()) # expected: True
+        combined = pd.read_hdf(dataDir+'/allGames2021_2021.h5')
+        print('combined table updated:',combined.shape[0] == 1143 + expected) # expected: True
+        print('store updated:',GameStore.loadSeason(2021,dataDir+'/store').nGames == seasonTable.shape[0]) # expected: True
+        # a second run finds nothing new
+        print('second run adds nothing:',BRIngest.ingestNewGames(2021,pd.Timestamp('2021-01-20'),
+                                                             brURL=server.url,dataDir=dataDir).empty) # expected: True
+        # an earlier date (a rerun for a past day) finds nothing new, without any request
+        server.resetCounts()
+        earlier = BRIngest.ingestNewGames(2021,pd.Timestamp('2021-01-10'),brURL=server.url,dataDir=dataDir)
+        print('earlier date adds nothing:',earlier.empty,server.paths) # expected: True []
+    BRFetchTools.setFetcher(None)
+
+def testDownloadGameLogs():
+    '''
+    testDownloadGameLogs tests BRIngest.downloadGameLogs() against the stub server (game logs of
+    synthetic box scores): one request per team, the stored table, and a season in progress.
+    '''
+    BRFetchTools.setFetcher(BRFetchTools.BRFetcher()) # no cache, so every page is requested
+    expected = syntheticGameLogs(2021)
+    with BRStubServer() as server, tempfile.TemporaryDirectory() as dataDir:
+        print('nothing stored:',BRIngest.loadGameLogs(2021,dataDir)) # expected: None
+        gameLogs = BRIngest.downloadGameLogs(2021,brURL=server.url,dataDir=dataDir)
+        print('requests:',server.counts,len(set(server.paths))) # expected: {'GET': 30} 30
+        keys = ['Date','Tm']
+        sameLogs = (gameLogs.drop(columns='Opp').sort_values(keys,ignore_index=True)
+                    .equals(expected.sort_values(keys,ignore_index=True)))
+        print('same game logs:',sameLogs,'stored:',BRIngest.loadGameLogs(2021,dataDir).equals(gameLogs)) # expected: True True
+
+        # season in progress: a later download adds the games played since
+        server.today = pd.Timestamp('2021-01-20')
+        partial = BRIngest.downloadGameLogs(2021,brURL=server.url,dataDir=dataDir)
+        print('games up to today:',partial.shape[0] == (expected['Date'] <= server.today).sum()) # expected: True
+        server.brokenPaths.add('/teams/GSW/2021/gamelog/')
+        print('bad page:',BRIngest.downloadGameLogs(2021,brURL=server.url,dataDir=dataDir)) # expected: None
+        print('stored table kept:',BRIngest.loadGameLogs(2021,dataDir).equals(partial)) # expected: True
+    BRFetchTools.setFetcher(None)
 
 # run tests
 if __name__ == '__main__':
@@ -112,5 +303,21 @@ if __name__ == '__main__':
     print('###################################')
     print('Test extractSeasonsGames()')
     testExtractSeasonsGames()
-
-
+    print('###################################')
+    print('Test request counts of extractSeasonsGames()')
+    testRequestCounts()
+    print('###################################')
+    print('Test downloadGameData()')
+    testDownloadGameData()
+    print('###################################')
+    print('Test downloadGameData() of a season in progress')
+    testBackfillInProgress()
+    print('###################################')
+    print('Test downloadGameData() with network errors')
+    testBackfillNetworkErrors()
+    print('###################################')
+    print('Test BRIngest.ingestNewGames()')
+    testIngestNewGames()
+    print('###################################')
+    print('Test BRIngest.downloadGameLogs()')
+    testDownloadGameLogs()
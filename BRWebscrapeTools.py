@@ -1,11 +1,14 @@
 import pandas as pd
-from bs4 import BeautifulSoup
-import requests
+import BRFetchTools
+import BRTableParser
+import Franchises
+import Instrumentation
 
 def extractMonthURLs(seasonURL,brURL):
     """
     extractMonthURLs extracts the URLs for BR data of each month of NBA play for a given season,
-    whose homepage is seasonURL. Checks that each of the extracted URLs works before returning.
+    whose homepage is seasonURL. The month links themselves are not requested here; a bad link
+    is found when its page is downloaded (see extractSeasonsGames).
     
     Inputs:
         seasonURL - BR URL containing the links to each month of the season's games
@@ -13,29 +16,40 @@ def extractMonthURLs(seasonURL,brURL):
     Outputs:
         monthURLs - links to each month of this season's games
         monthNames - month names
-        goodLink - boolean array indicating whether each URL works or not
+        goodLink - boolean array indicating whether each URL works or not (all True until downloaded)
     """
-    webpage = requests.get(seasonURL).text # send http request, store html in 'webpage'
-    # create BS object
-    soup = BeautifulSoup(webpage,'html5lib')
-    # find the tag with class = 'filter'
-    months = soup.find_all(class_='filter')
+    webpage = BRFetchTools.getFetcher().fetchText(seasonURL) # send http request (or read from cache), store html in 'webpage'
+    return monthURLsFromPage(webpage,brURL)
 
-    # extract month URLs and check links
-    monthURLs,monthNames,goodLink = processDivTag(months,brURL)
+def monthURLsFromPage(webpage,brURL):
+    """
+    monthURLsFromPage extracts the month links from the html of a season's homepage.
+    Outputs are the same as extractMonthURLs.
+    """
+    # find the links in the tag with class = 'filter'
+    with Instrumentation.stage('parse month links') as stage:
+        stage.addBytes(len(webpage))
+        monthURLs,monthNames = BRTableParser.parseMonthLinks(webpage,brURL)
+    if len(monthURLs) == 0:
+        print('Warning: no month links found in HTML tag with class "filter".')
+    for name in monthNames:
+        print(name)
+    goodLink = [True]*len(monthURLs) # checked when each month is downloaded
 
     return monthURLs,monthNames,goodLink
 
+@Instrumentation.timed('parse month links')
 def processDivTag(months,brURL):
     '''
-    processDivTag extracts month names and links from months, a BS tag object.
+    processDivTag extracts month names and links from months, a BS tag object. No requests are
+    sent to check the links: whether a link works is learned from the GET that downloads it.
 
     Inputs:
         months - BS tag object
     Outputs:
         monthURLs - links to each month of this season's games
         monthNames - month names
-        goodLink - boolean array indicating whether each URL works or not
+        goodLink - boolean array indicating whether each URL works or not (all True until downloaded)
     '''
     # check that there is a single tag with class filter
     if len(months) != 1:
@@ -58,65 +72,30 @@ def processDivTag(months,brURL):
         monthNames.append(link.text)
         print(monthNames[-1])
         monthURLs.append(brURL+link.get('href'))
-        # check that the link works
-        r = requests.head(monthURLs[-1])
-        goodLink.append(r.status_code == 200)
-        if not goodLink[-1]:
-            print('Warning: Bad link. Status code',r.status_code)
+        goodLink.append(True) # checked when the month is downloaded
             
         sibling = sibling.next_sibling
     return monthURLs,monthNames,goodLink
 
 '''
-teamNameKey: global variable giving mapping from team names to 3 letter abbreviations
+teamNameKey: mapping from team names to the 3 letter abbreviations of the game tables, for the
+teams since 1995-96 (built from Franchises for existing callers; convertWL resolves names by season)
 '''
-teamNameKey = {'Atlanta Hawks' : 'ATL',
-              'Boston Celtics' : 'BOS',
-              'Brooklyn Nets' : 'BRK',
-              'New Jersey Nets' : 'NJN', # 1977-78 to 2011-12
-              'Charlotte Hornets' : 'CHO', 
-              'Charlotte Bobcats' : 'CHA', # 2004-05 to 2013-14
-              'Chicago Bulls' : 'CHI',
-              'Cleveland Cavaliers' : 'CLE',
-              'Dallas Mavericks' : 'DAL',
-              'Denver Nuggets' : 'DEN',
-              'Detroit Pistons' : 'DET',
-              'Golden State Warriors' : 'GSW',
-              'Houston Rockets' : 'HOU',
-              'Indiana Pacers' : 'IND',
-              'Los Angeles Clippers' : 'LAC',
-              'Los Angeles Lakers' : 'LAL',
-              'Memphis Grizzlies' : 'MEM',
-              'Vancouver Grizzlies' : 'VAN', # 1995-96 to 2000-01
-              'Miami Heat' : 'MIA',
-              'Milwaukee Bucks' : 'MIL',
-              'Minnesota Timberwolves' : 'MIN',
-              'New Orleans Pelicans' : 'NOP',
-              'New Orleans/Oklahoma City Hornets' : 'NOK', # 2005-06 to 2006-07
-              'New Orleans Hornets' : 'NOH', # 2002-03 to 2012-13
-              'New York Knicks' : 'NYK',
-              'Oklahoma City Thunder' : 'OKC',
-              'Seattle SuperSonics' : 'SEA', # 1967-68 to 2007-08
-              'Orlando Magic' : 'ORL',
-              'Philadelphia 76ers' : 'PHI',
-              'Phoenix Suns' : 'PHO',
-              'Portland Trail Blazers' : 'POR',
-              'Sacramento Kings' : 'SAC',
-              'San Antonio Spurs' : 'SAS',
-              'Toronto Raptors' : 'TOR',
-              'Utah Jazz' : 'UTA',
-              'Washington Wizards' : 'WAS',
-              'Playoffs' : 'PLY'} # 'Playoffs' designation appears in every field in table
-
-def convertWL(raw_data):
+teamNameKey = {name : Franchises.storedLabels.get(abbreviation,abbreviation)
+               for _,abbreviation,name,_,last in Franchises.franchiseEras if last is None or last >= 1996}
+teamNameKey['Playoffs'] = 'PLY' # 'Playoffs' designation appears in every field in table
+
+@Instrumentation.timed('convert W-L')
+def convertWL(raw_data,season=None):
     '''
     convertWL takes a pandas DataFrame extracted from a BR webpage, and returns a DataFrame with
     a W or L assigned to each game (in the form of True/False if Visitor wins), and maps
-    spelled-out team names onto the team abbreviation. If a non-compliant team name is found, 
-    returns None.
+    spelled-out team names onto the team's label in the game tables, its abbreviation of that
+    season (see Franchises.gameLabels). If a non-compliant team name is found, returns None.
 
     Inputs:
     raw_data :  pd DataFrame extracted from a BR webpage
+    season :    second year of the season of the games (found from the dates if None)
 
     Outputs:
     my_table :  pd DataFrame containing the date, visitor and home team name abbrevations, and a
@@ -129,22 +108,22 @@ def convertWL(raw_data):
         
     # assign win or loss for visitor (True or False)
     my_table['VisitorWin'] = raw_data['PTS'] > raw_data['PTS.1'] 
-    
-    # map team names to abbreviations
-    for col in [vis,home]:
-        my_table[col] = my_table[col].map(teamNameKey)
-        
-    # check if any team names didn't map to abbreviations
+
+    # drop rows containing 'Playoffs' (the designation appears in every field of the row)
+    my_table = my_table[(my_table[vis] != 'Playoffs') & (my_table[home] != 'Playoffs')].copy()
+    if season is None:
+        season = Franchises.seasonOfDates(pd.to_datetime(my_table['Date'],format='%a, %b %d, %Y',errors='coerce'))
+
+    # map team names to franchise ids (looked up once per distinct name), then to the labels of the game tables
     for col in [vis,home]:
-        if pd.isna(my_table[col]).any():
+        franchise = Franchises.index.codes(my_table[col],season)
+        # check if any team names didn't map to abbreviations
+        if (franchise < 0).any():
             print('Error: A',col,'team had a name not matching any keys.')
             return # exit if this is the case
+        my_table[col] = Franchises.gameLabels(franchise,season)
 
-    # drop rows containing PLY
-    my_table.where(my_table != 'PLY',inplace=True) # replace 'PLY' with NaN
-    my_table.dropna(inplace=True)
-    
-    return my_table
+    return my_table.dropna()
 
 def extractMonthsGames(url):
     '''
@@ -158,19 +137,30 @@ def extractMonthsGames(url):
     processedTable :    Table containing each matchup and outcome (bool - did visitor win?). If
                         one of the team names did not match my keys, then this will be None.
     '''
-    # read table from url
-    table_list = pd.read_html(url,flavor='bs4')
-    if len(table_list) > 1: # check length
-        print('Warning: more than one table extracted from',url)
-        print('Proceeding with first table.')
+    return processMonthPage(BRFetchTools.getFetcher().fetchText(url),url)
+
+def processMonthPage(webpage,url):
+    '''
+    processMonthPage extracts the table of matchups and outcomes from the html of a month's games
+    page (downloaded from url). Outputs are the same as extractMonthsGames.
+    '''
+    # read the schedule table (first table of the page)
+    with Instrumentation.stage('parse schedule') as stage:
+        stage.addBytes(len(webpage))
+        table = BRTableParser.parseScheduleTable(webpage)
+    if table is None:
+        print('Warning: no table found in',url)
+        return None
         
-    processedTable = convertWL(table_list[0])
+    match = BRFetchTools.seasonPagePattern.search(url)
+    processedTable = convertWL(table,int(match.group(1)) if match else None)
     return processedTable
 
 def extractSeasonsGames(season,brURL):
     '''
     extractSeasonsGames scrapes BR webpages to extract the outcomes (win or loss) of 
     all NBA games of a particular season. They are returned in a single pd DataFrame.
+    One GET is sent per page (season homepage and each month), or none if the page is cached.
 
     Inputs:
         season : string with second year of season (e.g. for 2000-2001 season, '2001')
@@ -180,25 +170,32 @@ def extractSeasonsGames(season,brURL):
         seasonTable : pd DataFrame containing all the games and outcomes for single NBA season
         missingMonths : bool indicating if any month's data was excluded from the table
     '''
+    fetcher = BRFetchTools.getFetcher()
     seasonURL = brURL + '/leagues/NBA_' + season + '_games.html'
-    # check that the webpage is good
-    urlTest = requests.head(seasonURL)
-    if urlTest.status_code != 200:
-        print('From',seasonURL,'unexpected status code',urlTest.status_code)
+    # download the season homepage, checking that the webpage is good
+    response = fetcher.fetch(seasonURL)
+    if response.status != 200:
+        print('From',seasonURL,'unexpected status code',response.status)
         return None,None #expects two outputs
     
     # get URLs for each month of games
-    monthURLs,monthNames,goodLink = extractMonthURLs(seasonURL,brURL)
+    monthURLs,monthNames,goodLink = monthURLsFromPage(response.text,brURL)
     
     # loop through months to get data for each month
     monthTables = [] # array for storing season's month's tables
     for i,url in enumerate(monthURLs):
+        if goodLink[i]:
+            # the download tells us whether the link works
+            response = fetcher.fetch(url)
+            goodLink[i] = response.status == 200
+            if not goodLink[i]:
+                print('Warning: Bad link. Status code',response.status)
         if not goodLink[i]:
             print('Bad link for',monthNames[i],':',url)
             print('Skipping and proceeding.')
             continue
         else:
-            processedTable = extractMonthsGames(url)
+            processedTable = processMonthPage(response.text,url)
             if processedTable is not None:
                 monthTables.append(processedTable)
             else:
@@ -216,37 +213,22 @@ def extractSeasonsGames(season,brURL):
     
     return seasonTable,missingMonths
 
-def downloadGameData(initialSeason,finalSeason):
+def downloadGameData(initialSeason,finalSeason,**kwargs):
     '''
+    downloadGameData downloads every season's games and saves them to pyData/gamesYYYY.h5, and,
+    if every season was downloaded perfectly, to a single pyData/allGamesXXXX_YYYY.h5 table.
+    Seasons and months are downloaded in parallel, and an interrupted run resumes from the last
+    completed month (see BRBackfill.runBackfill, which accepts the same keyword arguments).
+
     Inputs:
     initialSeason : int indicating starting season to get data (second year of season e.g. 2000 for 1999-2000 season)
     finalSeason : int indicating final seaon to get data for
+
+    Outputs:
+    badSeasons : list of seasons for which downloading data failed to meet all assumptions
     '''
-    brURL = 'https://www.basketball-reference.com'
-    seasonTables = [] # to store tables from each season
-    badSeasons = [] # to store seasons for which downloading data failed to meet all assumptions
-    
-    # loop over and download each season's data
-    for season in range(initialSeason,finalSeason+1):
-        print('Dowloading',season,'season data...')
-        table,missingMonths = extractSeasonsGames(str(season),brURL)
-        # case: no table returned
-        if table is None:
-            badSeasons.append(season)
-        else:
-            # store table
-            seasonTables.append(table)
-            table.to_hdf('pyData/games'+str(season)+'.h5','table',mode='w')
-            # case: there was a missing month
-            if missingMonths:
-                badSeasons.append(season)
-        print('##################################')
-    
-    # if all data was downloaded perfectly, combine into single pd DataFrame and save it
-    if len(badSeasons) == 0:
-        print('Saving all data to a single table!')
-        allGameData = pd.concat(seasonTables)
-        allGameData.to_hdf('pyData/allGames'+str(initialSeason)+'_'+str(finalSeason)+'.h5','allGameData',mode='w')
+    import BRBackfill # imported here since BRBackfill builds on this module
+    return BRBackfill.runBackfill(initialSeason,finalSeason,**kwargs)
 
 if __name__ == '__main__':
     downloadGameData(2001,2021)
@@ -0,0 +1,197 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import BRIngest
+import Evaluation
+import Franchises
+import GameStore
+import HiFOTraining
+import LogisticTrainer
+from HiFOModel import CompiledModel
+from RollingStats import RollingTeamStats
+
+'''
+Backtest replays seasons walk-forward, using only what was known on each game date:
+
+    - the model is retrained at the start of each season, on the games and season-average stats
+      of the earlier seasons only (PCA, training matrix, Newton fit)
+    - each game is scored with the team stats as of the day before it: the team's season-to-date
+      stats from its game logs (RollingStats) once it has played minGames games, and until then
+      (or when there are no game logs) the team's stats from the previous season
+
+The season-final averages of the season being scored are never used (they include the games
+being predicted). All the dates of a season are scored at once: the team stats as of every date
+are gathered into one (dates x teams x 42) array, and seasons run in parallel in a process pool.
+Games and stats are read from the GameStore (memory-mapped by every worker), and game logs from
+pyData/gameLogsYYYY.h5 (downloaded with BRIngest.downloadGameLogs).
+
+Usage:
+    predictions,summary = walkForward(2002,2021)
+'''
+
+# franchise whose previous season stands in for another franchise's first season: BR keeps the
+# Charlotte Hornets of 1988-89 to 2001-02 (CHH) with the Charlotte franchise, but their roster moved
+# to New Orleans (franchises that were renamed or moved keep their id, see Franchises)
+_newOrleans,_charlotte = Franchises.index.codes(['NOH','CHH'])
+rosterPredecessor = {_newOrleans : _charlotte}
+
+def _seasonYear(labels):
+    '''converts season labels ('2020-21') into the second year of the season (2021)'''
+    return pd.Series(labels).astype(str).str[:4].astype(int).to_numpy() + 1
+
+def seasonGames(season,storeDir=GameStore.defaultStoreDir):
+    '''
+    seasonGames returns the games of a season from the store, as a pd DataFrame with columns
+    Date (Timestamp), Visitor/Neutral, Home/Neutral, VisitorWin.
+    '''
+    teams = np.array(GameStore.loadTeams(storeDir),dtype=object)
+    partition = GameStore.loadSeason(season,storeDir)
+    return pd.DataFrame({'Date' : pd.to_datetime(np.asarray(partition.date),unit='D'),
+                         'Visitor/Neutral' : teams[partition.visitor],
+                         'Home/Neutral' : teams[partition.home],
+                         'VisitorWin' : GameStore.visitorWin(partition)})
+
+def _priorStats(season,franchises,past):
+    '''
+    (franchises x 42) stats of each franchise at the start of season: its stats of the previous
+    season (of its roster predecessor if it has none), or the league average for new teams.
+    '''
+    seasons,rowTable = HiFOTraining.teamRowIndex(past)
+    statMat = past.loc[:,'FG':'oppPTS'].to_numpy(dtype=np.float64)
+    previous = seasons.get_loc(GameStore.seasonLabel(season-1))
+    previousRows = rowTable[previous][rowTable[previous] >= 0]
+    prior = np.empty((len(franchises),statMat.shape[1]))
+    for i,franchise in enumerate(franchises):
+        rows = [rowTable[previous,f] for f in [franchise,rosterPredecessor.get(franchise)] if f is not None]
+        rows = [row for row in rows if row >= 0]
+        prior[i] = statMat[rows[0]] if rows else statMat[previousRows].mean(axis=0)
+    return prior
+
+def backtestSeason(season,teamStats,trainingGames,games,gameLogs=None,minGames=10):
+    '''
+    backtestSeason scores the games of one season walk-forward.
+
+    Inputs:
+    season - season to score (second year of season, int)
+    teamStats - table of season-average stats (Season, Tm, 'FG' to 'oppPTS'), e.g. GameStore.loadTeamStats();
+                only the rows of earlier seasons are used
+    trainingGames - table of games (Season, Visitor/Neutral, Home/Neutral, VisitorWin), e.g.
+                    GameStore.loadGameData; only the games of earlier seasons are used
+    games - games of the season (Date, Visitor/Neutral, Home/Neutral, VisitorWin), see seasonGames
+    gameLogs - game logs of the season (Tm, Date, RollingStats.countColumns and oppCountColumns),
+               or None to use the previous season's stats throughout
+    minGames - number of games a team must have played before its season-to-date stats are used
+
+    Outputs:
+    predictions - pd DataFrame with columns Season, Date, Visitor, Home, VisitorWin and
+                  Visitor win probability, one row per game
+    '''
+    # nothing from this season or later goes into the model or the team stats
+    past = teamStats[_seasonYear(teamStats['Season']) < season]
+    trainingGames = trainingGames[_seasonYear(trainingGames['Season']) < season]
+
+    # model as it stood at the start of the season
+    statMean,PCABasis = HiFOTraining.generatePCAVectors(past,None)
+    x,y = HiFOTraining.buildDesignMatrix(statMean,PCABasis,trainingGames,past)
+    w,_,_ = LogisticTrainer.trainNewton(x,y)
+    model = CompiledModel.fromParameters(w,statMean,PCABasis)
+
+    # team stats as of each game date: (dates x teams x 42), teams being the franchise ids of the games
+    n = games.shape[0]
+    franchise = Franchises.index.codes(np.concatenate([games['Visitor/Neutral'],games['Home/Neutral']]),season)
+    teams,gameTeams = np.unique(franchise,return_inverse=True)
+    dates,dateCodes = np.unique(games['Date'].to_numpy(),return_inverse=True)
+    state = np.broadcast_to(_priorStats(season,teams,past),(len(dates),len(teams),statMean.shape[0]))
+    if gameLogs is not None:
+        rolling = RollingTeamStats()
+        rolling.addGameLogs(gameLogs)
+        played,stats,_ = rolling.snapshots(dates)
+        rollingRow = np.full(len(Franchises.index)+1,-1) # the extra -1 for unknown teams
+        rollingRow[Franchises.index.codes(rolling.teams,season)] = np.arange(len(rolling.teams))
+        order = rollingRow[teams]
+        known = order >= 0
+        inSeason = np.zeros((len(dates),len(teams)),dtype=bool)
+        inSeason[:,known] = played[:,order[known]] >= minGames
+        rollingState = np.zeros(state.shape)
+        rollingState[:,known] = stats[:,order[known]]
+        state = np.where(inSeason[:,:,None],rollingState,state)
+
+    # score every game at once
+    visitor,home = gameTeams[:n],gameTeams[n:]
+    probability = model.probability(state[dateCodes,visitor],state[dateCodes,home])
+    return pd.DataFrame({'Season' : season,
+                         'Date' : games['Date'].to_numpy(),
+                         'Visitor' : games['Visitor/Neutral'].to_numpy(),
+                         'Home' : games['Home/Neutral'].to_numpy(),
+                         'VisitorWin' : games['VisitorWin'].to_numpy(dtype=bool),
+                         'Visitor win probability' : probability})
+
+def _backtestStoreSeason(season,storeDir,gameLogs,minGames):
+    '''backtestSeason with the data read from the store (run in the worker processes)'''
+    firstSeason = GameStore.storeSeasons(storeDir)[0]
+    return backtestSeason(season,GameStore.loadTeamStats(storeDir),
+                          GameStore.loadGameData(firstSeason,season-1,storeDir),
+                          seasonGames(season,storeDir),gameLogs,minGames)
+
+def summarize(predictions,by='Season'):
+    '''
+    summarize aggregates the scores of backtest predictions.
+
+    Inputs:
+    predictions - table from backtestSeason or walkForward
+    by - column to group by (e.g. Season), or None for a single row over all games
+
+    Outputs:
+    summary - pd DataFrame indexed by group ('all' if by is None), with the number of games, Brier
+              score, log-loss and accuracy (games whose favourite won) of each group
+    '''
+    if by is None:
+        codes,groups = np.zeros(len(predictions),dtype=np.intp),pd.Index(['all'])
+    else:
+        codes,groups = pd.factorize(predictions[by],sort=True)
+    return pd.DataFrame(Evaluation.scores(predictions['Visitor win probability'],predictions['VisitorWin'],codes,len(groups)),
+                        index=pd.Index(groups,name=by))
+
+def walkForward(initialSeason=None,finalSeason=None,storeDir=GameStore.defaultStoreDir,maxWorkers=None,
+                gameLogs=None,minGames=10,gameLogDir='pyData'):
+    '''
+    walkForward backtests every season from initialSeason to finalSeason, one season per worker
+    process.
+
+    Inputs:
+    initialSeason, finalSeason - range of seasons (second year of season, inclusive); defaults to
+                                 every season of the store after the first (which has no earlier
+                                 season to train on)
+    storeDir - GameStore directory
+    maxWorkers - number of worker processes (default: number of CPUs; 1 runs in this process)
+    gameLogs - dict of season -> game logs of the season (see backtestSeason), for the seasons
+               that have them; defaults to the game logs stored in gameLogDir
+    minGames - see backtestSeason
+    gameLogDir - directory of the game logs saved by BRIngest.downloadGameLogs
+
+    Outputs:
+    predictions - table of every game's prediction (see backtestSeason)
+    summary - scores of each season, and of all games (row 'all')
+    '''
+    GameStore.checkStore(storeDir,minSeasons=2) # the first season has no earlier season to train on
+    storeSeasons = GameStore.storeSeasons(storeDir)
+    initialSeason = initialSeason or storeSeasons[1]
+    finalSeason = finalSeason or storeSeasons[-1]
+    seasons = list(range(initialSeason,finalSeason+1))
+    if gameLogs is None:
+        gameLogs = {season : BRIngest.loadGameLogs(season,gameLogDir) for season in seasons}
+    args = ([storeDir]*len(seasons),[gameLogs.get(season) for season in seasons],[minGames]*len(seasons))
+    maxWorkers = maxWorkers or os.cpu_count()
+    if maxWorkers == 1:
+        results = list(map(_backtestStoreSeason,seasons,*args))
+    else:
+        with ProcessPoolExecutor(max_workers=min(maxWorkers,len(seasons))) as pool:
+            results = list(pool.map(_backtestStoreSeason,seasons,*args))
+    predictions = pd.concat(results,ignore_index=True)
+    summary = pd.concat([summarize(predictions),summarize(predictions,None)])
+    return predictions,summary
+
+if __name__ == '__main__':
+    predictions,summary = walkForward()
+    print(summary)
@@ -0,0 +1,111 @@
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import Backtest
+import BRStubServer
+import GameStore
+import HiFOTraining
+import LogisticTrainer
+
+'''
+Tests and benchmark of Backtest on the GameStore (pyData/store, built with python GameStore.py).
+'''
+
+def testNoLeakage(season=2010):
+    '''
+    testNoLeakage checks that the predictions of a season do not change when everything from that
+    season on (team stats, outcomes) is replaced by garbage, and that with game logs a game's
+    prediction depends only on the games played before its date.
+    '''
+    teamStats = GameStore.loadTeamStats()
+    trainingGames = GameStore.loadGameData(2001,2021)
+    games = Backtest.seasonGames(season)
+    expected = Backtest.backtestSeason(season,teamStats,trainingGames,games)
+
+    # test 1: future stats and outcomes are not used
+    print('test 1')
+    rng = np.random.default_rng(0)
+    future = Backtest._seasonYear(teamStats['Season']) >= season
+    badStats = teamStats.copy()
+    statColumns = list(badStats.loc[:,'FG':'oppPTS'].columns)
+    badStats[statColumns] = np.where(future[:,None],rng.normal(size=(future.shape[0],42)),
+                                     badStats[statColumns].to_numpy()).astype(np.float32)
+    badGames = trainingGames.copy()
+    futureGames = Backtest._seasonYear(badGames['Season']) >= season
+    badGames.loc[futureGames,'VisitorWin'] = rng.random(futureGames.sum()) < 0.5
+    predictions = Backtest.backtestSeason(season,badStats,badGames,games)
+    print('same predictions:',predictions.equals(expected)) # expected: True
+    print('games:',predictions.shape[0] == games.shape[0],'probabilities in (0,1):',
+          ((predictions['Visitor win probability'] > 0) & (predictions['Visitor win probability'] < 1)).all()) # expected: True True
+
+    # test 2: with game logs, games are scored from the stats of earlier dates only
+    print('test 2')
+    games = Backtest.seasonGames(2021)
+    logs = BRStubServer.syntheticGameLogs(2021)
+    withLogs = Backtest.backtestSeason(2021,teamStats,trainingGames,games,logs)
+    cutoff = pd.Timestamp('2021-02-15')
+    truncated = Backtest.backtestSeason(2021,teamStats,trainingGames,games,logs[logs['Date'] < cutoff])
+    before = withLogs['Date'] <= cutoff
+    print('same predictions up to the cutoff:',withLogs[before].equals(truncated[before])) # expected: True
+    withoutLogs = Backtest.backtestSeason(2021,teamStats,trainingGames,games)
+    early = withLogs['Date'] <= games['Date'].min() + pd.Timedelta(days=10) # nobody has played 10 games yet
+    print('previous season stats until minGames:',withLogs[early].equals(withoutLogs[early]),
+          'then season-to-date stats:',not withLogs[~before].equals(withoutLogs[~before])) # expected: True True
+
+def testWalkForward():
+    '''
+    testWalkForward checks that the process pool gives the same predictions as running the seasons
+    one after the other, the summary scores, and that stored game logs are loaded.
+    '''
+    predictions,summary = Backtest.walkForward(2015,2018,maxWorkers=1)
+    parallelPredictions,parallelSummary = Backtest.walkForward(2015,2018,maxWorkers=4)
+    print('same predictions:',predictions.equals(parallelPredictions),summary.equals(parallelSummary)) # expected: True True
+    print('seasons:',list(summary.index)) # expected: [2015, 2016, 2017, 2018, 'all']
+    p = predictions['Visitor win probability']
+    y = predictions['VisitorWin']
+    print('Brier score:',np.isclose(summary.loc['all','Brier'],((p - y)**2).mean()),
+          'accuracy:',np.isclose(summary.loc['all','Accuracy'],((p > 0.5) == y).mean())) # expected: True True
+
+    # the game logs saved by BRIngest.downloadGameLogs are used by default
+    logs = BRStubServer.syntheticGameLogs(2021)
+    with tempfile.TemporaryDirectory() as gameLogDir:
+        logs.to_hdf(os.path.join(gameLogDir,'gameLogs2021.h5'),key='table',mode='w')
+        stored,_ = Backtest.walkForward(2021,2021,maxWorkers=1,gameLogDir=gameLogDir)
+    given,_ = Backtest.walkForward(2021,2021,maxWorkers=1,gameLogs={2021 : logs})
+    withoutLogs,_ = Backtest.walkForward(2021,2021,maxWorkers=1,gameLogs={})
+    print('stored game logs used:',stored.equals(given),not stored.equals(withoutLogs)) # expected: True True
+
+def benchmarkWalkForward():
+    '''
+    benchmarkWalkForward times the walk-forward backtest of every season (2002 to 2021), in this
+    process and in a process pool, and compares its 2020-21 scores with the notebook's evaluation
+    (season-final averages of 2020-21, which include the games being predicted).
+    '''
+    for maxWorkers in [1,None]:
+        tic = time.perf_counter()
+        predictions,summary = Backtest.walkForward(maxWorkers=maxWorkers)
+        print('walkForward, %s: %.2f s' % ('1 process' if maxWorkers == 1 else 'process pool',
+                                           time.perf_counter() - tic))
+    print(summary.round(3))
+
+    teamStats = GameStore.loadTeamStats()
+    statMean,PCABasis = HiFOTraining.generatePCAVectors(teamStats[Backtest._seasonYear(teamStats['Season']) < 2021],None)
+    x,y = HiFOTraining.buildDesignMatrix(statMean,PCABasis,GameStore.loadGameData(2001,2020),teamStats)
+    w,_,_ = LogisticTrainer.trainNewton(x,y)
+    x,y = HiFOTraining.buildDesignMatrix(statMean,PCABasis,GameStore.loadGameData(2021,2021),teamStats)
+    leaky = pd.DataFrame({'VisitorWin' : y.astype(bool),'Visitor win probability' : HiFOTraining.sigma(x @ w)})
+    print('2020-21 with its own season-final averages (leaks):')
+    print(Backtest.summarize(leaky,None).round(3))
+
+# run tests
+if __name__ == '__main__':
+    print('Test no leakage')
+    testNoLeakage()
+    print('###################################')
+    print('Test walk-forward')
+    testWalkForward()
+    print('###################################')
+    print('Benchmark walk-forward')
+    benchmarkWalkForward()
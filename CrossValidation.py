@@ -0,0 +1,173 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from scipy.special import expit
+import Backtest
+import GameStore
+import HiFOTraining
+import LogisticTrainer
+import StatPCA
+
+'''
+CrossValidation runs leave-one-season-out cross-validation of the PCA + logistic pipeline for
+several numbers of PCA basis vectors (nBasis), the folds running in a process pool. For each
+held-out season, the PCA is computed without that season's team stats, the model is trained on
+the games of the other seasons, and the held-out season's games are scored (with that season's
+team stats, as in the notebooks; Backtest gives the scores of actual forecasts).
+
+    - the data (team stats, game rows, outcomes) is loaded once and put in shared memory, which
+      every worker maps instead of receiving a pickled copy
+    - the covariance of each fold is the total covariance sums minus the held-out season's sums
+      (count, sum and outer-product sum of each season are computed once), so no fold goes back
+      over the team stats to build its covariance
+    - the PCA of a fold is computed once (StatPCA.decompose) for all the values of nBasis
+
+Usage:
+    predictions,summary = crossValidate(2002,2021,nBasisList=[3,5,7,9])
+'''
+
+'''
+SHARED DATA
+'''
+_shared = {} # name -> array, in the worker processes (and in this process when maxWorkers is 1)
+_blocks = [] # shared memory blocks attached by this process
+
+def _share(arrays):
+    '''copies arrays into new shared memory blocks; returns the blocks and their specs for _attach'''
+    blocks = []
+    specs = {}
+    for name,array in arrays.items():
+        block = shared_memory.SharedMemory(create=True,size=max(array.nbytes,1))
+        np.ndarray(array.shape,array.dtype,buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[name] = (block.name,array.shape,array.dtype.str)
+    return blocks,specs
+
+def _attach(specs):
+    '''worker initializer: maps the shared blocks as read-only arrays'''
+    for name,(blockName,shape,dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=blockName)
+        _blocks.append(block)
+        array = np.ndarray(shape,dtype,buffer=block.buf)
+        array.flags.writeable = False
+        _shared[name] = array
+
+def prepareData(initialSeason,finalSeason,storeDir=GameStore.defaultStoreDir):
+    '''
+    prepareData loads the games of the seasons and their teams' stats into arrays.
+
+    Outputs:
+    data - dict of arrays:
+        stats - (rows x 42) team stats of the seasons
+        rowSeason - season code (0 for initialSeason, ...) of each row of stats
+        visitorRows, homeRows - row of stats of each game's visiting and home team
+        gameSeason - season code of each game
+        y - outcomes (1.0 if visiting team won)
+        seasonCount, seasonSum, seasonOuter - number of rows, sum of the rows and sum of their
+                                              outer products, for each season
+    '''
+    dataset = GameStore.loadGameData(initialSeason,finalSeason,storeDir)
+    dfTeamData = GameStore.loadTeamStats(storeDir)
+    dfTeamData = dfTeamData[dfTeamData['Season'].isin(dataset['Season'].cat.categories)].reset_index(drop=True)
+    seasons = pd.Index([GameStore.seasonLabel(season) for season in range(initialSeason,finalSeason+1)])
+    stats = dfTeamData.loc[:,'FG':'oppPTS'].to_numpy(dtype=np.float64)
+    rowSeason = seasons.get_indexer(dfTeamData['Season'].astype(str))
+    visitorRows,homeRows = HiFOTraining.gameRows(dataset,dfTeamData)
+    nSeasons = len(seasons)
+    seasonSum = np.zeros((nSeasons,stats.shape[1]))
+    np.add.at(seasonSum,rowSeason,stats)
+    seasonOuter = np.zeros((nSeasons,stats.shape[1],stats.shape[1]))
+    for k in range(nSeasons):
+        seasonStats = stats[rowSeason == k]
+        seasonOuter[k] = seasonStats.T @ seasonStats
+    return {'stats' : stats,
+            'rowSeason' : rowSeason,
+            'visitorRows' : visitorRows,
+            'homeRows' : homeRows,
+            'gameSeason' : seasons.get_indexer(dataset['Season'].astype(str)),
+            'y' : dataset['VisitorWin'].to_numpy(dtype=np.float64),
+            'seasonCount' : np.bincount(rowSeason,minlength=nSeasons),
+            'seasonSum' : seasonSum,
+            'seasonOuter' : seasonOuter}
+
+'''
+FOLDS
+'''
+def foldPCA(k,data):
+    '''
+    foldPCA computes the PCA of the team stats without season k, from the season sums.
+
+    Outputs:
+    statMean - mean of each stat
+    eigenvalues, basis - as StatPCA.decompose
+    '''
+    return StatPCA.decompose(data['seasonCount'].sum() - data['seasonCount'][k],
+                             data['seasonSum'].sum(axis=0) - data['seasonSum'][k],
+                             data['seasonOuter'].sum(axis=0) - data['seasonOuter'][k])
+
+def runFold(k,nBasisList,data=None):
+    '''
+    runFold holds out season k: for each nBasis, trains the model on the other seasons and scores
+    the held-out games.
+
+    Outputs:
+    probabilities - (len(nBasisList) x held-out games) visitor win probabilities
+    '''
+    data = _shared if data is None else data
+    statMean,_,basis = foldPCA(k,data)
+    teamPCA = (data['stats'] - statMean) @ basis[:,:max(nBasisList)]
+    test = data['gameSeason'] == k
+    probabilities = np.empty((len(nBasisList),test.sum()))
+    for i,nBasis in enumerate(nBasisList):
+        x = np.hstack([np.ones((len(test),1)),teamPCA[data['visitorRows'],:nBasis],teamPCA[data['homeRows'],:nBasis]])
+        w,_,_ = LogisticTrainer.trainNewton(x[~test],data['y'][~test])
+        probabilities[i] = expit(x[test] @ w)
+    return probabilities
+
+def crossValidate(initialSeason=2002,finalSeason=2021,nBasisList=(3,5,7,9,11),storeDir=GameStore.defaultStoreDir,
+                  maxWorkers=None):
+    '''
+    crossValidate runs every fold (one per season) for every nBasis.
+
+    Inputs:
+    initialSeason, finalSeason - seasons of the games (second year of season, inclusive)
+    nBasisList - numbers of PCA basis vectors to try
+    storeDir - GameStore directory
+    maxWorkers - number of worker processes (default: number of CPUs; 1 runs in this process)
+
+    Outputs:
+    predictions - pd DataFrame with columns Season (held out), nBasis, VisitorWin and Visitor win
+                  probability, one row per game and nBasis
+    summary - scores of each nBasis over all folds (see Backtest.summarize)
+    '''
+    data = prepareData(initialSeason,finalSeason,storeDir)
+    folds = list(range(finalSeason-initialSeason+1))
+    nBasisList = list(nBasisList)
+    maxWorkers = maxWorkers or os.cpu_count()
+    if maxWorkers == 1:
+        results = [runFold(k,nBasisList,data) for k in folds]
+    else:
+        blocks,specs = _share(data)
+        try:
+            with ProcessPoolExecutor(max_workers=min(maxWorkers,len(folds)),initializer=_attach,
+                                     initargs=(specs,)) as pool:
+                results = list(pool.map(runFold,folds,[nBasisList]*len(folds)))
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    tables = []
+    for k,probabilities in zip(folds,results):
+        y = data['y'][data['gameSeason'] == k].astype(bool)
+        for nBasis,p in zip(nBasisList,probabilities):
+            tables.append(pd.DataFrame({'Season' : initialSeason+k,'nBasis' : nBasis,'VisitorWin' : y,
+                                        'Visitor win probability' : p}))
+    predictions = pd.concat(tables,ignore_index=True)
+    return predictions,Backtest.summarize(predictions,'nBasis')
+
+if __name__ == '__main__':
+    predictions,summary = crossValidate()
+    print(summary)
@@ -0,0 +1,97 @@
+import pickle
+import time
+import numpy as np
+import pandas as pd
+from scipy.special import expit
+import CrossValidation
+import GameStore
+import HiFOTraining
+import LogisticTrainer
+
+'''
+Tests and benchmark of CrossValidation against folds run by hand, as in the notebooks
+(generatePCAVectors, buildDesignMatrix, then a fit), on the GameStore.
+'''
+
+def handFold(heldOut,nBasis,dataset,dfTeamData):
+    '''
+    handFold runs one fold the way the notebooks do: the PCA recomputed from the team stats
+    without the held-out season (np.linalg.eig), the training matrix built for the other seasons.
+    Returns the held-out games' visitor win probabilities.
+    '''
+    dfTrain = dfTeamData[dfTeamData['Season'] != heldOut]
+    teamDataMat = dfTrain.loc[:,'FG':'oppPTS'].to_numpy(dtype=float)
+    statMean = np.mean(teamDataMat,axis=0)
+    teamDataZero = teamDataMat - statMean
+    covLam,covVec = np.linalg.eig(1/teamDataZero.shape[0]*np.dot(teamDataZero.T,teamDataZero))
+    PCABasis = covVec[:,np.argsort(covLam)[::-1][:nBasis]].real
+    test = (dataset['Season'] == heldOut).to_numpy()
+    x,y = HiFOTraining.buildDesignMatrix(statMean,PCABasis,dataset,dfTeamData)
+    w,_,_ = LogisticTrainer.trainNewton(x[~test],y[~test])
+    return expit(x[test] @ w)
+
+def _tables(initialSeason,finalSeason):
+    dataset = GameStore.loadGameData(initialSeason,finalSeason)
+    dfTeamData = GameStore.loadTeamStats()
+    dfTeamData = dfTeamData[dfTeamData['Season'].isin(dataset['Season'].cat.categories)]
+    return dataset,dfTeamData
+
+def testCrossValidation():
+    '''
+    testCrossValidation checks the downdated fold PCA against the PCA recomputed without the
+    held-out season, and the fold predictions (in this process and in the pool) against handFold.
+    '''
+    dataset,dfTeamData = _tables(2002,2021)
+    data = CrossValidation.prepareData(2002,2021)
+
+    # test 1: fold covariance by downdating
+    print('test 1')
+    k = 8 # 2009-10
+    heldOut = GameStore.seasonLabel(2002+k)
+    statMean,eigenvalues,basis = CrossValidation.foldPCA(k,data)
+    expectedMean,expectedBasis = HiFOTraining.generatePCAVectors(dfTeamData,heldOut)
+    print('same mean:',np.allclose(statMean,expectedMean)) # expected: True
+    print('same basis:',np.allclose(basis[:,:7],expectedBasis)) # expected: True
+    print('decreasing eigenvalues:',(np.diff(eigenvalues) <= 0).all()) # expected: True
+
+    # test 2: predictions of the folds
+    print('test 2')
+    nBasisList = [3,7]
+    probabilities = CrossValidation.runFold(k,nBasisList,data)
+    print('same as by hand:',all(np.allclose(p,handFold(heldOut,nBasis,dataset,dfTeamData))
+                                 for nBasis,p in zip(nBasisList,probabilities))) # expected: True
+    predictions,summary = CrossValidation.crossValidate(2002,2021,nBasisList,maxWorkers=1)
+    parallelPredictions,parallelSummary = CrossValidation.crossValidate(2002,2021,nBasisList,maxWorkers=4)
+    print('same in the process pool:',np.allclose(predictions['Visitor win probability'],
+                                                  parallelPredictions['Visitor win probability'])) # expected: True
+    print('rows:',predictions.shape[0] == 2*dataset.shape[0],list(summary.index)) # expected: True [3, 7]
+
+def benchmarkCrossValidation(nBasisList=(3,5,7,9,11)):
+    '''
+    benchmarkCrossValidation times the 20 folds x nBasisList run by hand (handFold), and by
+    crossValidate in this process and in a process pool, and the data each worker would receive
+    as pickled copies.
+    '''
+    dataset,dfTeamData = _tables(2002,2021)
+    seasons = [GameStore.seasonLabel(season) for season in range(2002,2022)]
+    tic = time.perf_counter()
+    for heldOut in seasons:
+        for nBasis in nBasisList:
+            handFold(heldOut,nBasis,dataset,dfTeamData)
+    print('by hand: %.2f s' % (time.perf_counter() - tic))
+    for maxWorkers in [1,None]:
+        tic = time.perf_counter()
+        predictions,summary = CrossValidation.crossValidate(2002,2021,nBasisList,maxWorkers=maxWorkers)
+        print('crossValidate, %s: %.2f s' % ('1 process' if maxWorkers == 1 else 'process pool',
+                                             time.perf_counter() - tic))
+    data = CrossValidation.prepareData(2002,2021)
+    print('shared data: %.2f MB (pickled once per task otherwise)' % (len(pickle.dumps(data))/1e6))
+    print(summary.round(4))
+
+# run tests
+if __name__ == '__main__':
+    print('Test cross-validation')
+    testCrossValidation()
+    print('###################################')
+    print('Benchmark cross-validation')
+    benchmarkCrossValidation()
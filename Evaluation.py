@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import binom
+
+'''
+Evaluation scores predicted win probabilities against outcomes, replacing the loops of
+LogisticRegression1.ipynb:
+
+    - scores: Brier score, log-loss and accuracy, overall or per group (np.bincount)
+    - reliability: the reliability diagram table (games, predicted and actual win fractions per
+      probability bin), binned with one np.digitize and aggregated with np.bincount
+    - binomialInterval: the range of win fractions expected in a bin if the model is calibrated,
+      from the inverse of the binomial CDF (scipy.stats.binom.ppf), at a constant cost per bin
+      whatever the number of games
+
+p are visitor win probabilities and y the outcomes (True or 1.0 if the visiting team won).
+'''
+
+def scores(p,y,groups=None,nGroups=None):
+    '''
+    scores computes the Brier score, log-loss and accuracy (fraction of games whose favourite
+    won) of predictions.
+
+    Inputs:
+    p - predicted probabilities
+    y - outcomes
+    groups - optional integer group code of each game (e.g. season codes from pd.factorize)
+    nGroups - number of groups (default: max(groups)+1)
+
+    Outputs:
+    result - dict with Games, Brier, Log-loss and Accuracy: numbers, or arrays with one entry per
+             group if groups is given
+    '''
+    p = np.asarray(p,dtype=np.float64)
+    y = np.asarray(y,dtype=np.float64)
+    eps = np.finfo(np.float64).eps
+    terms = {'Brier' : (p - y)**2,
+             'Log-loss' : -np.log(np.clip(np.where(y == 1.,p,1. - p),eps,None)),
+             'Accuracy' : ((p > 0.5) == (y == 1.)).astype(np.float64)}
+    if groups is None:
+        result = {'Games' : len(p)}
+        result.update({name : term.mean() for name,term in terms.items()})
+        return result
+    games = np.bincount(groups,minlength=nGroups or 0)
+    result = {'Games' : games}
+    with np.errstate(divide='ignore',invalid='ignore'):
+        result.update({name : np.bincount(groups,term,len(games))/games for name,term in terms.items()})
+    return result
+
+def binomialInterval(p,n,level=0.95):
+    '''
+    binomialInterval gives, for n games each won with probability p, the range of win fractions
+    containing at least level of the probability, leaving at most (1-level)/2 on each side
+    (vectorized over p and n).
+
+    Inputs:
+    p - win probabilities
+    n - numbers of games
+
+    Outputs:
+    lower, upper - bounds of the interval, as fractions of the games (NaN where n is 0)
+    '''
+    p = np.asarray(p,dtype=np.float64)
+    n = np.asarray(n)
+    tail = (1. - level)/2.
+    with np.errstate(divide='ignore',invalid='ignore'):
+        lower = binom.ppf(tail,n,p)/n
+        upper = binom.ppf(1. - tail,n,p)/n
+    return lower,upper
+
+def reliability(p,y,bins=25,level=0.95):
+    '''
+    reliability bins the predictions by predicted probability, for a reliability diagram.
+
+    Inputs:
+    p - predicted probabilities
+    y - outcomes
+    bins - number of equal-width bins between the smallest and largest prediction (as plt.hist),
+           or the bin edges
+    level - confidence level of the intervals
+
+    Outputs:
+    table - pd DataFrame with one row per bin: Lower, Upper (bin edges), Center, Games,
+            Predicted (mean predicted probability), Actual (fraction of games won by the visitor),
+            and Interval lower/Interval upper, the range of Actual expected at the bin center if
+            the model is calibrated (see binomialInterval)
+    '''
+    p = np.asarray(p,dtype=np.float64)
+    y = np.asarray(y,dtype=np.float64)
+    edges = np.histogram_bin_edges(p,bins) if np.ndim(bins) == 0 else np.asarray(bins,dtype=np.float64)
+    nBins = len(edges) - 1
+    # bin i holds edges[i] <= p < edges[i+1]; the last bin also holds its right edge (as np.histogram)
+    whichBin = np.digitize(p,edges) - 1
+    whichBin[p == edges[-1]] = nBins - 1
+    inside = (whichBin >= 0) & (whichBin < nBins)
+    whichBin = whichBin[inside]
+    games = np.bincount(whichBin,minlength=nBins)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        predicted = np.bincount(whichBin,p[inside],nBins)/games
+        actual = np.bincount(whichBin,y[inside],nBins)/games
+    center = 0.5*(edges[:-1] + edges[1:])
+    lower,upper = binomialInterval(center,games,level)
+    return pd.DataFrame({'Lower' : edges[:-1],
+                         'Upper' : edges[1:],
+                         'Center' : center,
+                         'Games' : games,
+                         'Predicted' : predicted,
+                         'Actual' : actual,
+                         'Interval lower' : lower,
+                         'Interval upper' : upper})
+
+def evaluate(p,y,bins=25,level=0.95):
+    '''
+    evaluate returns the scores (see scores) and the reliability table (see reliability) of
+    predictions, with the fraction of bins whose actual win fraction is inside its interval.
+    '''
+    table = reliability(p,y,bins,level)
+    result = scores(p,y)
+    filled = table['Games'] > 0
+    result['Calibrated bins'] = ((table['Actual'] >= table['Interval lower'])
+                                 & (table['Actual'] <= table['Interval upper']))[filled].mean()
+    return result,table
@@ -0,0 +1,144 @@
+import time
+import numpy as np
+import pandas as pd
+from scipy.special import comb
+import Backtest
+import Evaluation
+
+'''
+Tests and benchmark of Evaluation against the reliability diagram loop and binomialConfInt of
+LogisticRegression1.ipynb.
+'''
+
+def notebookBinomialConfInt(p,n):
+    '''
+    binomialConfInt from LogisticRegression1.ipynb: drops the least likely extreme outcome until at
+    least 5% of the probability is removed. Returns (pl, pr, ptot).
+    '''
+    probabilities = np.zeros((n+1,))
+    outcomes = list(range(n+1))
+    for i in outcomes:
+        probabilities[i] = comb(n,i,exact=True) * p**i * (1-p)**(n-i)
+    removed = 0.
+    probabilities = list(probabilities)
+    while removed < 0.05:
+        if probabilities[0] < probabilities[-1]:
+            removed += probabilities.pop(0)
+            outcomes.pop(0)
+        else:
+            removed += probabilities.pop()
+            outcomes.pop()
+    return outcomes[0]/n,outcomes[-1]/n,sum(probabilities)
+
+def notebookReliability(probabilities,yT,bins):
+    '''the reliability diagram loop of LogisticRegression1.ipynb; returns (actualWinProb, confInt)'''
+    whichBin = np.digitize(probabilities,bins)
+    actualWinProb = np.zeros((len(bins)-1,))
+    confInt = np.zeros((2,len(bins)-1))
+    for i in range(1,len(bins)):
+        thisBin = whichBin == i
+        nGames = np.sum(thisBin)
+        actualWinProb[i-1] = np.sum(yT[thisBin])/nGames
+        p = 0.5*(bins[i-1]+bins[i])
+        pl,pr,ptot = notebookBinomialConfInt(p,nGames)
+        confInt[0,i-1] = p - pl
+        confInt[1,i-1] = pr - p
+    return actualWinProb,confInt
+
+def _predictions(n,seed=0):
+    '''n calibrated synthetic predictions and outcomes'''
+    rng = np.random.default_rng(seed)
+    p = 1/(1 + np.exp(-rng.normal(-0.4,0.9,n)))
+    return p,rng.random(n) < p
+
+def testEvaluation():
+    '''
+    testEvaluation checks the scores against their formulas, the intervals against
+    notebookBinomialConfInt and the reliability table against notebookReliability.
+    '''
+    p,y = _predictions(2000)
+
+    # test 1: scores, overall and grouped
+    print('test 1')
+    result = Evaluation.scores(p,y)
+    print('Brier:',np.isclose(result['Brier'],np.mean((p - y)**2)),
+          'log-loss:',np.isclose(result['Log-loss'],-np.mean(y*np.log(p) + (1 - y)*np.log(1 - p))),
+          'accuracy:',np.isclose(result['Accuracy'],np.mean((p > 0.5) == y))) # expected: True True True
+    groups = np.arange(len(p)) % 3
+    grouped = Evaluation.scores(p,y,groups)
+    print('grouped:',all(np.isclose(grouped['Brier'][g],Evaluation.scores(p[groups == g],y[groups == g])['Brier'])
+                         for g in range(3)),grouped['Games'].tolist()) # expected: True [667, 667, 666]
+    print('clipped log-loss:',np.isfinite(Evaluation.scores([0.,1.],[True,False])['Log-loss'])) # expected: True
+
+    # test 2: intervals
+    print('test 2')
+    ps = np.linspace(0.02,0.98,25)
+    ns = np.array([10,20,50,200,1000]) # the notebook's loop can remove every outcome for a few games
+    lower,upper = Evaluation.binomialInterval(ps[:,None],ns[None,:])
+    expected = np.array([[notebookBinomialConfInt(pi,int(ni))[:2] for ni in ns] for pi in ps])
+    print('within 2 games of the notebook:',(np.abs(lower*ns - expected[...,0]*ns) <= 2).all(),
+          (np.abs(upper*ns - expected[...,1]*ns) <= 2).all()) # expected: True True
+    coverage = (np.vectorize(lambda pi,ni,lo,hi: np.sum([comb(ni,i)*pi**i*(1-pi)**(ni-i)
+                                                          for i in range(int(round(lo*ni)),int(round(hi*ni))+1)]))
+                (ps[:,None],ns[None,:],lower,upper))
+    print('coverage at least 95%:',(coverage >= 0.95 - 1e-12).all()) # expected: True
+    print('empty bin:',np.isnan(Evaluation.binomialInterval(0.5,0)).all()) # expected: True
+
+    # test 3: reliability table
+    print('test 3')
+    bins = np.histogram_bin_edges(p,25)
+    actualWinProb,confInt = notebookReliability(p,y,bins)
+    table = Evaluation.reliability(p,y,25)
+    print('same bins:',np.allclose(table['Lower'],bins[:-1]),
+          'all games binned:',table['Games'].sum() == len(p)) # expected: True True
+    # the notebook's loop drops the largest prediction (np.digitize puts it past the last bin)
+    last = np.argmax(p)
+    print('same actual win fractions:',np.allclose(table['Actual'][:-1],actualWinProb[:-1],equal_nan=True),
+          np.isclose(Evaluation.reliability(np.delete(p,last),np.delete(y,last),bins)['Actual'].iloc[-1],
+                     actualWinProb[-1])) # expected: True True
+    filled = table['Games'].to_numpy() > 0
+    print('intervals within 2 games:',
+          (np.abs(table['Center'] - table['Interval lower'] - confInt[0])*table['Games'] <= 2 + 1e-9)[filled].all(),
+          (np.abs(table['Interval upper'] - table['Center'] - confInt[1])*table['Games'] <= 2 + 1e-9)[filled].all()) # expected: True True
+    result,table = Evaluation.evaluate(p,y)
+    print('calibrated bins:',result['Calibrated bins'] >= 0.8) # expected: True
+
+def benchmarkEvaluation():
+    '''
+    benchmarkEvaluation times the notebook's reliability loop and Evaluation on the walk-forward
+    predictions of every season (about 25k games), and on synthetic predictions of growing size.
+    '''
+    predictions,_ = Backtest.walkForward(maxWorkers=1)
+    p = predictions['Visitor win probability'].to_numpy()
+    y = predictions['VisitorWin'].to_numpy()
+    bins = np.histogram_bin_edges(p,25)
+    tic = time.perf_counter()
+    try:
+        notebookReliability(p,y,bins)
+        print('notebook loop, %d games: %.3f s' % (len(p),time.perf_counter() - tic))
+    except OverflowError:
+        print('notebook loop, %d games: OverflowError (comb for a bin of more than ~1000 games)' % len(p))
+    tic = time.perf_counter()
+    result,table = Evaluation.evaluate(p,y)
+    print('evaluate, %d games: %.4f s' % (len(p),time.perf_counter() - tic))
+    print(pd.Series(result).round(3))
+    print(table.round(3))
+
+    for n in [10000,100000,1000000]:
+        p,y = _predictions(n)
+        tic = time.perf_counter()
+        Evaluation.evaluate(p,y,50)
+        print('evaluate, %d games, 50 bins: %.4f s' % (n,time.perf_counter() - tic))
+    p,y = _predictions(20000)
+    bins = np.histogram_bin_edges(p,50)
+    tic = time.perf_counter()
+    notebookReliability(p,y,bins)
+    print('notebook loop, 20000 games, 50 bins: %.3f s' % (time.perf_counter() - tic))
+
+# run tests
+if __name__ == '__main__':
+    print('Test evaluation')
+    testEvaluation()
+    print('###################################')
+    print('Benchmark evaluation')
+    benchmarkEvaluation()
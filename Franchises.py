@@ -0,0 +1,240 @@
+import numpy as np
+
+'''
+Franchises is the franchise identity index shared by the scraping (BRWebscrapeTools, HiFOPredict),
+training (HiFOTraining, Backtest) and prediction code. It resolves a team's full name, abbreviation
+or BR URL slug, in a given season, to a stable integer franchise id, and a franchise id to the
+abbreviation, name and URL slug of the team in any season:
+
+    franchise = Franchises.index.codes(['Charlotte Hornets','CHH','NJN'],[2001,2001,2021])  # [3,3,2]
+    Franchises.index.abbreviations(franchise,2021)                                        # ['CHO','CHO','BRK']
+
+Franchise ids are the positions in index.slugs (the 30 current franchises, in the order of their
+current abbreviations), so a table with one row per franchise is indexed by them directly. Keys are
+looked up once per distinct value (a categorical column is never converted to strings), and the
+result is gathered with its codes, so joins on teams are integer operations.
+Only numpy is needed, so that the command line (HiFOCLI) can use it without pandas.
+'''
+
+'''
+franchiseEras: (BR URL slug, abbreviation, name, first season, last season) of every era of every
+franchise, seasons as the second year of the season (None: still current). BR keeps the Charlotte
+Hornets of 1988-89 to 2001-02 (CHH) with the Charlotte franchise (see storedLabels).
+'''
+franchiseEras = [('ATL','TRI','Tri-Cities Blackhawks',1950,1951),
+                 ('ATL','MLH','Milwaukee Hawks',1952,1955),
+                 ('ATL','STL','St. Louis Hawks',1956,1968),
+                 ('ATL','ATL','Atlanta Hawks',1969,None),
+                 ('BOS','BOS','Boston Celtics',1947,None),
+                 ('NJN','NJA','New Jersey Americans',1968,1968),
+                 ('NJN','NYA','New York Nets',1969,1976),
+                 ('NJN','NYN','New York Nets',1977,1977),
+                 ('NJN','NJN','New Jersey Nets',1978,2012),
+                 ('NJN','BRK','Brooklyn Nets',2013,None),
+                 ('CHA','CHH','Charlotte Hornets',1989,2002),
+                 ('CHA','CHA','Charlotte Bobcats',2005,2014),
+                 ('CHA','CHO','Charlotte Hornets',2015,None),
+                 ('CHI','CHI','Chicago Bulls',1967,None),
+                 ('CLE','CLE','Cleveland Cavaliers',1971,None),
+                 ('DAL','DAL','Dallas Mavericks',1981,None),
+                 ('DEN','DNR','Denver Rockets',1968,1974),
+                 ('DEN','DNA','Denver Nuggets',1975,1976),
+                 ('DEN','DEN','Denver Nuggets',1977,None),
+                 ('DET','FTW','Fort Wayne Pistons',1949,1957),
+                 ('DET','DET','Detroit Pistons',1958,None),
+                 ('GSW','PHW','Philadelphia Warriors',1947,1962),
+                 ('GSW','SFW','San Francisco Warriors',1963,1971),
+                 ('GSW','GSW','Golden State Warriors',1972,None),
+                 ('HOU','SDR','San Diego Rockets',1968,1971),
+                 ('HOU','HOU','Houston Rockets',1972,None),
+                 ('IND','INA','Indiana Pacers',1968,1976),
+                 ('IND','IND','Indiana Pacers',1977,None),
+                 ('LAC','BUF','Buffalo Braves',1971,1978),
+                 ('LAC','SDC','San Diego Clippers',1979,1984),
+                 ('LAC','LAC','Los Angeles Clippers',1985,None),
+                 ('LAL','MNL','Minneapolis Lakers',1949,1960),
+                 ('LAL','LAL','Los Angeles Lakers',1961,None),
+                 ('MEM','VAN','Vancouver Grizzlies',1996,2001),
+                 ('MEM','MEM','Memphis Grizzlies',2002,None),
+                 ('MIA','MIA','Miami Heat',1989,None),
+                 ('MIL','MIL','Milwaukee Bucks',1969,None),
+                 ('MIN','MIN','Minnesota Timberwolves',1990,None),
+                 ('NOH','NOH','New Orleans Hornets',2003,2005),
+                 ('NOH','NOK','New Orleans/Oklahoma City Hornets',2006,2007),
+                 ('NOH','NOH','New Orleans Hornets',2008,2013),
+                 ('NOH','NOP','New Orleans Pelicans',2014,None),
+                 ('NYK','NYK','New York Knicks',1947,None),
+                 ('OKC','SEA','Seattle SuperSonics',1968,2008),
+                 ('OKC','OKC','Oklahoma City Thunder',2009,None),
+                 ('ORL','ORL','Orlando Magic',1990,None),
+                 ('PHI','SYR','Syracuse Nationals',1950,1963),
+                 ('PHI','PHI','Philadelphia 76ers',1964,None),
+                 ('PHO','PHO','Phoenix Suns',1969,None),
+                 ('POR','POR','Portland Trail Blazers',1971,None),
+                 ('SAC','ROC','Rochester Royals',1949,1957),
+                 ('SAC','CIN','Cincinnati Royals',1958,1972),
+                 ('SAC','KCO','Kansas City-Omaha Kings',1973,1975),
+                 ('SAC','KCK','Kansas City Kings',1976,1985),
+                 ('SAC','SAC','Sacramento Kings',1986,None),
+                 ('SAS','DLC','Dallas Chaparrals',1968,1970),
+                 ('SAS','TEX','Texas Chaparrals',1971,1971),
+                 ('SAS','DLC','Dallas Chaparrals',1972,1973),
+                 ('SAS','SAA','San Antonio Spurs',1974,1976),
+                 ('SAS','SAS','San Antonio Spurs',1977,None),
+                 ('TOR','TOR','Toronto Raptors',1996,None),
+                 ('UTA','NOJ','New Orleans Jazz',1975,1979),
+                 ('UTA','UTA','Utah Jazz',1980,None),
+                 ('WAS','CHP','Chicago Packers',1962,1962),
+                 ('WAS','CHZ','Chicago Zephyrs',1963,1963),
+                 ('WAS','BAL','Baltimore Bullets',1964,1973),
+                 ('WAS','CAP','Capital Bullets',1974,1974),
+                 ('WAS','WSB','Washington Bullets',1975,1997),
+                 ('WAS','WAS','Washington Wizards',1998,None)]
+
+def seasonYears(seasons):
+    '''
+    seasonYears converts seasons into their second year (int array): ints are kept, and labels
+    ('2020-21', or '2021') are parsed once per distinct label.
+    '''
+    categories,codes = _factorize(seasons)
+    if np.issubdtype(np.asarray(categories).dtype,np.integer):
+        years = np.asarray(categories,dtype=np.int64)
+    else:
+        years = np.array([int(s[:4]) + 1 if '-' in s else int(s) for s in map(str,categories)],dtype=np.int64)
+    return np.append(years,-1)[codes] # missing labels (code -1) give -1
+
+def seasonOfDates(dates):
+    '''
+    seasonOfDates returns the season (second year) of game dates (datetime64 array), as
+    BRFetchTools.currentSeason: August to July. NaT gives -1.
+    '''
+    dates = np.asarray(dates,dtype='datetime64[D]')
+    months = dates.astype('datetime64[M]').astype(np.int64)
+    season = months//12 + 1970 + (months % 12 >= 7)
+    return np.where(np.isnat(dates),-1,season)
+
+def _factorize(values):
+    '''
+    _factorize returns (categories, codes) of values: those of a pandas categorical (Series or
+    Categorical) as they are, otherwise the distinct values and their positions.
+    '''
+    values = getattr(values,'cat',values) # Series of category dtype -> its .cat accessor
+    if hasattr(values,'categories') and hasattr(values,'codes'):
+        return np.asarray(values.categories),np.asarray(values.codes)
+    if hasattr(values,'to_numpy'): # other pandas columns: hashed rather than sorted (missing values get -1)
+        import pandas as pd
+        codes,categories = pd.factorize(values)
+        return np.asarray(categories),codes
+    values = np.asarray(values)
+    if values.ndim == 0:
+        values = values.reshape(1)
+    if values.dtype == object:
+        values = values.astype(str)
+    return np.unique(values,return_inverse=True)
+
+class FranchiseIndex:
+    '''
+    FranchiseIndex resolves team names, abbreviations and URL slugs to franchise ids, and franchise
+    ids to the abbreviation, name and slug of each era (see franchiseEras).
+    '''
+    def __init__(self,eras):
+        slug,abbreviation,name,first,last = zip(*eras)
+        self.slugs = np.array(list(dict.fromkeys(slug))) # franchise id -> URL slug
+        slugCodes = {s : i for i,s in enumerate(self.slugs)}
+        self._eraFranchise = np.array([slugCodes[s] for s in slug])
+        self._eraAbbreviation = np.array(abbreviation)
+        self._eraName = np.array(name)
+        self._eraFirst = np.array(first)
+        self.firstSeason = int(self._eraFirst.min())
+        self.lastSeason = max(max(s for s in first+last if s is not None),self.firstSeason) # last season with a known change
+        self._eraLast = np.array([self.lastSeason if s is None else s for s in last])
+
+        # eras of each key (abbreviation, name or slug)
+        self._keyEras = {}
+        for era,keys in enumerate(zip(abbreviation,name,slug)):
+            for key in set(keys):
+                self._keyEras.setdefault(key,[]).append(era)
+
+        # era of each franchise in each season (-1: no team), the last column standing for every later season
+        self._eraTable = np.full((len(self.slugs),self.lastSeason-self.firstSeason+1),-1,dtype=np.intp)
+        for era in range(len(slug)):
+            self._eraTable[self._eraFranchise[era],self._eraFirst[era]-self.firstSeason:
+                                                   self._eraLast[era]-self.firstSeason+1] = era
+        self.current = self._eraAbbreviation[self._eraTable[:,-1]] # franchise id -> current abbreviation
+
+    def __len__(self):
+        return len(self.slugs)
+
+    def codes(self,keys,seasons=None):
+        '''
+        codes returns the franchise id of each key (full name, abbreviation or URL slug; -1 if
+        unknown). A key shared by several franchises is resolved with the season (second year or
+        label, one for all keys or one per key; None: the latest era).
+        '''
+        categories,keyCodes = _factorize(keys)
+        categoryCodes = np.full(len(categories)+1,-1,dtype=np.intp) # the extra -1 for missing values (code -1)
+        ambiguous = []
+        for k,key in enumerate(categories):
+            eras = self._keyEras.get(str(key),[])
+            franchises = set(self._eraFranchise[eras])
+            if len(franchises) == 1:
+                categoryCodes[k] = franchises.pop()
+            elif franchises:
+                ambiguous.append((k,eras))
+        codes = categoryCodes[keyCodes]
+        if ambiguous:
+            years = None if seasons is None else np.broadcast_to(seasonYears(seasons),codes.shape)
+            for k,eras in ambiguous:
+                rows = np.flatnonzero(keyCodes == k)
+                if years is None:
+                    codes[rows] = self._eraFranchise[max(eras,key=lambda era : self._eraLast[era])]
+                    continue
+                for era in eras:
+                    inEra = (years[rows] >= self._eraFirst[era]) & (years[rows] <= self._eraLast[era])
+                    codes[rows[inEra]] = self._eraFranchise[era]
+        return codes
+
+    def _eras(self,codes,seasons):
+        '''era of each franchise id in each season (-1 if none)'''
+        codes = np.asarray(codes)
+        if seasons is None:
+            column = np.full(codes.shape,-1)
+        else:
+            years = np.broadcast_to(seasonYears(seasons),codes.shape)
+            column = np.minimum(years - self.firstSeason,self._eraTable.shape[1]-1)
+        eras = self._eraTable[codes,column]
+        return np.where((codes < 0) | (seasons is not None and (column < 0)),-1,eras)
+
+    def abbreviations(self,codes,seasons=None):
+        '''
+        abbreviations returns the abbreviation of each franchise id in its season (None: current
+        abbreviation), or None where the franchise had no team.
+        '''
+        eras = self._eras(codes,seasons)
+        return np.where(eras >= 0,self._eraAbbreviation[eras].astype(object),None)
+
+    def names(self,codes,seasons=None):
+        '''names returns the full name of each franchise id in its season (as abbreviations)'''
+        eras = self._eras(codes,seasons)
+        return np.where(eras >= 0,self._eraName[eras].astype(object),None)
+
+# the index of franchiseEras, built once
+index = FranchiseIndex(franchiseEras)
+
+'''
+storedLabels: abbreviations that the game tables (pyData/gamesYYYY.h5, allGames, game logs) write
+differently. They have always labeled the Charlotte Hornets of 1988-89 to 2001-02 CHO, as the
+current Hornets (the notebooks rely on it), while regSeasonData and the BR URLs use CHH. Both
+resolve to the same franchise id.
+'''
+storedLabels = {'CHH' : 'CHO'}
+
+def gameLabels(codes,seasons=None):
+    '''
+    gameLabels returns the label of each franchise id in the game tables of its season: its
+    abbreviation (see FranchiseIndex.abbreviations), except for storedLabels.
+    '''
+    labels = index.abbreviations(codes,seasons)
+    for abbreviation,label in storedLabels.items():
+        labels[labels == abbreviation] = label
+    return labels
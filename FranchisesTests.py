@@ -0,0 +1,83 @@
+import time
+import numpy as np
+import pandas as pd
+import BRWebscrapeTools as br
+import Franchises
+import GameStoreTests
+from HiFOPredict import HiFOPredict
+
+'''
+Tests and benchmark of the franchise index against the team tables of this repository.
+'''
+
+def testFranchiseIndex():
+    '''
+    testFranchiseIndex checks the resolution of names, abbreviations and slugs across eras, and
+    that every team of the stored game and stat tables resolves to a franchise.
+    '''
+    index = Franchises.index
+    # test 1: one id per franchise, whatever the key or era
+    print('test 1')
+    keys = ['Brooklyn Nets','New Jersey Nets','BRK','NJN','Charlotte Hornets','Charlotte Bobcats','CHH','CHO','CHA']
+    seasons = [2021,2010,2021,2010,2001,2010,2001,2001,2010]
+    codes = index.codes(keys,seasons)
+    print('30 franchises:',len(index) == 30) # expected: True
+    print('Nets:',(codes[:4] == codes[0]).all(),'Charlotte:',(codes[4:] == codes[4]).all()) # expected: True True
+    print('abbreviations:',list(index.abbreviations(codes,seasons))) # expected: BRK NJN BRK NJN CHH CHA CHH CHH CHA
+    print('current:',list(index.abbreviations(codes))) # expected: BRK x4, CHO x5
+    print('unknown:',index.codes(['Los Angeles Clipers'])) # expected: [-1]
+    print('names in 2006:',list(index.names(index.codes(['NOH','SEA']),'2005-06'))) # expected: New Orleans/Oklahoma City Hornets, Seattle SuperSonics
+
+    # test 2: categorical columns give the same codes as strings
+    print('test 2')
+    dataset = GameStoreTests.hdfLoadGameData(2001,2021)
+    years = Franchises.seasonYears(dataset['Season'])
+    visitor = index.codes(dataset['Visitor/Neutral'],years)
+    print('every game team known:',(visitor >= 0).all()) # expected: True
+    print('categorical:',np.array_equal(index.codes(dataset['Visitor/Neutral'].astype('category'),years),visitor)) # expected: True
+    dfTeamData = pd.read_hdf('pyData/regSeasonData.h5')
+    print('every stat team known:',(index.codes(dfTeamData['Tm'],dfTeamData['Season']) >= 0).all()) # expected: True
+
+    # test 3: seasons of game dates
+    print('test 3')
+    dates = pd.to_datetime(['2020-12-22','2021-07-20','2021-08-01',None]).to_numpy()
+    print('seasons:',Franchises.seasonOfDates(dates)) # expected: [2021 2021 2022 -1]
+
+    # test 4: labels of the game tables (the old Hornets stored as CHO), and the teamNameKey dicts
+    print('test 4')
+    codes = index.codes(['Charlotte Hornets','Charlotte Hornets','Charlotte Bobcats','New Jersey Nets'],[2001,2021,2010,2010])
+    print('labels:',list(Franchises.gameLabels(codes,[2001,2021,2010,2010]))) # expected: ['CHO', 'CHO', 'CHA', 'NJN']
+    stored = GameStoreTests.hdfLoadGameData(2001,2002)
+    print('stored 2001-02 labels:',sorted(set(stored['Visitor/Neutral']) & {'CHH','CHO'})) # expected: ['CHO']
+    print('BRWebscrapeTools.teamNameKey:',br.teamNameKey['Charlotte Hornets'],br.teamNameKey['Vancouver Grizzlies'],
+          br.teamNameKey['Playoffs']) # expected: CHO VAN PLY
+    print('HiFOPredict.teamNameKey:',len(HiFOPredict.teamNameKey),HiFOPredict.teamNameKey['Brooklyn Nets']) # expected: 30 NJN
+
+def benchmarkCodes(repeat=5):
+    '''
+    benchmarkCodes times the mapping of every game's visiting team to an id, as the old
+    .map(dict) over strings and with the index (strings and categorical column).
+    '''
+    dataset = GameStoreTests.hdfLoadGameData(2001,2021)
+    dataset = pd.concat([dataset]*20,ignore_index=True) # about 500k games
+    column = dataset['Visitor/Neutral']
+    categorical = column.astype('category')
+    years = Franchises.seasonYears(dataset['Season'])
+    abbrevKey = {a : i for i,a in enumerate(pd.unique(column))}
+    cases = [('map(dict) over strings',lambda : column.map(abbrevKey).to_numpy()),
+             ('index, strings',lambda : Franchises.index.codes(column,years)),
+             ('index, categorical',lambda : Franchises.index.codes(categorical,years))]
+    print('games:',len(column))
+    for name,f in cases:
+        tic = time.perf_counter()
+        for _ in range(repeat):
+            f()
+        print('%s: %.1f ms' % (name,1e3*(time.perf_counter() - tic)/repeat))
+
+# run tests
+if __name__ == '__main__':
+    print('Test franchise index')
+    testFranchiseIndex()
+    print('###################################')
+    print('Benchmark codes')
+    benchmarkCodes()
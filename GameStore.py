@@ -0,0 +1,228 @@
+import json
+import os
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+'''
+GameStore is a compact columnar store of the game outcomes and team season-average stats, with
+one partition (directory) per season, read back as memory-mapped numpy arrays:
+
+    storeDir/teams.json                 team dictionary: list of abbreviations, code = position
+    storeDir/statColumns.json           names of the 42 stat columns ('FG' to 'oppPTS')
+    storeDir/YYYY/visitor.npy           uint8 team codes of the visiting teams
+    storeDir/YYYY/home.npy              uint8 team codes of the home teams
+    storeDir/YYYY/date.npy              int32 game dates, in days since 1970-01-01
+    storeDir/YYYY/visitorWin.npy        outcomes bit-packed with np.packbits (1 if visitor won)
+    storeDir/YYYY/statTeams.npy         uint8 codes of the teams with season-average stats
+    storeDir/YYYY/stats.npy             float32 matrix of those teams' stats (team x 42)
+
+YYYY is the second year of the season (2021 for 2020-21), for the games and the stats alike.
+loadGameData and loadTeamStats give the same tables as the pandas/HDF path they replace.
+'''
+
+defaultStoreDir = 'pyData/store'
+dateFormat = '%a, %b %d, %Y' # BR schedule dates, e.g. 'Tue, Dec 22, 2020'
+
+'''
+SeasonPartition: arrays of one season, memory-mapped read-only from the store
+    season - second year of the season (int)
+    visitor, home - team codes of each game
+    date - game dates (days since 1970-01-01)
+    packedWins - bit-packed outcomes (use visitorWin() to unpack)
+    nGames - number of games
+    statTeams - codes of the teams with stats
+    stats - team x 42 stat matrix
+'''
+SeasonPartition = namedtuple('SeasonPartition',['season','visitor','home','date','packedWins','nGames',
+                                                'statTeams','stats'])
+
+def visitorWin(partition):
+    '''visitorWin unpacks the outcomes of a SeasonPartition into a bool array'''
+    return np.unpackbits(partition.packedWins,count=partition.nGames).astype(bool)
+
+def seasonLabel(season):
+    '''seasonLabel converts 2021 into '2020-21', the season format of regSeasonData'''
+    return str(season-1)+'-'+str(season)[2:4]
+
+'''
+TEAM DICTIONARY
+'''
+def loadTeams(storeDir=defaultStoreDir):
+    '''loadTeams returns the team dictionary (list of abbreviations, code = position)'''
+    fileName = os.path.join(storeDir,'teams.json')
+    if not os.path.exists(fileName):
+        return []
+    with open(fileName) as f:
+        return json.load(f)
+
+def encodeTeams(abbrevs,storeDir=defaultStoreDir):
+    '''
+    encodeTeams converts team abbreviations into uint8 codes, adding any new abbreviation to the
+    end of the team dictionary (existing codes never change).
+    '''
+    teams = loadTeams(storeDir)
+    categories = pd.Categorical(abbrevs)
+    newTeams = [t for t in categories.categories if t not in teams]
+    if newTeams:
+        teams = teams + sorted(newTeams)
+        os.makedirs(storeDir,exist_ok=True)
+        with open(os.path.join(storeDir,'teams.json'),'w') as f:
+            json.dump(teams,f)
+    lookup = np.array([teams.index(t) for t in categories.categories],dtype=np.uint8)
+    return lookup[categories.codes]
+
+'''
+WRITING
+'''
+def _save(seasonDir,name,array):
+    tmpFile = os.path.join(seasonDir,name+'.tmp.npy')
+    np.save(tmpFile,array)
+    os.replace(tmpFile,os.path.join(seasonDir,name+'.npy')) # readers never see a partial file
+
+def writeSeasonGames(season,games,storeDir=defaultStoreDir):
+    '''
+    writeSeasonGames writes (or replaces) the games of a season partition.
+
+    Inputs:
+    season - second year of the season (int)
+    games - pd DataFrame with columns Date, Visitor/Neutral, Home/Neutral, VisitorWin
+            (as stored in pyData/gamesYYYY.h5)
+    '''
+    seasonDir = os.path.join(storeDir,str(season))
+    os.makedirs(seasonDir,exist_ok=True)
+    days = pd.to_datetime(games['Date'],format=dateFormat).to_numpy().astype('datetime64[D]')
+    _save(seasonDir,'visitor',encodeTeams(games['Visitor/Neutral'],storeDir))
+    _save(seasonDir,'home',encodeTeams(games['Home/Neutral'],storeDir))
+    _save(seasonDir,'date',days.astype(np.int32))
+    _save(seasonDir,'visitorWin',np.packbits(games['VisitorWin'].to_numpy(dtype=bool)))
+
+def writeSeasonStats(season,teamStats,storeDir=defaultStoreDir):
+    '''
+    writeSeasonStats writes (or replaces) the team season-average stats of a season partition.
+
+    Inputs:
+    season - second year of the season (int)
+    teamStats - pd DataFrame with columns Tm and 'FG' to 'oppPTS' (rows of regSeasonData.h5)
+    '''
+    seasonDir = os.path.join(storeDir,str(season))
+    os.makedirs(seasonDir,exist_ok=True)
+    columns = list(teamStats.loc[:,'FG':'oppPTS'].columns)
+    with open(os.path.join(storeDir,'statColumns.json'),'w') as f:
+        json.dump(columns,f)
+    _save(seasonDir,'statTeams',encodeTeams(teamStats['Tm'],storeDir))
+    _save(seasonDir,'stats',teamStats.loc[:,'FG':'oppPTS'].to_numpy(dtype=np.float32))
+
+def buildStore(storeDir=defaultStoreDir,dataDir='pyData'):
+    '''
+    buildStore converts every dataDir/gamesYYYY.h5 file and dataDir/regSeasonData.h5 into the store.
+    '''
+    seasonFiles = sorted(f for f in os.listdir(dataDir) if f.startswith('games') and f.endswith('.h5'))
+    for fileName in seasonFiles:
+        season = int(fileName[len('games'):-len('.h5')])
+        writeSeasonGames(season,pd.read_hdf(os.path.join(dataDir,fileName),'table'),storeDir)
+    dfTeamData = pd.read_hdf(os.path.join(dataDir,'regSeasonData.h5'))
+    seasons = dfTeamData['Season'].str[:4].astype(int) + 1
+    for season in np.unique(seasons):
+        writeSeasonStats(season,dfTeamData[seasons == season],storeDir)
+
+'''
+READING
+'''
+def _load(seasonDir,name,mmap=True):
+    fileName = os.path.join(seasonDir,name+'.npy')
+    if not os.path.exists(fileName):
+        return None
+    return np.load(fileName,mmap_mode='r' if mmap else None)
+
+def checkStore(storeDir=defaultStoreDir,minSeasons=1):
+    '''
+    checkStore raises FileNotFoundError if storeDir does not hold a store with at least minSeasons
+    seasons (the store is not part of the repository: it is built from pyData with python GameStore.py).
+    '''
+    seasons = storeSeasons(storeDir)
+    if not os.path.exists(os.path.join(storeDir,'teams.json')) or not seasons:
+        raise FileNotFoundError('No game store in '+storeDir+': build it with python GameStore.py')
+    if len(seasons) < minSeasons:
+        raise FileNotFoundError('The game store in '+storeDir+' has '+str(len(seasons))+' season(s), '
+                                +str(minSeasons)+' needed: build it with python GameStore.py')
+
+def storeSeasons(storeDir=defaultStoreDir):
+    '''storeSeasons returns the sorted list of seasons in the store'''
+    if not os.path.isdir(storeDir):
+        return []
+    return sorted(int(d) for d in os.listdir(storeDir) if d.isdigit())
+
+def loadSeason(season,storeDir=defaultStoreDir,mmap=True):
+    '''
+    loadSeason returns the SeasonPartition of season, with its arrays memory-mapped (no copy is
+    made until the data is used) unless mmap is False.
+    '''
+    seasonDir = os.path.join(storeDir,str(season))
+    packedWins = _load(seasonDir,'visitorWin',mmap)
+    visitor = _load(seasonDir,'visitor',mmap)
+    return SeasonPartition(season,
+                           visitor,
+                           _load(seasonDir,'home',mmap),
+                           _load(seasonDir,'date',mmap),
+                           packedWins,
+                           0 if visitor is None else visitor.shape[0],
+                           _load(seasonDir,'statTeams',mmap),
+                           _load(seasonDir,'stats',mmap))
+
+def loadGameData(initialSeason,finalSeason,storeDir=defaultStoreDir):
+    '''
+    loadGameData loads each season of game data into a single table, with columns
+    Season, Visitor/Neutral, Home/Neutral, VisitorWin (replaces the loadGameData of the notebooks,
+    which reads pyData/gamesYYYY.h5). Teams and seasons are categorical columns.
+
+    Inputs:
+    initialSeason - first season (second year of season) to include (int)
+    finalSeason - last season to include (inclusive) (int)
+
+    Outputs:
+    dataset - pandas dataframe of format described above
+    Raises FileNotFoundError if the store has none of these seasons (see checkStore).
+    '''
+    checkStore(storeDir)
+    teams = loadTeams(storeDir)
+    partitions = [loadSeason(season,storeDir) for season in range(initialSeason,finalSeason+1)]
+    partitions = [p for p in partitions if p.visitor is not None]
+    if not partitions:
+        raise FileNotFoundError('No games of seasons '+str(initialSeason)+' to '+str(finalSeason)+' in '+storeDir
+                                +': build it with python GameStore.py')
+    labels = [seasonLabel(p.season) for p in partitions]
+    seasonCodes = np.repeat(np.arange(len(partitions)),[p.nGames for p in partitions])
+    dataset = pd.DataFrame({
+        'Season' : pd.Categorical.from_codes(seasonCodes,labels),
+        'Visitor/Neutral' : pd.Categorical.from_codes(np.concatenate([p.visitor for p in partitions]),teams),
+        'Home/Neutral' : pd.Categorical.from_codes(np.concatenate([p.home for p in partitions]),teams),
+        'VisitorWin' : np.concatenate([visitorWin(p) for p in partitions])
+    })
+    return dataset
+
+def loadTeamStats(storeDir=defaultStoreDir):
+    '''
+    loadTeamStats returns every team's season-average stats as a table with columns Season, Tm
+    and 'FG' to 'oppPTS' (replaces pd.read_hdf('pyData/regSeasonData.h5')). Raises
+    FileNotFoundError if the store has not been built (see checkStore).
+    '''
+    checkStore(storeDir)
+    if not os.path.exists(os.path.join(storeDir,'statColumns.json')):
+        raise FileNotFoundError('No team stats in '+storeDir+': build it with python GameStore.py')
+    teams = loadTeams(storeDir)
+    with open(os.path.join(storeDir,'statColumns.json')) as f:
+        columns = json.load(f)
+    partitions = [loadSeason(season,storeDir) for season in storeSeasons(storeDir)]
+    partitions = [p for p in partitions if p.stats is not None]
+    labels = [seasonLabel(p.season) for p in partitions]
+    seasonCodes = np.repeat(np.arange(len(partitions)),[p.stats.shape[0] for p in partitions])
+    dfTeamData = pd.DataFrame(np.concatenate([p.stats for p in partitions]),columns=columns)
+    dfTeamData.insert(0,'Tm',pd.Categorical.from_codes(np.concatenate([p.statTeams for p in partitions]),teams))
+    dfTeamData.insert(0,'Season',pd.Categorical.from_codes(seasonCodes,labels))
+    return dfTeamData
+
+# build the store from the HDF files in pyData
+if __name__ == '__main__':
+    buildStore()
+    print('Store written to',defaultStoreDir,'seasons',storeSeasons())
@@ -0,0 +1,113 @@
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+import GameStore
+
+'''
+Tests and benchmark of GameStore against the HDF files in pyData, with the store built in a
+temporary directory.
+'''
+
+def hdfLoadGameData(initialSeason,finalSeason):
+    '''the HDF path GameStore replaces (loadGameData of the notebooks)'''
+    dataset = pd.DataFrame()
+    for season in range(initialSeason,finalSeason+1):
+        df = pd.read_hdf('pyData/games'+str(season)+'.h5','table')
+        df.insert(0,'Season',GameStore.seasonLabel(season))
+        dataset = pd.concat([dataset,df.drop(columns='Date')],ignore_index=True)
+    return dataset
+
+def testStore():
+    '''
+    testStore checks that the tables loaded from the store are the same as those in the HDF files.
+    '''
+    with tempfile.TemporaryDirectory() as storeDir:
+        GameStore.buildStore(storeDir)
+
+        # test 1: games
+        print('test 1')
+        expected = hdfLoadGameData(2001,2021)
+        dataset = GameStore.loadGameData(2001,2021,storeDir)
+        print('same games:',dataset.astype({'Season' : str,'Visitor/Neutral' : str,'Home/Neutral' : str})
+              .equals(expected.astype({'VisitorWin' : bool}))) # expected: True
+        partition = GameStore.loadSeason(2021,storeDir)
+        print('memory-mapped:',isinstance(partition.visitor,np.memmap)) # expected: True
+        dates = pd.to_datetime(partition.date,unit='D')
+        print('same dates:',(dates == pd.to_datetime(pd.read_hdf('pyData/games2021.h5','table')['Date'],
+                                                     format=GameStore.dateFormat).values).all()) # expected: True
+
+        # test 2: team stats (stored as float32)
+        print('test 2')
+        expected = pd.read_hdf('pyData/regSeasonData.h5').sort_values(['Season','Tm'],ignore_index=True)
+        dfTeamData = GameStore.loadTeamStats(storeDir).astype({'Season' : str,'Tm' : str})
+        dfTeamData = dfTeamData.sort_values(['Season','Tm'],ignore_index=True)
+        print('same teams:',dfTeamData[['Season','Tm']].equals(expected[['Season','Tm']])) # expected: True
+        print('same stats:',np.allclose(dfTeamData.loc[:,'FG':'oppPTS'],expected.loc[:,'FG':'oppPTS'],
+                                        rtol=1e-6)) # expected: True
+
+        # test 3: rewriting a season keeps the codes of the team dictionary
+        print('test 3')
+        teams = GameStore.loadTeams(storeDir)
+        games = pd.read_hdf('pyData/games2021.h5','table')
+        GameStore.writeSeasonGames(2021,games.iloc[:10],storeDir)
+        print('same dictionary:',GameStore.loadTeams(storeDir) == teams) # expected: True
+        print('games in 2021:',GameStore.loadSeason(2021,storeDir).nGames) # expected: 10
+
+    # test 4: loading from a store that has not been built names the build command
+    print('test 4')
+    with tempfile.TemporaryDirectory() as storeDir:
+        for load in [lambda : GameStore.loadGameData(2001,2021,storeDir),lambda : GameStore.loadTeamStats(storeDir)]:
+            try:
+                load()
+                print('no error raised')
+            except FileNotFoundError as e:
+                print('FileNotFoundError:',e) # expected: ... build it with python GameStore.py
+
+# each load runs in a fresh interpreter, so that its resident memory can be measured
+loadScript = '''
+import os,sys,time
+import pandas as pd,numpy as np
+import GameStore,GameStoreTests
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')
+before = rss()
+tic = time.perf_counter()
+if sys.argv[1] == 'hdf':
+    games = GameStoreTests.hdfLoadGameData(2001,2021)
+    teams = pd.read_hdf('pyData/regSeasonData.h5')
+else:
+    games = GameStore.loadGameData(2001,2021,sys.argv[2])
+    teams = GameStore.loadTeamStats(sys.argv[2])
+elapsed = time.perf_counter() - tic
+print(elapsed,rss() - before,games.memory_usage(deep=True).sum())
+'''
+
+def benchmarkLoad():
+    '''
+    benchmarkLoad times loading every season of games and the team stats from the HDF files and
+    from the store, and measures the increase in resident memory (Linux) and the size of the table.
+    '''
+    with tempfile.TemporaryDirectory() as storeDir:
+        GameStore.buildStore(storeDir)
+        storeBytes = sum(os.path.getsize(os.path.join(d,f)) for d,_,files in os.walk(storeDir) for f in files)
+        hdfBytes = sum(os.path.getsize(os.path.join('pyData',f)) for f in os.listdir('pyData')
+                       if f.startswith('games') or f == 'regSeasonData.h5')
+        print('on disk: HDF %.0f kB, store %.0f kB' % (hdfBytes/1e3,storeBytes/1e3))
+        for path in ['hdf','store']:
+            output = subprocess.run([sys.executable,'-c',loadScript,path,storeDir],
+                                    capture_output=True,text=True,check=True).stdout
+            elapsed,rss,tableBytes = map(float,output.split())
+            print('%s: load %.1f ms, RSS increase %.1f MB, games table %.2f MB'
+                  % (path,1e3*elapsed,rss/1e6,tableBytes/1e6))
+
+# run tests
+if __name__ == '__main__':
+    print('Test GameStore')
+    testStore()
+    print('###################################')
+    print('Benchmark loading')
+    benchmarkLoad()
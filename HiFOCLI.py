@@ -0,0 +1,237 @@
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+import numpy as np
+import Franchises
+import HiFOModel
+import ModelRegistry
+
+'''
+HiFOCLI is the command-line entry point for short-lived jobs (cron, Lambda-style functions). The
+team stats, W-L records and season schedule are scraped once into a small state file, and odds
+are then scored from that file and a model artifact with numpy alone: pandas, requests (and the
+rest of the scraping code) are imported only when a scrape is actually needed.
+
+    python HiFOCLI.py refresh 2022                          scrape the season into its state file
+    python HiFOCLI.py odds --date 2022-01-15                odds of a date's games
+    python HiFOCLI.py odds --date 2022-01-01 --end-date 2022-01-31   odds of every game of a range of dates
+    python HiFOCLI.py odds --matchup GSW@BRK --json         odds of any matchup, as JSON
+    python HiFOCLI.py odds --max-age 6                      scrape first if the state is older than 6 hours
+
+The state file of a season is pyData/teamState/NBA_<season>.npz (see saveTeamState). odds scrapes
+it first only if it is missing (or older than --max-age hours). The model is the latest version
+of the registry, another version (--model-version), or a HiFOModel.CompiledModel .npz (--artifact).
+'''
+
+defaultStateDir = 'pyData/teamState'
+
+'''
+TeamState: everything odds reads, as numpy arrays
+    season - second year of the season (int)
+    fetched - time of the scrape (seconds since the epoch)
+    teams - team abbreviations, in the order of the franchise ids (see Franchises) (teams,)
+    stats - raw stats of each team, offensive then defensive 'FG' to 'PTS' (teams x 42)
+    W, L - wins and losses of each team (teams,)
+    date - date of each game of the season (games,) datetime64[D]
+    visitor, home - indices into teams of each game (games,)
+    start - start time (ET) of each game (games,)
+'''
+TeamState = namedtuple('TeamState',['season','fetched','teams','stats','W','L','date','visitor','home','start'])
+
+def currentSeason(today=None):
+    '''same as BRFetchTools.currentSeason, without importing requests'''
+    today = today or datetime.date.today()
+    return today.year + 1 if today.month >= 8 else today.year
+
+def stateFile(season,stateDir=defaultStateDir):
+    '''stateFile returns the path of a season's state file'''
+    return os.path.join(stateDir,'NBA_'+str(season)+'.npz')
+
+'''
+STATE FILE
+'''
+def saveTeamState(predictor,schedule,fileName):
+    '''
+    saveTeamState writes the state file of a season, renamed into place so that a job never
+    reads a partial file.
+
+    Inputs:
+    predictor - HiFOPredict of the season (team stats and W-L records)
+    schedule - pd DataFrame of the season's games (see HiFOPredict.extractSchedule)
+    fileName - state file (see stateFile)
+    '''
+    os.makedirs(os.path.dirname(fileName) or '.',exist_ok=True)
+    teamWL = predictor.teamWL.set_index('Tm').loc[predictor.teamIndex]
+    tmpName = fileName+'.tmp.npz'
+    np.savez(tmpName,season=np.array(int(predictor.season)),fetched=np.array(time.time()),
+             teams=np.array(predictor.teamIndex,dtype=str),stats=np.asarray(predictor.teamStats,dtype=np.float64),
+             W=teamWL['W'].to_numpy(dtype=np.int64),L=teamWL['L'].to_numpy(dtype=np.int64),
+             date=schedule['Date'].to_numpy(dtype='datetime64[D]'),
+             visitor=predictor.teamCodes(schedule['Visitor']),home=predictor.teamCodes(schedule['Home']),
+             start=schedule['Start (ET)'].fillna('').to_numpy(dtype=str))
+    os.replace(tmpName,fileName)
+
+def loadTeamState(fileName):
+    '''loadTeamState reads a state file written by saveTeamState'''
+    with np.load(fileName) as state:
+        return TeamState(int(state['season']),float(state['fetched']),
+                         *(state[name] for name in TeamState._fields[2:]))
+
+def scrapeTeamState(season,fileName,brURL='https://www.basketball-reference.com',maxWorkers=8,
+                    fetcher=None,registry=None):
+    '''
+    scrapeTeamState downloads the team stats, records and schedule of a season (through the
+    fetcher's cache), writes them to fileName, and returns the TeamState.
+    '''
+    import pandas as pd # imported here so that scoring from a state file only needs numpy
+    from HiFOPredict import HiFOPredict
+    predictor = HiFOPredict.withSchedule(season,pd.to_datetime('today').normalize(),brURL=brURL,maxWorkers=maxWorkers,
+                                         fetcher=fetcher,registry=registry)
+    saveTeamState(predictor,predictor.schedule,fileName)
+    return loadTeamState(fileName)
+
+'''
+SCORING
+'''
+def loadModel(artifact=None,version=None,registryDir=ModelRegistry.defaultRegistryDir):
+    '''
+    loadModel returns the HiFOModel.CompiledModel of a .npz artifact if given, else of a version
+    of the registry (default: the latest).
+    '''
+    if artifact is not None:
+        return HiFOModel.CompiledModel.load(artifact)
+    return ModelRegistry.ModelRegistry(registryDir).load(version).compiled
+
+def teamCodes(state,abbrevs):
+    '''
+    teamCodes converts team abbreviations (or BR URL slugs) into indices of state.teams, which are
+    the franchise ids of Franchises.index.
+    '''
+    codes = Franchises.index.codes(abbrevs,state.season)
+    if (codes < 0).any():
+        raise KeyError('Unknown teams '+str(list(np.asarray(abbrevs)[codes < 0])))
+    return codes
+
+def odds(state,model,visitor,home):
+    '''
+    odds scores a batch of matchups.
+
+    Inputs:
+    state - TeamState
+    model - HiFOModel.CompiledModel
+    visitor, home - integer arrays of team indices (see teamCodes)
+
+    Outputs:
+    visWinProbability - visitor win probability of each matchup
+    visMLO - visiting team money lines (home lines are -visMLO)
+    '''
+    visWinProbability = model.probability(state.stats[visitor],state.stats[home])
+    return visWinProbability,HiFOModel.moneyLine(visWinProbability)
+
+def daysGames(state,date,endDate=None):
+    '''
+    daysGames returns the indices of the games of date ('YYYY-MM-DD') in the state's schedule, or
+    of every date from date to endDate (inclusive)
+    '''
+    first = np.datetime64(date,'D')
+    last = first if endDate is None else np.datetime64(endDate,'D')
+    return np.flatnonzero((state.date >= first) & (state.date <= last))
+
+def predictionRows(state,model,visitor,home,dates):
+    '''predictionRows returns the predictions as a list of dicts (as the rows of HiFOPredict.predict)'''
+    visWinProbability,visMLO = odds(state,model,visitor,home)
+    return [{'Date' : str(date),
+             'Visitor' : str(state.teams[v]),
+             'Home' : str(state.teams[h]),
+             'Visitor win probability' : float(p),
+             'Visitor Line' : int(line),
+             'Home Line' : -int(line)}
+            for date,v,h,p,line in zip(dates,visitor,home,visWinProbability,visMLO)]
+
+def formatTable(rows):
+    '''formatTable lays out prediction rows as a text table'''
+    columns = ['Date','Visitor','Home','Visitor win probability','Visitor Line','Home Line']
+    cells = [[('%.4f' % row[c]) if c == 'Visitor win probability' else str(row[c]) for c in columns] for row in rows]
+    widths = [max([len(c)] + [len(line[i]) for line in cells]) for i,c in enumerate(columns)]
+    lines = ['  '.join(c.rjust(width) for c,width in zip(line,widths)) for line in [columns] + cells]
+    return '\n'.join(lines)
+
+'''
+COMMAND LINE
+'''
+def _parser():
+    parser = argparse.ArgumentParser(prog='HiFOCLI.py',description='HiFO win probabilities and money lines')
+    commands = parser.add_subparsers(dest='command',required=True)
+    for name in ['refresh','odds']:
+        command = commands.add_parser(name)
+        if name == 'refresh':
+            command.add_argument('season',type=int,nargs='?',default=currentSeason(),
+                                 help='second year of the season (default: current season)')
+        else:
+            command.add_argument('--season',type=int,default=currentSeason(),
+                                 help='second year of the season (default: current season)')
+            command.add_argument('--date',help='YYYY-MM-DD (default: today)')
+            command.add_argument('--end-date',default=None,metavar='YYYY-MM-DD',
+                                 help='score every game from --date to this date')
+            command.add_argument('--matchup',action='append',default=[],metavar='VIS@HOME',
+                                 help='score a matchup of team abbreviations (repeatable) instead of a date')
+            command.add_argument('--max-age',type=float,default=None,metavar='HOURS',
+                                 help='scrape first if the state file is older than this')
+            command.add_argument('--model-version',type=int,default=None,help='registry version (default: latest)')
+            command.add_argument('--artifact',default=None,help='HiFOModel.CompiledModel .npz to use instead')
+            command.add_argument('--registry',default=ModelRegistry.defaultRegistryDir)
+            command.add_argument('--json',action='store_true',help='print the predictions as JSON')
+        command.add_argument('--state',default=None,help='state file (default: '+stateFile('<season>')+')')
+        command.add_argument('--br-url',default='https://www.basketball-reference.com')
+        command.add_argument('--max-workers',type=int,default=8)
+    return parser
+
+def main(argv=None):
+    parser = _parser()
+    args = parser.parse_args(argv)
+    fileName = args.state or stateFile(args.season)
+
+    if args.command == 'refresh':
+        state = scrapeTeamState(args.season,fileName,args.br_url,args.max_workers)
+        print('Wrote',fileName,':',len(state.teams),'teams,',len(state.date),'games')
+        return 0
+
+    # score from the state file, scraping only if it is missing or too old (the scraper's progress
+    # goes to stderr, to keep stdout for the predictions)
+    state = loadTeamState(fileName) if os.path.exists(fileName) else None
+    if state is None or (args.max_age is not None and time.time() - state.fetched > 3600.*args.max_age):
+        with contextlib.redirect_stdout(sys.stderr):
+            state = scrapeTeamState(args.season,fileName,args.br_url,args.max_workers)
+    model = loadModel(args.artifact,args.model_version,args.registry)
+
+    if args.matchup:
+        try:
+            visitor,home = zip(*(matchup.split('@') for matchup in args.matchup))
+            visitor,home = teamCodes(state,visitor),teamCodes(state,home)
+        except (ValueError,KeyError) as e:
+            parser.error('bad --matchup: '+str(e))
+        dates = [args.date or '']*len(visitor)
+    else:
+        date = args.date or datetime.date.today().isoformat()
+        try:
+            games = daysGames(state,date,args.end_date)
+        except ValueError:
+            parser.error('bad --date or --end-date: '+date+' '+str(args.end_date or ''))
+        visitor,home,dates = state.visitor[games],state.home[games],state.date[games]
+    rows = predictionRows(state,model,visitor,home,dates)
+
+    if args.json:
+        print(json.dumps(rows))
+    elif not rows:
+        print('No games',date)
+    else:
+        print(formatTable(rows))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
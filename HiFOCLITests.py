@@ -0,0 +1,141 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import BRFetchTools
+import HiFOCLI
+from BRStubServer import BRStubServer
+from HiFOPredict import HiFOPredict
+
+'''
+Tests and benchmark of HiFOCLI against BRStubServer. Each command-line run is a fresh interpreter,
+so that its startup time, peak resident memory and imported modules can be measured.
+'''
+
+# budgets of a run scoring from the state file (interpreter startup included)
+startupBudget = 0.5 # seconds
+rssBudget = 40e6 # bytes of peak resident memory
+
+# runs HiFOCLI.main in a fresh interpreter, then reports its peak RSS (VmHWM: ru_maxrss would
+# include the parent's memory, kept across the exec) and heavy modules on stderr
+runScript = '''
+import sys
+import HiFOCLI
+try:
+    HiFOCLI.main(sys.argv[1:])
+finally:
+    with open('/proc/self/status') as f:
+        peak = [int(line.split()[1])*1024 for line in f if line.startswith('VmHWM:')][0]
+    heavy = [name for name in ['pandas','requests','bs4','BRFetchTools','HiFOPredict'] if name in sys.modules]
+    sys.stderr.write('\\nRUN %d %s\\n' % (peak,','.join(heavy)))
+'''
+
+def runCLI(args,cwd=None):
+    '''
+    runCLI runs the command line in a fresh interpreter (in directory cwd, default: this one).
+    Outputs:
+    stdout - output of the command
+    elapsed - wall time of the run (seconds)
+    rss - peak resident memory (bytes, Linux)
+    heavy - heavy modules imported during the run
+    '''
+    tic = time.perf_counter()
+    env = dict(os.environ,PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable,'-c',runScript]+args,capture_output=True,text=True,check=True,
+                            cwd=cwd,env=env)
+    elapsed = time.perf_counter() - tic
+    report = result.stderr.rsplit('RUN ',1)[1].split()
+    return result.stdout,elapsed,int(report[0]),report[1].split(',') if len(report) > 1 else []
+
+def _scrapeState(server,fileName):
+    return HiFOCLI.scrapeTeamState(2021,fileName,brURL=server.url,fetcher=BRFetchTools.BRFetcher())
+
+def testCLI():
+    '''
+    testCLI scrapes a state file from the stub server, and checks that the odds scored from it
+    match HiFOPredict.predict without importing pandas or the scraping code.
+    '''
+    date = pd.Timestamp('2020-12-22')
+    with tempfile.TemporaryDirectory() as stateDir, BRStubServer() as server:
+        fileName = HiFOCLI.stateFile(2021,stateDir)
+        state = _scrapeState(server,fileName)
+        print('30 teams:',len(state.teams) == 30) # expected: True
+        print('season schedule:',len(state.date) > 1000) # expected: True
+        expected = HiFOPredict(2021,date,brURL=server.url,fetcher=BRFetchTools.BRFetcher()).predict()
+
+        # test 1: a date's games
+        print('test 1')
+        stdout,_,_,heavy = runCLI(['odds','--season','2021','--date','2020-12-22','--state',fileName,'--json'])
+        predictions = pd.DataFrame(json.loads(stdout))
+        print('same games:',predictions[['Visitor','Home']].equals(expected[['Visitor','Home']])) # expected: True
+        print('same odds:',np.allclose(predictions['Visitor win probability'],expected['Visitor win probability'],
+                                       rtol=1e-12,atol=1e-12)
+              and (predictions['Visitor Line'] == expected['Visitor Line']).all()) # expected: True
+        print('heavy modules imported:',heavy) # expected: []
+        # from another directory: the default registry is the repository's
+        stdout,_,_,_ = runCLI(['odds','--season','2021','--date','2020-12-22','--state',os.path.abspath(fileName),
+                               '--json'],cwd=tempfile.gettempdir())
+        print('same odds from another directory:',pd.DataFrame(json.loads(stdout)).equals(predictions)) # expected: True
+
+        # test 2: matchups, with a compiled artifact in place of the registry
+        print('test 2')
+        artifact = os.path.join(stateDir,'model.npz')
+        HiFOCLI.loadModel().save(artifact)
+        stdout,_,_,heavy = runCLI(['odds','--state',fileName,'--artifact',artifact,'--json',
+                                   '--matchup','GSW@NJN','--matchup','LAC@LAL'])
+        predictions = pd.DataFrame(json.loads(stdout))
+        print('same odds:',np.allclose(predictions['Visitor win probability'],expected['Visitor win probability'],
+                                       rtol=1e-12,atol=1e-12)) # expected: True
+        print('heavy modules imported:',heavy) # expected: []
+
+        # test 3: a stale state file is scraped again
+        print('test 3')
+        before = sum(server.counts.values())
+        np.savez(fileName,**dict(state._asdict(),fetched=np.array(0.)))
+        HiFOCLI.main(['odds','--season','2021','--date','2020-12-22','--state',fileName,'--max-age','1',
+                      '--br-url',server.url])
+        print('scraped again:',sum(server.counts.values()) > before
+              and HiFOCLI.loadTeamState(fileName).fetched > 0) # expected: True
+
+        # test 4: a range of dates
+        print('test 4')
+        expected = HiFOPredict(2021,date,brURL=server.url,fetcher=BRFetchTools.BRFetcher(),
+                               endDate=pd.Timestamp('2021-01-31')).predict()
+        stdout,_,_,heavy = runCLI(['odds','--season','2021','--date','2020-12-22','--end-date','2021-01-31',
+                                   '--state',fileName,'--json'])
+        predictions = pd.DataFrame(json.loads(stdout))
+        print('same games:',predictions[['Visitor','Home']].equals(expected[['Visitor','Home']])) # expected: True
+        print('same odds:',np.allclose(predictions['Visitor win probability'],expected['Visitor win probability'],
+                                       rtol=1e-12,atol=1e-12)) # expected: True
+        print('heavy modules imported:',heavy) # expected: []
+
+def benchmarkStartup(repeat=5):
+    '''
+    benchmarkStartup times whole runs of the command line scoring a date's games from the state
+    file, checked against startupBudget and rssBudget, and a run that has to scrape the state first.
+    '''
+    with tempfile.TemporaryDirectory() as stateDir, BRStubServer() as server:
+        fileName = HiFOCLI.stateFile(2021,stateDir)
+        _scrapeState(server,fileName)
+        runs = [runCLI(['odds','--season','2021','--date','2020-12-22','--state',fileName]) for _ in range(repeat)]
+        elapsed = min(run[1] for run in runs)
+        rss = max(run[2] for run in runs)
+        print('cached state: %.0f ms, peak RSS %.1f MB' % (1e3*elapsed,rss/1e6))
+        print('within budget:',elapsed < startupBudget and rss < rssBudget) # expected: True
+
+        os.remove(fileName) # no state file: the run scrapes (pages from the stub server)
+        _,elapsedScrape,rssScrape,_ = runCLI(['odds','--season','2021','--date','2020-12-22','--state',fileName,
+                                              '--br-url',server.url])
+    print('scrape: %.0f ms, peak RSS %.1f MB' % (1e3*elapsedScrape,rssScrape/1e6))
+
+# run tests
+if __name__ == '__main__':
+    print('Test HiFOCLI')
+    testCLI()
+    print('###################################')
+    print('Benchmark startup')
+    benchmarkStartup()
@@ -0,0 +1,70 @@
+import numpy as np
+
+'''
+HiFOModel contains the compiled form of the HiFO logistic regression model. The model
+    logit = w[0] + w_vis . ((s_vis - statMean) @ PCABasis) + w_hom . ((s_hom - statMean) @ PCABasis)
+is linear in the raw season-average stats s of the two teams, so the mean subtraction, PCA
+projection and logistic weights collapse into
+    logit = bias + visitorWeights . s_vis + homeWeights . s_hom
+with visitorWeights = PCABasis @ w_vis, homeWeights = PCABasis @ w_hom and
+bias = w[0] - statMean . (visitorWeights + homeWeights).
+'''
+
+def moneyLine(p):
+    '''
+    moneyLine converts win probabilities into (integer) money line odds: -100 p/(1-p) for a
+    favourite, 100 (1-p)/p otherwise.
+    '''
+    p = np.asarray(p)
+    favourite = p > 0.5
+    with np.errstate(divide='ignore'):
+        line = np.where(favourite,-100.*p/(1.-p),100.*(1.-p)/p)
+    return np.round(line).astype(int)
+
+class CompiledModel:
+    '''
+    CompiledModel scores matchups from the raw stats ('FG' to 'PTS', then the opponent 'FG' to
+    'PTS': 42 values per team) with two dot products.
+    '''
+    def __init__(self,visitorWeights,homeWeights,bias):
+        self.visitorWeights = np.asarray(visitorWeights,dtype=np.float64)
+        self.homeWeights = np.asarray(homeWeights,dtype=np.float64)
+        self.bias = float(bias)
+
+    @classmethod
+    def fromParameters(cls,w,statMean,PCABasis):
+        '''
+        fromParameters compiles the trained parameters.
+
+        Inputs:
+        w - logistic regression coefficients (1 + 2 x number of PCA vectors)
+        statMean - mean of each statistical category
+        PCABasis - matrix whose columns are the PCA basis vectors
+        '''
+        nPCA = PCABasis.shape[1]
+        visitorWeights = PCABasis @ w[1:1+nPCA]
+        homeWeights = PCABasis @ w[1+nPCA:1+2*nPCA]
+        bias = w[0] - statMean @ (visitorWeights + homeWeights)
+        return cls(visitorWeights,homeWeights,bias)
+
+    def save(self,fileName):
+        '''save writes the model to a .npz file (about 1 kB)'''
+        np.savez(fileName,visitorWeights=self.visitorWeights,homeWeights=self.homeWeights,
+                 bias=np.array(self.bias))
+
+    @classmethod
+    def load(cls,fileName):
+        '''load reads a model written by save'''
+        with np.load(fileName) as artifact:
+            return cls(artifact['visitorWeights'],artifact['homeWeights'],artifact['bias'])
+
+    def logit(self,visitorStats,homeStats):
+        '''
+        logit evaluates the model's logit for the raw stats of the visiting and home teams
+        (42 values each, or arrays of matchups x 42).
+        '''
+        return self.bias + np.dot(visitorStats,self.visitorWeights) + np.dot(homeStats,self.homeWeights)
+
+    def probability(self,visitorStats,homeStats):
+        '''probability returns the visiting team's win probability'''
+        return 1./(1. + np.exp(-self.logit(visitorStats,homeStats)))
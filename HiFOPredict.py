@@ -1,251 +1,174 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
-from bs4 import BeautifulSoup
-import requests
+import BRFetchTools
+import BRTableParser
+import BRWebscrapeTools as br
+import Franchises
+import HiFOModel
+import Instrumentation
+import ModelRegistry
 
 class HiFOPredict:
     '''
     The HiFOPredict class predicts NBA game win probabilities using a
-    logistic regression model trained on 2001-02 to 2020-21 data. The model
-    parameters and team statistic means/PCA basis are hard-coded here.
+    logistic regression model (by default trained on 2001-02 to 2020-21 data).
+    The model parameters and team statistic means/PCA basis are loaded from a
+    ModelRegistry version, and can be swapped for another version at any time.
+    Predictions are for the games of a date, or of a range of dates (endDate, or predictRange),
+    with the team stats downloaded once and each month's schedule once.
+    Teams are the franchises of Franchises.index: teamIndex holds their abbreviations in the order
+    of the franchise ids.
     '''
     
     '''CLASS VARIABLES'''
-    # dictionary of team names to abbreviations in BR URLs (based on 2021-22 season)
-    teamNameKey = {'Atlanta Hawks' : 'ATL',
-              'Boston Celtics' : 'BOS',
-              'Brooklyn Nets' : 'NJN',
-              'Charlotte Hornets' : 'CHA', 
-              'Chicago Bulls' : 'CHI',
-              'Cleveland Cavaliers' : 'CLE',
-              'Dallas Mavericks' : 'DAL',
-              'Denver Nuggets' : 'DEN',
-              'Detroit Pistons' : 'DET',
-              'Golden State Warriors' : 'GSW',
-              'Houston Rockets' : 'HOU',
-              'Indiana Pacers' : 'IND',
-              'Los Angeles Clippers' : 'LAC',
-              'Los Angeles Lakers' : 'LAL',
-              'Memphis Grizzlies' : 'MEM',
-              'Miami Heat' : 'MIA',
-              'Milwaukee Bucks' : 'MIL',
-              'Minnesota Timberwolves' : 'MIN',
-              'New Orleans Pelicans' : 'NOH',
-              'New York Knicks' : 'NYK',
-              'Oklahoma City Thunder' : 'OKC',
-              'Orlando Magic' : 'ORL',
-              'Philadelphia 76ers' : 'PHI',
-              'Phoenix Suns' : 'PHO',
-              'Portland Trail Blazers' : 'POR',
-              'Sacramento Kings' : 'SAC',
-              'San Antonio Spurs' : 'SAS',
-              'Toronto Raptors' : 'TOR',
-              'Utah Jazz' : 'UTA',
-              'Washington Wizards' : 'WAS'}
-    
-    # logistic regression coefficients
-    w = np.array([-0.3840704 , -0.01434259, -0.03438915,  0.058654  , -0.00311654,
-       -0.11415171,  0.02359393, -0.01524577,  0.01094597,  0.02315544,
-       -0.06196125,  0.00262423,  0.12908761, -0.02927948,  0.01771595])
-    
-    # means for each statistical category
-    statMean = np.array([ 37.67788945,  82.94857621,   0.45416248,   7.6681742 ,
-        21.46046901,   0.35549079,  30.01524288,  61.48693467,
-         0.48955276,  18.09296482,  23.83366834,   0.75986767,
-        10.97889447,  31.65527638,  42.63031826,  22.12512563,
-         7.58308208,   4.88425461,  14.41055276,  20.84706868,
-       101.12026801,  37.68492462,  82.94907873,   0.4541474 ,
-         7.66834171,  21.45862647,   0.35648409,  30.01490787,
-        61.48944724,   0.48927973,  18.09564489,  23.83433836,
-         0.75940704,  10.97554439,  31.65661642,  42.63350084,
-        22.12579564,   7.58442211,   4.88509213,  14.40871022,
-        20.84572864, 101.12713568])
-    
-    # PCA basis
-    PCABasis = np.array([[-1.25891739e-01,  1.17113673e-01,  4.16749492e-02,
-        -5.67605167e-02, -2.09278425e-01,  1.55117145e-01,
-        -1.67320966e-01],
-       [-2.11566440e-01,  2.07785347e-01, -4.96418860e-02,
-        -2.08234093e-01,  3.72990567e-03,  3.01820692e-01,
-         2.32981406e-01],
-       [-3.52156558e-04,  2.73363084e-04,  7.79591334e-04,
-         4.71495547e-04, -2.53032510e-03,  2.02950153e-04,
-        -3.32325960e-03],
-       [-1.66281818e-01, -1.16306862e-01,  1.21650035e-01,
-         1.21116268e-03,  3.46076588e-02,  9.42851387e-02,
-        -2.15439778e-02],
-       [-4.50657361e-01, -3.00713379e-01,  2.60249293e-01,
-         1.17175352e-03,  1.85914548e-01,  1.84664250e-01,
-         1.13299422e-01],
-       [-2.95931858e-04, -4.20821357e-04,  1.47087155e-03,
-         6.03016896e-05, -1.21986296e-03,  1.41160637e-03,
-        -2.89117494e-03],
-       [ 4.05540896e-02,  2.33413554e-01, -8.01139139e-02,
-        -5.82855381e-02, -2.44382843e-01,  6.14080767e-02,
-        -1.47570189e-01],
-       [ 2.39054116e-01,  5.09105344e-01, -3.09219246e-01,
-        -2.09304035e-01, -1.81882708e-01,  1.16997325e-01,
-         1.19384488e-01],
-       [-1.30887051e-03, -2.94475953e-04,  1.20994174e-03,
-         7.44615541e-04, -2.53027735e-03,  4.96394611e-05,
-        -3.25252381e-03],
-       [ 2.33997384e-02,  9.85625842e-02,  1.12174019e-01,
-         3.12637844e-01, -1.03219354e-01, -2.61955047e-01,
-         1.00275327e-01],
-       [ 4.47206296e-02,  1.20908574e-01,  1.43028826e-01,
-         4.14008049e-01, -1.05787585e-01, -3.70484065e-01,
-         2.27085181e-01],
-       [-4.58838329e-04,  2.54290233e-04,  2.02451765e-04,
-        -5.42915266e-05, -1.05072402e-03,  8.47429349e-04,
-        -3.05386738e-03],
-       [ 4.09116527e-02,  7.81955677e-02, -8.00132157e-03,
-         6.84515737e-03, -1.41763026e-02,  4.43608559e-03,
-         1.95299662e-01],
-       [-1.11348130e-01, -1.37992740e-02,  8.52441170e-02,
-        -1.19306842e-01, -1.72348067e-01, -3.08300097e-02,
-         3.13121272e-01],
-       [-7.04350585e-02,  6.40574486e-02,  7.74233359e-02,
-        -1.12467911e-01, -1.87227336e-01, -2.64566651e-02,
-         5.08498599e-01],
-       [-8.00948139e-02,  5.03018453e-02,  4.17156187e-02,
-        -7.06667754e-02, -1.91111273e-01,  1.95938327e-01,
-        -1.43783458e-01],
-       [-4.58802141e-03,  7.73912994e-03, -1.83594656e-02,
-         2.04972979e-02, -3.52211704e-02,  7.59772898e-02,
-         2.16037247e-02],
-       [ 3.27195731e-03,  1.57697245e-02,  3.80944587e-02,
-        -1.76731936e-02, -5.49938827e-02,  6.13268541e-03,
-         6.74784885e-02],
-       [ 1.02173529e-02,  3.63819254e-02, -8.51755496e-03,
-         7.43030244e-02,  6.94114924e-02, -6.31883163e-02,
-         1.24143425e-01],
-       [ 3.23651324e-02,  5.79558116e-02, -3.99043045e-02,
-         2.70105246e-01,  6.98442981e-02,  2.21026445e-01,
-         1.49154296e-01],
-       [-3.94593558e-01,  2.17009108e-01,  3.17313219e-01,
-         1.99301424e-01, -4.85549490e-01,  1.44949443e-01,
-        -2.54427822e-01],
-       [-1.30217488e-01,  1.70333470e-01,  3.84096558e-03,
-        -5.61361669e-02,  1.61059348e-01, -1.74350876e-01,
-        -1.60686627e-01],
-       [-2.22916646e-01,  2.21583466e-01,  1.81306436e-01,
-        -2.14740481e-01,  2.89823450e-02, -2.22434847e-01,
-         1.73378911e-01],
-       [-3.47751389e-04,  8.59453178e-04, -9.38727818e-04,
-         4.93962974e-04,  1.77830674e-03, -8.70903156e-04,
-        -2.91785132e-03],
-       [-1.48420013e-01, -1.67158512e-02, -1.63286409e-01,
-         1.12891765e-03, -3.48444858e-02, -9.23720797e-02,
-         2.12453505e-02],
-       [-4.04832191e-01, -7.53636774e-02, -3.95611155e-01,
-        -2.99786781e-02, -1.61373265e-01, -2.13768887e-01,
-         1.41210745e-01],
-       [-1.71278917e-04,  5.45725801e-04, -9.68038530e-04,
-         7.06163188e-04,  1.08450259e-03, -6.84025944e-04,
-        -1.41732765e-03],
-       [ 1.80829156e-02,  1.86783625e-01,  1.67125308e-01,
-        -5.76035071e-02,  1.96432625e-01, -8.16031910e-02,
-        -1.81399422e-01],
-       [ 1.82009174e-01,  2.97330950e-01,  5.77031711e-01,
-        -1.85211291e-01,  1.91238933e-01, -9.04402489e-03,
-         3.28997462e-02],
-       [-1.20549517e-03,  6.39505509e-04, -1.91364957e-03,
-         4.78771743e-04,  1.64680969e-03, -1.29182094e-03,
-        -3.17796071e-03],
-       [ 2.70926605e-02,  9.19927516e-02, -5.17242768e-02,
-         3.12750007e-01,  1.01545788e-01,  3.04314381e-01,
-         9.06125963e-02],
-       [ 4.78352233e-02,  1.17905241e-01, -5.37684846e-02,
-         4.05907864e-01,  1.31429205e-01,  4.03629383e-01,
-         1.41105140e-01],
-       [-4.04717145e-04,  9.19540916e-05, -4.89990829e-04,
-         1.86091865e-04,  4.99712075e-05, -1.23122696e-04,
-        -6.68269760e-04],
-       [ 3.00669885e-02,  7.83059661e-02,  7.39656546e-02,
-         3.14339611e-04,  6.55921009e-02,  1.10495161e-02,
-         4.82721432e-03],
-       [-1.17015023e-01,  1.75412842e-02, -4.99861619e-02,
-        -1.19259711e-01,  2.05375610e-01,  1.01529939e-01,
-         1.75582143e-01],
-       [-8.68134269e-02,  9.57875204e-02,  2.31558466e-02,
-        -1.19425381e-01,  2.71131439e-01,  1.12583510e-01,
-         1.81364604e-01],
-       [-8.38339393e-02,  1.11545072e-01, -1.26604751e-01,
-        -2.83661820e-02,  1.38822135e-01, -1.40356680e-01,
-        -3.75809802e-02],
-       [-4.80809446e-03,  3.02057893e-02,  1.36566218e-03,
-         4.73197035e-03,  4.64760904e-02, -2.58905822e-02,
-         6.91374688e-02],
-       [ 2.87858835e-03,  3.21373180e-02, -4.17035375e-02,
-         8.34704800e-03,  3.96671550e-02, -3.89856802e-02,
-         8.28026361e-02],
-       [ 7.43176159e-03,  1.33898492e-02, -3.50575705e-02,
-         7.49028470e-02, -1.34117479e-02,  1.41030632e-01,
-         1.01824699e-02],
-       [ 2.95723125e-02,  5.10775154e-02,  7.63156060e-02,
-         2.46217149e-01, -5.98751771e-02, -1.39310054e-01,
-         1.58319098e-01],
-       [-3.81844433e-01,  4.16659663e-01, -2.07678749e-01,
-         2.00577342e-01,  3.88600549e-01, -1.34602976e-01,
-        -2.08618352e-01]])
-    
+    # dictionary of current team names to their BR URL slugs (built from Franchises.index)
+    teamNameKey = dict(zip(Franchises.index.names(np.arange(len(Franchises.index))),
+                           [str(slug) for slug in Franchises.index.slugs]))
+
     '''CONSTRUCTOR'''
-    def __init__(self,season,date=pd.to_datetime('today').normalize()):
+    def __init__(self,season,date=pd.to_datetime('today').normalize(),
+                 brURL='https://www.basketball-reference.com',maxWorkers=8,requestsPerSecond=5.,fetcher=None,
+                 modelVersion=None,registry=None,endDate=None):
         '''
         season - second year of current season (e.g. 2022 for 2021-22 season)
         date - pd Timestamp with date to do predictions (defaults to today)
+        brURL - base URL of basketball-reference
+        maxWorkers - maximum number of pages downloaded simultaneously
+        requestsPerSecond - maximum rate of requests sent to BR (None for no limit)
+        fetcher - BRFetchTools.BRFetcher to download pages with (defaults to one using the shared
+                  on-disk cache and requestsPerSecond)
+        modelVersion - version of the model to use (defaults to the latest)
+        registry - ModelRegistry.ModelRegistry to load the model from (defaults to the models directory)
+        endDate - pd Timestamp of the last date to do predictions (the games from date to endDate;
+                  defaults to date)
         '''
         # extract team stats and record
-        self.season = str(season)
-        self.date = date
-        self.dataDict, self.teamWL = self._extractStats()
+        self._configure(season,date,brURL,maxWorkers,requestsPerSecond,registry,endDate)
+        self.fetcher = fetcher or BRFetchTools.BRFetcher(BRFetchTools.defaultCache(),requestsPerSecond)
+        teamWL,statDict = self._extractStats()
         
         # extract days games
-        self.upcoming = self._extractDaysGames()
-        
+        self._setup(teamWL,statDict,modelVersion,self._extractDaysGames())
+
+    @classmethod
+    async def createAsync(cls,season,date=pd.to_datetime('today').normalize(),
+                          brURL='https://www.basketball-reference.com',requestsPerSecond=5.,fetcher=None,
+                          modelVersion=None,registry=None,endDate=None):
+        '''
+        Async constructor: downloads the team pages and the month's schedule concurrently in the
+        running event loop. Same inputs as HiFOPredict(), with fetcher a BRAsyncTools.AsyncBRFetcher
+        (defaults to one using the shared on-disk cache and requestsPerSecond, closed at the end).
+
+        Usage:
+            predictor = await HiFOPredict.createAsync(2022)
+        '''
+        import BRAsyncTools # imported here so that blocking users do not need httpx
+        obj = cls.__new__(cls)
+        obj._configure(season,date,brURL,None,requestsPerSecond,registry,endDate)
+        ownFetcher = fetcher is None
+        obj.fetcher = fetcher or BRAsyncTools.AsyncBRFetcher(BRFetchTools.defaultCache(),requestsPerSecond)
+        try:
+            (teamWL,statDict),upcoming = await asyncio.gather(obj._extractStatsAsync(),obj._extractDaysGamesAsync())
+        finally:
+            if ownFetcher:
+                await obj.fetcher.aclose()
+        obj._setup(teamWL,statDict,modelVersion,upcoming)
+        return obj
+
+    @classmethod
+    def withSchedule(cls,season,date=pd.to_datetime('today').normalize(),
+                     brURL='https://www.basketball-reference.com',maxWorkers=8,requestsPerSecond=5.,fetcher=None,
+                     modelVersion=None,registry=None,endDate=None):
+        '''
+        Constructor that also downloads every month of the season's schedule (kept in schedule, see
+        extractSchedule) and takes the games of date to endDate from it, instead of downloading
+        their month a second time. Same inputs as HiFOPredict().
+        '''
+        obj = cls.__new__(cls)
+        obj._configure(season,date,brURL,maxWorkers,requestsPerSecond,registry,endDate)
+        obj.fetcher = fetcher or BRFetchTools.BRFetcher(BRFetchTools.defaultCache(),requestsPerSecond)
+        teamWL,statDict = obj._extractStats()
+        gameTable = obj._parseSchedule(obj._seasonPages())
+        obj.schedule = obj._scheduleGames(gameTable)
+        obj._setup(teamWL,statDict,modelVersion,obj._daysGames(gameTable,obj.date,obj.endDate))
+        return obj
         
     '''CONSTRUCTOR METHODS'''
-    def _extractStats(self):
+    def _configure(self,season,date,brURL,maxWorkers,requestsPerSecond,registry,endDate=None):
+        self.season = str(season)
+        self.date = date
+        self.endDate = date if endDate is None else endDate
+        self.brURL = brURL
+        self.maxWorkers = maxWorkers
+        self.requestsPerSecond = requestsPerSecond
+        self.registry = registry or ModelRegistry.defaultRegistry()
+
+    def _setup(self,teamWL,statDict,modelVersion,upcoming):
+        self.teamWL = teamWL
+        # team x 42 array of the raw stats, rows in the order of teamIndex
+        self.teamIndex = pd.Index(list(statDict))
+        self.teamStats = np.stack([statDict[team] for team in self.teamIndex])
+
+        # load the model, and project the team stats onto its PCA basis
+        self.useModel(modelVersion)
+        self.upcoming = upcoming
+
+    def _statURLs(self):
+        '''URLs of every team's offensive and defensive pages'''
+        brTeam = self.brURL+'/teams/'
+        offStats = '/stats_per_game_totals.html'
+        defStats = '/opp_stats_per_game_totals.html'
+        urls = []
+        for slug in Franchises.index.slugs:
+            urls.append(brTeam+slug+offStats)
+            urls.append(brTeam+slug+defStats)
+        return urls
+
+    async def _extractStatsAsync(self):
+        '''async version of _extractStats (self.fetcher is a BRAsyncTools.AsyncBRFetcher)'''
+        return self._extractStats(await self.fetcher.fetchPages(self._statURLs()))
+
+    def _extractStats(self,pages=None):
         '''
+        Inputs:
+        pages - html of the pages of _statURLs() (downloaded here if not given)
         Outputs:
-        dataDict
         teamWL - pd DataFrame
+        statDict - raw stats (offensive then defensive FG to PTS) of each team, in the order of the
+                   franchise ids (see Franchises)
         '''
-        dataDict = {}
+        statDict = {}
         teamList = []
         teamW = []
         teamL = []
-        brTeam = 'https://www.basketball-reference.com/teams/'
-        offStats = '/stats_per_game_totals.html'
-        defStats = '/opp_stats_per_game_totals.html'
-        
-        for team in self.teamNameKey:
-            print(team)
+
+        # download every team's offensive and defensive pages concurrently
+        if pages is None:
+            with Instrumentation.stage('download team pages') as stage:
+                pages = self.fetcher.fetchPages(self._statURLs(),self.maxWorkers)
+                stage.addBytes(sum(len(page) for page in pages))
+
+        franchises = np.arange(len(Franchises.index))
+        names = Franchises.index.names(franchises,self.season)
+        abbrevs = Franchises.index.abbreviations(franchises,self.season)
+        for i,team in enumerate(abbrevs):
+            print(names[i])
             # extract offensive stats and WLs
-            url = brTeam+self.teamNameKey[team]+offStats
-            offTableList = pd.read_html(url,flavor='bs4')     #  THIS FUNCTION CALL TAKES THE LONGEST
-            offTable = offTableList[0]
-            latestSeason = offTable.iloc[0] # most recent season
-            offNumbers = (latestSeason['FG':'PTS'].map(float)).to_numpy() # convert to float, store the numbers
-            
+            offNumbers,latestSeason = self._parseTeamTable(pages[2*i])
+
             # Ws and Ls
-            teamList.append(self.teamNameKey[team])
-            teamW.append(latestSeason['W'])
-            teamL.append(latestSeason['L'])
+            teamList.append(team)
+            teamW.append(int(latestSeason['W']))
+            teamL.append(int(latestSeason['L']))
+
 
-            
             # extract defensive stats
-            url = brTeam+self.teamNameKey[team]+defStats
-            defTableList = pd.read_html(url,flavor='bs4')
-            defTable = defTableList[0]
-            latestSeason = defTable.iloc[0] # most recent season, convert to floart
-            defNumbers = (latestSeason['FG':'PTS'].map(float)).to_numpy() # convert to float, store the numbers
-            
-            # convert to PCA vector
-            teamData = np.hstack([offNumbers,defNumbers])
-            teamDataZero = teamData - self.statMean
-            teamPCA = np.dot(teamDataZero,self.PCABasis)
-            dataDict[self.teamNameKey[team]] = teamPCA
+            defNumbers,_ = self._parseTeamTable(pages[2*i+1])
+
+            # offensive then defensive stats (converted to PCA vectors by useModel)
+            statDict[team] = np.hstack([offNumbers,defNumbers])
         
         teamWL = pd.DataFrame({
             'Tm' : teamList,
@@ -253,80 +176,292 @@ class HiFOPredict:
             'L' : teamL
         })
         
-        return dataDict,teamWL
-    
-    def _extractDaysGames(self):
+        return teamWL,statDict
+
+    @staticmethod
+    def _parseTeamTable(html):
         '''
+        Parses a team's (opp_)stats_per_game_totals page.
         Outputs:
-        daysGamesComp - pd DataFrame containing columns ('Date','Start (ET)','Visitor','Home') of day's games
+        numbers - np array of the FG to PTS stats of the most recent season
+        latestSeason - pd Series with W, L and the FG to PTS stats of the most recent season
+        '''
+        with Instrumentation.stage('parse team pages') as stage:
+            stage.addBytes(len(html))
+            latestSeason = BRTableParser.parseTeamTotals(html) # most recent season, first row only
+        numbers = (latestSeason['FG':'PTS']).to_numpy() # store the numbers
+        return numbers,latestSeason
+
+    def _scheduleURLs(self,startDate,endDate):
+        '''URLs of the season's schedule pages of every month from startDate to endDate'''
+        # ASSUMING THERE WON'T BE ANY TIMEZONE CONFLICT ON TWITTER SERVER
+        months = pd.period_range(startDate,endDate,freq='M')
+        # form URL for each month's games
+        return [self.brURL + '/leagues/NBA_' + self.season + '_games-' + month.lower() + '.html'
+                for month in months.strftime('%B')]
+
+    async def _extractDaysGamesAsync(self):
+        '''async version of _extractDaysGames (self.fetcher is a BRAsyncTools.AsyncBRFetcher)'''
+        urls = self._scheduleURLs(self.date,self.endDate)
+        return self._extractDaysGames(responses=await asyncio.gather(*[self.fetcher.fetch(url) for url in urls]))
+
+    def _extractDaysGames(self,startDate=None,endDate=None,responses=None):
+        '''
+        Inputs:
+        startDate, endDate - range of dates (pd Timestamps, inclusive; default: date to endDate)
+        responses - BRFetchTools.FetchResult of each of _scheduleURLs() (downloaded here if not given)
+        Outputs:
+        daysGamesComp - pd DataFrame containing columns ('Date','Start (ET)','Visitor','Home') of the games
             Date - game date
             Start (ET) - start time
             Visitor - abbreviation of visiting team
             Home - abbreviation of home team
         '''
-        # ASSUMING THERE WON'T BE ANY TIMEZONE CONFLICT ON TWITTER SERVER
-        month = self.date.month_name().lower()
-        # form URL for this month's games
-        url = 'https://www.basketball-reference.com/leagues/NBA_' + self.season + '_games-' + month + '.html'
-        # check that the webpage is good
-        urlTest = requests.head(url)
-        if urlTest.status_code != 200:
-            print('From',url,'unexpected status code',urlTest.status_code)
+        startDate = self.date if startDate is None else startDate
+        endDate = self.endDate if endDate is None else endDate
+        # download the month pages (each once), checking that the webpages are good
+        if responses is None:
+            urls = self._scheduleURLs(startDate,endDate)
+            with Instrumentation.stage('download schedule') as stage:
+                if len(urls) == 1:
+                    responses = [self.fetcher.fetch(urls[0])]
+                else:
+                    with ThreadPoolExecutor(max_workers=self.maxWorkers or 8) as pool:
+                        responses = list(pool.map(self.fetcher.fetch,urls))
+                stage.addBytes(sum(len(response.text or '') for response in responses))
+        pages = []
+        for response in responses:
+            if response.status != 200:
+                print('From',response.url,'unexpected status code',response.status)
+            else:
+                pages.append(response.text)
+        if not pages:
             return pd.DataFrame() # return empty data frame
-        
-        # read table
-        gameTable = pd.read_html(url,flavor='bs4')[0]
-        # find day's games
-        gameDates = pd.to_datetime(gameTable['Date'])
-        daysGames = gameTable[gameDates == self.date]
+
+        return self._daysGames(self._parseSchedule(pages),startDate,endDate)
+
+    @staticmethod
+    def _parseSchedule(pages):
+        '''schedule table (see BRTableParser.parseScheduleTable) of the games of the month pages'''
+        with Instrumentation.stage('parse schedule') as stage:
+            stage.addBytes(sum(len(page) for page in pages))
+            return pd.concat([BRTableParser.parseScheduleTable(page) for page in pages],ignore_index=True)
+
+    def _daysGames(self,gameTable,startDate,endDate):
+        '''games of gameTable from startDate to endDate (see _extractDaysGames)'''
+        # find the games of the range, all dates parsed at once
+        gameDates = pd.to_datetime(gameTable['Date'],format='%a, %b %d, %Y',errors='coerce') # 'Playoffs' rows: NaT
+        daysGames = gameTable[(gameDates >= startDate) & (gameDates <= endDate)]
         if daysGames.empty:
-            print('No games',self.date.strftime('%Y-%m-%d'))
+            dates = [startDate.strftime('%Y-%m-%d')] + ([] if endDate == startDate else ['to',endDate.strftime('%Y-%m-%d')])
+            print('No games',*dates)
             return pd.DataFrame() # return empty data frame
         
         daysGamesComp = pd.DataFrame({'Date' : daysGames['Date'],
                                      'Start (ET)' : daysGames['Start (ET)'],
-                                     'Visitor' : daysGames['Visitor/Neutral'].map(self.teamNameKey),
-                                     'Home' : daysGames['Home/Neutral'].map(self.teamNameKey)})
+                                     'Visitor' : self._teamAbbrevs(daysGames['Visitor/Neutral']),
+                                     'Home' : self._teamAbbrevs(daysGames['Home/Neutral'])})
         return daysGamesComp
     
     '''
     PUBLIC METHODS
     '''
+    def useModel(self,version=None):
+        '''
+        Switches to a version of the model (default: the latest in the registry). The switch is a
+        single assignment, so predictions running in other threads use either the old or the new
+        model, never a mix of the two.
+        '''
+        model = self.registry.load(version)
+        with Instrumentation.stage('PCA projection'):
+            teamPCA = np.dot(self.teamStats - model.statMean,model.PCABasis) # team x PCA array, rows in the order of teamIndex
+        self._active = (model,teamPCA,dict(zip(self.teamIndex,teamPCA)))
+
+    def reloadModel(self):
+        '''
+        Switches to the latest version in the registry if it is newer than the current one, without
+        downloading anything again. Returns True if the model was changed.
+        '''
+        latest = self.registry.latest()
+        if latest is None or latest <= self.modelVersion:
+            return False
+        self.useModel(latest)
+        return True
+
+    @property
+    def model(self):
+        '''ModelRegistry.ModelVersion in use'''
+        return self._active[0]
+
+    @property
+    def modelVersion(self):
+        return self._active[0].version
+
+    @property
+    def w(self):
+        return self._active[0].w
+
+    @property
+    def statMean(self):
+        return self._active[0].statMean
+
+    @property
+    def PCABasis(self):
+        return self._active[0].PCABasis
+
+    @property
+    def teamPCA(self):
+        return self._active[1]
+
+    @property
+    def dataDict(self):
+        return self._active[2]
+
+    @Instrumentation.timed('predict')
     def predict(self):
         '''
-        Generates predictions of win probability for the day's games, based on latest team reg. season-average stats.
+        Generates predictions of win probability for the day's games (from date to endDate), based on latest team reg. season-average stats.
         '''
-        if self.upcoming.empty:
+        return self._predictGames(self.upcoming)
+
+    @Instrumentation.timed('predict')
+    def predictRange(self,startDate,endDate):
+        '''
+        Generates predictions for the games of a range of dates (pd Timestamps, inclusive) with the
+        team stats already downloaded: each month's schedule is downloaded once, and every game
+        scored in a single batch. Same columns as predict().
+        '''
+        return self._predictGames(self._extractDaysGames(startDate,endDate))
+
+    def _predictGames(self,games):
+        '''prediction table of the games of a schedule table (see _extractDaysGames)'''
+        if games.empty:
             return pd.DataFrame()
         
-        # predictor variables
-        xVis = np.stack(self.upcoming['Visitor'].map(self.dataDict))
-        xHom = np.stack(self.upcoming['Home'].map(self.dataDict))
-        x = np.hstack((np.ones((xVis.shape[0],1)),
-                       xVis,
-                       xHom)) # prediction variables
-        
-        # make probability prediction
-        sigma = lambda a : 1./(1. + np.exp(-a))
-        visWinProbability = sigma(np.dot(x,self.w))
-        
-        # convert probabilities into money line odds
-        convertPtoMLO = lambda p : np.round((-1.)**(p > 0.5) * 100 * ((1-p)/p)**((-1)**(p > 0.5)))
-        visMLO = convertPtoMLO(visWinProbability)
+        # make probability prediction, and convert probabilities into money line odds
+        visWinProbability,visMLO = self.predictPairs(self.teamCodes(games['Visitor']),
+                                                     self.teamCodes(games['Home']))
         homMLO = -visMLO
         
         # build prediction table
         predictions = pd.DataFrame({
-            'Date' : self.upcoming['Date'].to_list(),
-            'Visitor' : self.upcoming['Visitor'].to_list(),
-            'Home' : self.upcoming['Home'].to_list(),
+            'Date' : games['Date'].to_list(),
+            'Visitor' : games['Visitor'].to_list(),
+            'Home' : games['Home'].to_list(),
             'Visitor win probability' : visWinProbability,
-            'Visitor Line' : visMLO.astype(int),
-            'Home Line' : homMLO.astype(int)
+            'Visitor Line' : visMLO,
+            'Home Line' : homMLO
             
         })
         return predictions
 
+    def extractSchedule(self):
+        '''
+        Downloads every month of the season's schedule.
+        Outputs:
+        schedule - pd DataFrame with columns Date (Timestamp), Start (ET), Visitor and Home (abbreviations)
+        '''
+        return self._scheduleGames(self._parseSchedule(self._seasonPages()))
+
+    def _seasonPages(self):
+        '''html of every month page of the season's schedule'''
+        seasonURL = self.brURL + '/leagues/NBA_' + self.season + '_games.html'
+        monthURLs,monthNames,_ = br.monthURLsFromPage(self.fetcher.fetchText(seasonURL),self.brURL)
+        return self.fetcher.fetchPages(monthURLs,self.maxWorkers or 8)
+
+    def _scheduleGames(self,games):
+        '''extractSchedule table of a schedule table (see _parseSchedule)'''
+        gameDates = pd.to_datetime(games['Date'],format='%a, %b %d, %Y',errors='coerce') # 'Playoffs' rows: NaT
+        games,gameDates = games[gameDates.notna()],gameDates[gameDates.notna()]
+        return pd.DataFrame({'Date' : gameDates,
+                             'Start (ET)' : games['Start (ET)'],
+                             'Visitor' : self._teamAbbrevs(games['Visitor/Neutral']),
+                             'Home' : self._teamAbbrevs(games['Home/Neutral'])}).reset_index(drop=True)
+
+    def compiledModel(self,version=None):
+        '''
+        Returns a version of the model (default: the one in use) as a HiFOModel.CompiledModel,
+        scoring matchups directly from teamStats (e.g. to compare several versions on the same stats).
+        '''
+        return self.model.compiled if version is None else self.registry.load(version).compiled
+
+    def _teamAbbrevs(self,names):
+        '''converts the team names of a schedule into the season's abbreviations (those of teamIndex)'''
+        return Franchises.index.abbreviations(Franchises.index.codes(names,self.season),self.season)
+
+    def teamCodes(self,abbrevs):
+        '''
+        Converts team abbreviations (of this season or an earlier one, or BR URL slugs) into
+        indices of teamIndex (rows of teamPCA), which are the franchise ids of Franchises.index.
+        '''
+        codes = Franchises.index.codes(abbrevs,self.season)
+        if (codes < 0).any():
+            raise KeyError('Unknown teams '+str(list(np.asarray(abbrevs)[codes < 0])))
+        return codes
+
+    def _teamScores(self,w):
+        '''
+        Splits the logistic model into per-team terms: logit = bias + visitor[v] + home[h].
+        w - coefficients (15,) or a batch of model variants (models x 15)
+        Outputs bias (models,), visitor and home (models x teams).
+        '''
+        model,teamPCA,_ = self._active # one model throughout, even if it is swapped meanwhile
+        W = np.atleast_2d(model.w if w is None else w)
+        nPCA = teamPCA.shape[1]
+        visitor = W[:,1:1+nPCA] @ teamPCA.T
+        home = W[:,1+nPCA:1+2*nPCA] @ teamPCA.T
+        return W[:,0],visitor,home
+
+    def probabilityMatrix(self,w=None):
+        '''
+        Computes the visitor win probability and money line of every possible matchup.
+
+        Inputs:
+        w - logistic regression coefficients (default: the model's w); a (models x 15) array gives
+            one matrix per model variant
+
+        Outputs:
+        visWinProbability - (visitor x home) matrix, rows and columns in the order of teamIndex
+                            ((models x visitor x home) for a batch of w); the diagonal is meaningless
+        visMLO - visiting team money lines, same shape (home lines are -visMLO)
+        '''
+        bias,visitor,home = self._teamScores(w)
+        visWinProbability = self.sigma(bias[:,None,None] + visitor[:,:,None] + home[:,None,:])
+        if w is None or np.ndim(w) == 1:
+            visWinProbability = visWinProbability[0]
+        return visWinProbability,self.probabilityToMoneyLine(visWinProbability)
+
+    def predictPairs(self,visitor,home,w=None):
+        '''
+        Computes the visitor win probability and money line of a batch of matchups.
+
+        Inputs:
+        visitor, home - integer arrays of team indices (see teamCodes), of the same shape
+        w - logistic regression coefficients (default: the model's w), or (models x 15) for a
+            batch of model variants (outputs then have a leading models axis)
+
+        Outputs:
+        visWinProbability - visitor win probability of each matchup
+        visMLO - visiting team money lines (home lines are -visMLO)
+        '''
+        bias,visitorScore,homeScore = self._teamScores(w)
+        logit = visitorScore[:,visitor] + homeScore[:,home]
+        logit += bias.reshape((-1,) + (1,)*np.ndim(visitor))
+        visWinProbability = self.sigma(logit)
+        if w is None or np.ndim(w) == 1:
+            visWinProbability = visWinProbability[0]
+        return visWinProbability,self.probabilityToMoneyLine(visWinProbability)
+
+    @staticmethod
+    def sigma(a):
+        return 1./(1. + np.exp(-a))
+
+    @staticmethod
+    def probabilityToMoneyLine(p):
+        '''
+        Converts win probabilities into (integer) money line odds (see HiFOModel.moneyLine).
+        '''
+        return HiFOModel.moneyLine(p)
 
 if __name__ == '__main__':
   obj1 = HiFOPredict(2022)
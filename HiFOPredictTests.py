@@ -0,0 +1,254 @@
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import BRFetchTools
+import Franchises
+import ModelRegistry
+from BRStubServer import BRStubServer
+from HiFOModel import CompiledModel
+from HiFOPredict import HiFOPredict
+
+'''
+Tests and benchmarks for HiFOPredict, run against BRStubServer (a local stand-in for BR) so that
+no requests are sent to basketball-reference.com.
+'''
+
+def testPredictStub():
+    '''
+    testPredictStub builds a predictor against the stub server for a date with known games,
+    and checks the shape of the predictions table.
+    '''
+    with BRStubServer() as server:
+        obj = HiFOPredict(2021,pd.Timestamp('2020-12-22'),brURL=server.url,fetcher=BRFetchTools.BRFetcher())
+        predictions = obj.predict()
+    print(predictions)
+    print('30 teams extracted:',len(obj.dataDict) == 30)
+    print('2 games predicted:',predictions.shape[0] == 2) # 2020-12-22: GSW @ BRK, LAC @ LAL
+
+def _schedulePaths(server):
+    return [path for _,path in server.paths if '_games-' in path]
+
+def testPredictRange():
+    '''
+    testPredictRange checks that the predictions of a range of dates (endDate, and predictRange)
+    are those of one predictor per day, downloading the team pages once and each month once.
+    '''
+    start,end = pd.Timestamp('2020-12-22'),pd.Timestamp('2021-01-31')
+    with BRStubServer() as server:
+        obj = HiFOPredict(2021,start,brURL=server.url,fetcher=BRFetchTools.BRFetcher(),endDate=end)
+        predictions = obj.predict()
+        print('requests:',sum(server.counts.values())) # expected: 62 (60 team pages, december, january)
+        print('months:',_schedulePaths(server)) # expected: december and january, once each
+
+        # test 1: same as one predictor per day
+        print('test 1')
+        days = pd.date_range(start,start + pd.Timedelta(days=6))
+        perDay = pd.concat([HiFOPredict(2021,day,brURL=server.url,fetcher=BRFetchTools.BRFetcher()).predict()
+                            for day in days],ignore_index=True)
+        firstWeek = pd.to_datetime(predictions['Date'],format='%a, %b %d, %Y') <= days[-1]
+        print('same as per day:',predictions[firstWeek].reset_index(drop=True).equals(perDay)) # expected: True
+        print('whole range:',pd.to_datetime(predictions['Date'],format='%a, %b %d, %Y').agg(['min','max']).dt.date.tolist())
+        # expected: [2020-12-22, 2021-01-31]
+
+        # test 2: predictRange reuses the team stats
+        print('test 2')
+        server.resetCounts()
+        february = obj.predictRange(pd.Timestamp('2021-02-01'),pd.Timestamp('2021-02-28'))
+        print('requests:',server.paths) # expected: only the february page
+        print('february games:',february.shape[0] > 100) # expected: True
+        print('same for the first range:',obj.predictRange(start,end).equals(predictions)) # expected: True
+        print('no games:',obj.predictRange(pd.Timestamp('2021-08-01'),pd.Timestamp('2021-08-31')).empty) # expected: True
+
+def benchmarkPredictRange(latency=0.02):
+    '''
+    benchmarkPredictRange times pricing a month of games with one predictor per day, and with a
+    single predictor over the date range, against a stub server with the given per-request latency.
+    '''
+    start,end = pd.Timestamp('2021-01-01'),pd.Timestamp('2021-01-31')
+    with BRStubServer(latency=latency) as server:
+        cases = [('one predictor per day',lambda : pd.concat([HiFOPredict(2021,day,brURL=server.url,
+                                                                          fetcher=BRFetchTools.BRFetcher()).predict()
+                                                              for day in pd.date_range(start,end)],ignore_index=True)),
+                 ('date range',lambda : HiFOPredict(2021,start,brURL=server.url,fetcher=BRFetchTools.BRFetcher(),
+                                                    endDate=end).predict())]
+        results = []
+        for name,f in cases:
+            server.resetCounts()
+            tic = time.perf_counter()
+            results.append(f())
+            print('%s: %.2f s, %d requests' % (name,time.perf_counter() - tic,sum(server.counts.values())))
+    print('same predictions:',results[0].equals(results[1])) # expected: True
+
+def benchmarkExtractStats(latency=0.2,maxWorkers=8):
+    '''
+    benchmarkExtractStats times the download of the 60 team pages alone, and then the whole
+    HiFOPredict construction (downloads + parsing + month schedule), against a stub server with
+    the given per-request latency. Each is timed with the sequential loop (maxWorkers=1) and
+    with maxWorkers concurrent downloads.
+    '''
+    date = pd.Timestamp('2020-12-22')
+    with BRStubServer(latency=latency) as server:
+        urls = [server.url+'/teams/'+abbrev+page for abbrev in Franchises.index.slugs
+                for page in ['/stats_per_game_totals.html','/opp_stats_per_game_totals.html']]
+        fetcher = BRFetchTools.BRFetcher() # no cache
+        fetcher.fetchPages(urls,maxWorkers) # warm up stub
+        tic = time.perf_counter()
+        fetcher.fetchPages(urls,1)
+        tSequential = time.perf_counter() - tic
+        tic = time.perf_counter()
+        fetcher.fetchPages(urls,maxWorkers)
+        tConcurrent = time.perf_counter() - tic
+        print('downloads only')
+        print('sequential: %.2f s' % tSequential)
+        print('concurrent (%d workers): %.2f s' % (maxWorkers,tConcurrent))
+        print('speedup: %.1fx' % (tSequential/tConcurrent))
+
+        print('full construction')
+        tic = time.perf_counter()
+        sequential = HiFOPredict(2021,date,brURL=server.url,maxWorkers=1,fetcher=fetcher)
+        tSequential = time.perf_counter() - tic
+        tic = time.perf_counter()
+        concurrent = HiFOPredict(2021,date,brURL=server.url,maxWorkers=maxWorkers,fetcher=fetcher)
+        tConcurrent = time.perf_counter() - tic
+    print('sequential: %.2f s' % tSequential)
+    print('concurrent (%d workers): %.2f s' % (maxWorkers,tConcurrent))
+    print('speedup: %.1fx' % (tSequential/tConcurrent))
+    print('same predictions:',sequential.predict().equals(concurrent.predict()))
+
+def _stubPredictor():
+    with BRStubServer() as server:
+        return HiFOPredict(2021,pd.Timestamp('2020-12-22'),brURL=server.url,fetcher=BRFetchTools.BRFetcher())
+
+def testProbabilityMatrix():
+    '''
+    testProbabilityMatrix checks probabilityMatrix() and predictPairs() against predict() and
+    against the model applied to each matchup one at a time.
+    '''
+    obj = _stubPredictor()
+    visWinProbability,visMLO = obj.probabilityMatrix()
+    predictions = obj.predict()
+    visitor = obj.teamCodes(predictions['Visitor'])
+    home = obj.teamCodes(predictions['Home'])
+    print('shape:',visWinProbability.shape) # expected: (30, 30)
+    print('matches predict():',np.allclose(visWinProbability[visitor,home],predictions['Visitor win probability'])
+          and (visMLO[visitor,home] == predictions['Visitor Line']).all()) # expected: True
+    # one matchup at a time, as predict() did before
+    x = np.array([np.hstack([1.,obj.dataDict[v],obj.dataDict[h]]) for v in obj.teamIndex for h in obj.teamIndex])
+    print('matches each matchup:',np.allclose(visWinProbability.ravel(),obj.sigma(x @ obj.w))) # expected: True
+    # batch of pairs and of model variants
+    rng = np.random.default_rng(0)
+    v,h = rng.integers(0,30,size=(2,1000))
+    pairProbability,pairMLO = obj.predictPairs(v,h)
+    print('predictPairs matches matrix:',np.array_equal(pairMLO,visMLO[v,h])
+          and np.allclose(pairProbability,visWinProbability[v,h])) # expected: True
+    W = np.stack([obj.w,0.5*obj.w])
+    print('model variants:',obj.predictPairs(v,h,W)[0].shape,obj.probabilityMatrix(W)[0].shape) # expected: (2, 1000) (2, 30, 30)
+
+def testCompiledModel():
+    '''
+    testCompiledModel checks that the compiled model, saved and loaded back, gives the predictions
+    of predict() from the raw team stats.
+    '''
+    obj = _stubPredictor()
+    predictions = obj.predict()
+    with tempfile.TemporaryDirectory() as modelDir:
+        fileName = os.path.join(modelDir,'model.npz')
+        obj.compiledModel().save(fileName)
+        print('artifact size (bytes):',os.path.getsize(fileName)) # expected: about 1 kB
+        model = CompiledModel.load(fileName)
+    visitor = obj.teamStats[obj.teamCodes(predictions['Visitor'])]
+    home = obj.teamStats[obj.teamCodes(predictions['Home'])]
+    probability = model.probability(visitor,home)
+    print('matches predict():',np.allclose(probability,predictions['Visitor win probability'],rtol=1e-12,atol=1e-12)
+          and (obj.probabilityToMoneyLine(probability) == predictions['Visitor Line']).all()) # expected: True
+    # every matchup
+    allPairs = model.probability(obj.teamStats[:,None,:],obj.teamStats[None,:,:])
+    print('matches probabilityMatrix():',np.allclose(allPairs,obj.probabilityMatrix()[0],rtol=1e-12,atol=1e-12)) # expected: True
+
+def testModelRegistry():
+    '''
+    testModelRegistry publishes model versions to a temporary registry, and checks that a
+    predictor loads the requested version and swaps to a newer one without downloading again.
+    '''
+    v1 = ModelRegistry.defaultRegistry().load(1)
+    with BRStubServer() as server, tempfile.TemporaryDirectory() as registryDir:
+        registry = ModelRegistry.ModelRegistry(registryDir)
+        registry.publish(v1.w,v1.statMean,v1.PCABasis,(2002,2021),'2000-01')
+        obj = HiFOPredict(2021,pd.Timestamp('2020-12-22'),brURL=server.url,fetcher=BRFetchTools.BRFetcher(),
+                          registry=registry)
+        predictions = obj.predict()
+        print('version in use:',obj.modelVersion) # expected: 1
+        print('nothing newer:',obj.reloadModel()) # expected: False
+
+        # test 2: a new version (no home court advantage) is picked up by reloadModel()
+        print('test 2')
+        w = np.array(v1.w)
+        w[0] = 0.
+        registry.publish(w,v1.statMean,v1.PCABasis,(2002,2021),'2000-01',notes='no intercept')
+        server.resetCounts()
+        print('reloaded:',obj.reloadModel(),'version',obj.modelVersion) # expected: True version 2
+        print('requests:',sum(server.counts.values())) # expected: 0
+        print('predictions changed:',not np.allclose(obj.predict()['Visitor win probability'],
+                                                     predictions['Visitor win probability'])) # expected: True
+        print('metadata:',obj.model.metadata['notes'],obj.model.metadata['trainingSeasons']) # expected: no intercept [2002, 2021]
+
+        # test 3: both versions in one process, and back to version 1
+        print('test 3')
+        visitor,home = obj.teamStats[obj.teamCodes(predictions['Visitor'])],obj.teamStats[obj.teamCodes(predictions['Home'])]
+        print('A/B:',obj.compiledModel(1).probability(visitor,home),obj.compiledModel(2).probability(visitor,home))
+        obj.useModel(1)
+        print('version 1 again:',obj.predict().equals(predictions)) # expected: True
+        print('memory-mapped:',isinstance(obj.w,np.memmap)) # expected: True
+
+def benchmarkPredictPairs(nPairs=10**6,repeat=5):
+    '''
+    benchmarkPredictPairs measures the number of matchups priced per second by predictPairs() and
+    probabilityMatrix(), and by the per-game path of predict() (dataDict lookups and np.stack).
+    '''
+    obj = _stubPredictor()
+    rng = np.random.default_rng(0)
+    v,h = rng.integers(0,30,size=(2,nPairs))
+    tic = time.perf_counter()
+    for _ in range(repeat):
+        obj.predictPairs(v,h)
+    print('predictPairs: %.1f million pairs/s' % (repeat*nPairs/(time.perf_counter() - tic)/1e6))
+    tic = time.perf_counter()
+    for _ in range(repeat*100):
+        obj.probabilityMatrix()
+    print('probabilityMatrix: %.1f million pairs/s' % (repeat*100*900/(time.perf_counter() - tic)/1e6))
+    # the previous path, on a smaller batch
+    upcoming = pd.DataFrame({'Visitor' : obj.teamIndex[v[:10**5]],'Home' : obj.teamIndex[h[:10**5]]})
+    tic = time.perf_counter()
+    xVis = np.stack(upcoming['Visitor'].map(obj.dataDict))
+    xHom = np.stack(upcoming['Home'].map(obj.dataDict))
+    x = np.hstack((np.ones((xVis.shape[0],1)),xVis,xHom))
+    obj.probabilityToMoneyLine(obj.sigma(np.dot(x,obj.w)))
+    print('dataDict/np.stack: %.1f million pairs/s' % (10**5/(time.perf_counter() - tic)/1e6))
+
+# run tests
+if __name__ == '__main__':
+    print('Test predict() against stub server')
+    testPredictStub()
+    print('###################################')
+    print('Test date range')
+    testPredictRange()
+    print('###################################')
+    print('Benchmark date range')
+    benchmarkPredictRange()
+    print('###################################')
+    print('Benchmark _extractStats()')
+    benchmarkExtractStats()
+    print('###################################')
+    print('Test probabilityMatrix() and predictPairs()')
+    testProbabilityMatrix()
+    print('###################################')
+    print('Test compiled model')
+    testCompiledModel()
+    print('###################################')
+    print('Test model registry')
+    testModelRegistry()
+    print('###################################')
+    print('Benchmark predictPairs()')
+    benchmarkPredictPairs()
@@ -0,0 +1,210 @@
+import json
+import threading
+import time
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+import BRFetchTools
+from HiFOPredict import HiFOPredict
+
+'''
+HiFOService keeps a HiFOPredict (team stats, W-L records, model) and the season's schedule in
+memory, refreshes them in a background thread, and answers queries over a local HTTP/JSON
+endpoint without any request to basketball-reference:
+
+    GET /predict?date=2021-01-15          predictions for the games of a date
+    GET /matchup?visitor=GSW&home=BRK     prediction for any matchup
+    GET /status                           season, model version, time of the last refresh
+
+Usage:
+    with HiFOService(2022,port=8080) as service:
+        ...  # serve until stopped
+or from the command line: python HiFOService.py 2022 8080
+'''
+
+'''
+ServiceState: everything the queries read, replaced as a whole by each refresh
+    predictor - HiFOPredict
+    schedule - pd DataFrame of the season's games (Date as Timestamp, Start (ET), Visitor, Home)
+    gamesByDate - dict of date ('YYYY-MM-DD') -> list of (visitor code, home code, start time)
+    visWinProbability, visMLO - (visitor x home) matrices of every matchup (see probabilityMatrix)
+    refreshed - time of the refresh (pd Timestamp)
+'''
+ServiceState = namedtuple('ServiceState',['predictor','schedule','gamesByDate','visWinProbability','visMLO',
+                                          'refreshed'])
+
+class HiFOService:
+    '''
+    HiFOService serves HiFOPredict predictions from memory, with the team stats and schedule
+    refreshed every refreshInterval seconds.
+    '''
+    def __init__(self,season,brURL='https://www.basketball-reference.com',refreshInterval=3600.,
+                 host='127.0.0.1',port=0,maxWorkers=8,requestsPerSecond=5.,fetcher=None,registry=None):
+        '''
+        season - second year of current season (e.g. 2022 for 2021-22 season)
+        brURL - base URL of basketball-reference
+        refreshInterval - seconds between refreshes of the stats and schedule (each refresh revalidates
+                          the cached team and schedule pages, whatever their TTL in BRFetchTools.pageTTL)
+        host, port - address of the HTTP endpoint (port 0: any free port, see url)
+        maxWorkers, requestsPerSecond, fetcher, registry - as for HiFOPredict
+        '''
+        self.season = season
+        self.brURL = brURL
+        self.refreshInterval = refreshInterval
+        self.maxWorkers = maxWorkers
+        self.fetcher = fetcher or BRFetchTools.BRFetcher(BRFetchTools.defaultCache(),requestsPerSecond)
+        self.registry = registry
+        self.state = None
+        self._stopping = threading.Event()
+        self._refreshThread = None
+        self._server = ThreadingHTTPServer((host,port),self._makeHandler())
+        self._server.daemon_threads = True
+        self._serverThread = None
+
+    @property
+    def url(self):
+        host,port = self._server.server_address[:2]
+        return 'http://'+host+':'+str(port)
+
+    '''
+    STATE
+    '''
+    def refresh(self,revalidate=True):
+        '''
+        refresh downloads the team stats and schedule (through the fetcher's cache), loads the
+        latest model, and replaces the state used by the queries in a single assignment. With
+        revalidate, the cached team and current schedule pages are revalidated even if their TTL
+        has not run out, so that the state is never older than refreshInterval.
+        '''
+        if revalidate and self.fetcher.cache is not None:
+            schedulePages = self.brURL+'/leagues/NBA_'+str(self.season)+'_games'
+            teamPages = self.brURL+'/teams/'
+            self.fetcher.cache.expire(lambda url : url.startswith(schedulePages) or url.startswith(teamPages))
+        today = pd.to_datetime('today').normalize()
+        predictor = HiFOPredict.withSchedule(self.season,today,brURL=self.brURL,maxWorkers=self.maxWorkers,
+                                             fetcher=self.fetcher,registry=self.registry)
+        schedule = predictor.schedule
+        visitor = predictor.teamCodes(schedule['Visitor'])
+        home = predictor.teamCodes(schedule['Home'])
+        gamesByDate = {}
+        for date,v,h,start in zip(schedule['Date'].dt.strftime('%Y-%m-%d'),visitor,home,schedule['Start (ET)']):
+            gamesByDate.setdefault(date,[]).append((v,h,start))
+        visWinProbability,visMLO = predictor.probabilityMatrix()
+        self.state = ServiceState(predictor,schedule,gamesByDate,visWinProbability,visMLO,pd.Timestamp.now())
+
+    def _refreshLoop(self):
+        while not self._stopping.wait(self.refreshInterval):
+            try:
+                self.refresh()
+            except Exception as e: # keep serving the last good state
+                print('Refresh failed:',repr(e))
+
+    '''
+    QUERIES
+    '''
+    def _prediction(self,state,v,h):
+        return {'Visitor' : state.predictor.teamIndex[v],
+                'Home' : state.predictor.teamIndex[h],
+                'Visitor win probability' : float(state.visWinProbability[v,h]),
+                'Visitor Line' : int(state.visMLO[v,h]),
+                'Home Line' : -int(state.visMLO[v,h])}
+
+    def predictDate(self,date):
+        '''
+        predictDate returns the predictions (list of dicts, as the rows of HiFOPredict.predict)
+        for the games of date (pd Timestamp or 'YYYY-MM-DD').
+        '''
+        state = self.state
+        if not (isinstance(date,str) and date in state.gamesByDate):
+            date = pd.Timestamp(date).strftime('%Y-%m-%d') # ValueError if not a date
+        predictions = []
+        for v,h,start in state.gamesByDate.get(date,[]):
+            prediction = self._prediction(state,v,h)
+            prediction['Date'] = date
+            prediction['Start (ET)'] = start
+            predictions.append(prediction)
+        return predictions
+
+    def matchup(self,visitor,home):
+        '''matchup returns the prediction (dict) for any matchup of team abbreviations'''
+        state = self.state
+        v,h = state.predictor.teamCodes([visitor,home])
+        return self._prediction(state,v,h)
+
+    def status(self):
+        state = self.state
+        return {'season' : self.season,
+                'model version' : state.predictor.modelVersion,
+                'refreshed' : state.refreshed.isoformat(timespec='seconds'),
+                'games' : int(state.schedule.shape[0]),
+                'teamWL' : state.predictor.teamWL.to_dict(orient='records')}
+
+    '''
+    SERVER
+    '''
+    def _makeHandler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self,code,content):
+                body = json.dumps(content).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type','application/json')
+                self.send_header('Content-Length',str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key : values[0] for key,values in parse_qs(url.query).items()}
+                try:
+                    if url.path == '/predict':
+                        self._send(200,service.predictDate(query.get('date',pd.Timestamp.now().strftime('%Y-%m-%d'))))
+                    elif url.path == '/matchup':
+                        self._send(200,service.matchup(query['visitor'],query['home']))
+                    elif url.path == '/status':
+                        self._send(200,service.status())
+                    else:
+                        self._send(404,{'error' : 'unknown path '+url.path})
+                except (KeyError,ValueError) as e: # missing parameter, unknown team, bad date
+                    self._send(400,{'error' : str(e)})
+
+            def log_message(self,*args):
+                pass
+
+        return Handler
+
+    def start(self):
+        '''start loads the state, then serves queries and refreshes in background threads'''
+        if self.state is None:
+            self.refresh(revalidate=False)
+        self._stopping.clear()
+        self._serverThread = threading.Thread(target=self._server.serve_forever,daemon=True)
+        self._serverThread.start()
+        self._refreshThread = threading.Thread(target=self._refreshLoop,daemon=True)
+        self._refreshThread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self,*args):
+        self.stop()
+
+if __name__ == '__main__':
+    import sys
+    season = int(sys.argv[1]) if len(sys.argv) > 1 else 2022
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
+    service = HiFOService(season,port=port).start()
+    print('Serving',season,'predictions at',service.url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        service.stop()
@@ -0,0 +1,99 @@
+import json
+import tempfile
+import time
+from urllib.request import urlopen
+from urllib.error import HTTPError
+import numpy as np
+import pandas as pd
+import BRFetchTools
+import ModelRegistry
+from BRStubServer import BRStubServer
+from HiFOPredict import HiFOPredict
+from HiFOService import HiFOService
+
+'''
+Tests and benchmark of HiFOService, run against BRStubServer.
+'''
+
+def _get(url):
+    try:
+        with urlopen(url) as response:
+            return response.status,json.load(response)
+    except HTTPError as e:
+        return e.code,json.load(e)
+
+def testService():
+    '''
+    testService checks the service's answers against HiFOPredict.predict(), and that a refresh
+    picks up a new model version.
+    '''
+    with BRStubServer() as server, tempfile.TemporaryDirectory() as registryDir:
+        registry = ModelRegistry.ModelRegistry(registryDir)
+        v1 = ModelRegistry.defaultRegistry().load(1)
+        registry.publish(v1.w,v1.statMean,v1.PCABasis,(2002,2021),'2000-01')
+        fetcher = BRFetchTools.BRFetcher(BRFetchTools.ResponseCache(tempfile.mkdtemp()))
+        expected = HiFOPredict(2021,pd.Timestamp('2020-12-22'),brURL=server.url,fetcher=fetcher,
+                               registry=registry).predict()
+        with HiFOService(2021,brURL=server.url,fetcher=fetcher,registry=registry) as service:
+            # test 1: a date's games
+            print('test 1')
+            status,predictions = _get(service.url+'/predict?date=2020-12-22')
+            print('status:',status,'games:',len(predictions)) # expected: 200 2
+            print('same as predict():',[p['Visitor Line'] for p in predictions] == expected['Visitor Line'].tolist()
+                  and np.allclose([p['Visitor win probability'] for p in predictions],
+                                  expected['Visitor win probability'])) # expected: True
+
+            # test 2: any matchup, and bad queries
+            print('test 2')
+            status,prediction = _get(service.url+'/matchup?visitor=GSW&home=NJN')
+            print('matchup:',status,prediction['Visitor Line'] == expected['Visitor Line'][0]) # expected: 200 True
+            print('unknown team:',_get(service.url+'/matchup?visitor=XXX&home=NJN')[0]) # expected: 400
+            print('bad date:',_get(service.url+'/predict?date=tomorrowish')[0]) # expected: 400
+            print('no games:',_get(service.url+'/predict?date=2020-12-24')[1]) # expected: []
+            # the schedule goes past the 'Playoffs' row of the may page
+            print('playoff games:',len(_get(service.url+'/predict?date=2021-05-22')[1])) # expected: 4
+
+            # test 3: a refresh swaps in a new model version; queries need no request to BR
+            print('test 3')
+            w = np.array(v1.w)
+            w[0] = 0.
+            registry.publish(w,v1.statMean,v1.PCABasis,(2002,2021),'2000-01')
+            server.resetCounts()
+            service.refresh()
+            print('model version:',_get(service.url+'/status')[1]['model version']) # expected: 2
+            # each team page is revalidated once (the 2021 schedule pages never expire), and the
+            # schedule is not downloaded a second time for today's games
+            print('revalidated:',server.notModified,'of',len(server.paths),'requests') # expected: revalidated: 60 of 60 requests
+            print('team pages:',len({path for _,path in server.paths if path.startswith('/teams/')})) # expected: 60
+            server.resetCounts()
+            service.predictDate('2021-01-15')
+            service.matchup('LAL','BOS')
+            print('requests to BR:',sum(server.counts.values())) # expected: 0
+
+def benchmarkService(repeat=1000):
+    '''
+    benchmarkService times date and matchup queries, in process and over HTTP, against building a
+    HiFOPredict for the date (with every page already in the fetcher's cache).
+    '''
+    with BRStubServer() as server:
+        fetcher = BRFetchTools.BRFetcher(BRFetchTools.ResponseCache(tempfile.mkdtemp()))
+        with HiFOService(2021,brURL=server.url,fetcher=fetcher) as service:
+            cases = [('predictDate (in process)',lambda : service.predictDate('2021-01-15')),
+                     ('matchup (in process)',lambda : service.matchup('GSW','NJN')),
+                     ('/predict over HTTP',lambda : _get(service.url+'/predict?date=2021-01-15'))]
+            for name,query in cases:
+                tic = time.perf_counter()
+                for _ in range(repeat):
+                    query()
+                print('%s: %.3f ms per query' % (name,1e3*(time.perf_counter() - tic)/repeat))
+            tic = time.perf_counter()
+            HiFOPredict(2021,pd.Timestamp('2021-01-15'),brURL=server.url,fetcher=fetcher).predict()
+            print('HiFOPredict(...).predict() (cached pages): %.1f ms' % (1e3*(time.perf_counter() - tic)))
+
+# run tests
+if __name__ == '__main__':
+    print('Test HiFOService')
+    testService()
+    print('###################################')
+    print('Benchmark HiFOService')
+    benchmarkService()
@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+from scipy.integrate import odeint
+import Franchises
+import Instrumentation
+from StatPCA import StatPCA
+
+'''
+HiFOTraining contains the functions used to train the HiFO logistic regression model (from the
+NBAHiFO_ModelTraining notebook), with the training matrix built by a vectorized gather.
+Game tables come from GameStore.loadGameData, and team stats from pyData/regSeasonData.h5 or
+GameStore.loadTeamStats.
+'''
+
+def _teamTable(teamData):
+    '''returns the team stat table, given a file name or the table itself'''
+    if isinstance(teamData,str):
+        return pd.read_hdf(teamData)
+    return teamData
+
+@Instrumentation.timed('PCA')
+def generatePCAVectors(teamData,seasonToExclude):
+    '''
+    generataPCAVectors creates the PCA vectors for a subset of the team season-average stat data.
+
+    Inputs:
+    teamData - name of the file containing every team's season-average stat data (or that table)
+    seasonToExclude - season to be removed from data set
+
+    Outputs:
+    statMean - mean of each statistical category included in dataset
+    topVectors - top 7 covariance vectors (rows - stat catgory; columns - index in decreasing eigenvalue order),
+                 each with its largest component positive
+    '''
+    # PCA of the seasons other than seasonToExclude (StatPCA: eigh, sign-normalized basis)
+    return StatPCA.fromTeamStats(_teamTable(teamData)).basis(7,exclude=[seasonToExclude])
+
+def _codes(index,column):
+    '''
+    _codes returns the position in index of each entry of column (-1 if absent). For a categorical
+    column only its categories are looked up, and the codes are gathered from them.
+    '''
+    if isinstance(column.dtype,pd.CategoricalDtype):
+        categoryCodes = np.append(index.get_indexer(column.cat.categories.astype(str)),-1)
+        return categoryCodes[column.cat.codes.to_numpy()] # code -1 (missing) picks the appended -1
+    return index.get_indexer(column.astype(str))
+
+def teamRowIndex(dfTeamData):
+    '''
+    teamRowIndex maps each (season,franchise) of the team stat table to its row, once, as integer
+    codes. Teams are franchise ids (see Franchises), so e.g. the CHH rows of 2000-01 match the CHO
+    of the game tables.
+
+    Outputs:
+    seasons - pd Index of the seasons
+    rowTable - (seasons x franchises) int array of the row of each (season,franchise) (-1 if absent)
+    '''
+    season = dfTeamData['Season'].astype(str).to_numpy()
+    franchise = Franchises.index.codes(dfTeamData['Tm'],Franchises.seasonYears(season))
+    seasons = pd.Index(pd.unique(season))
+    rowTable = np.full((len(seasons),len(Franchises.index)),-1,dtype=np.intp)
+    known = franchise >= 0
+    rowTable[seasons.get_indexer(season[known]),franchise[known]] = np.flatnonzero(known)
+    return seasons,rowTable
+
+def gameRows(dataset,dfTeamData):
+    '''
+    gameRows finds the row of the team stat table of each game's visiting and home teams.
+
+    Inputs:
+    dataset - table of matchups (Season, Visitor/Neutral, Home/Neutral), e.g. from GameStore.loadGameData
+    dfTeamData - team stat table (Season, Tm, ...)
+
+    Outputs:
+    visitorRows, homeRows - int arrays of row positions in dfTeamData
+    Raises KeyError if a team has no stats for the season of one of its games.
+    '''
+    seasons,rowTable = teamRowIndex(dfTeamData)
+    seasonCodes = _codes(seasons,dataset['Season'])
+    years = Franchises.seasonYears(dataset['Season'])
+    rows = []
+    for column in ['Visitor/Neutral','Home/Neutral']:
+        franchise = Franchises.index.codes(dataset[column],years)
+        row = np.where((seasonCodes >= 0) & (franchise >= 0),rowTable[seasonCodes,franchise],-1)
+        if (row < 0).any():
+            missing = dataset[row < 0][['Season',column]].drop_duplicates()
+            raise KeyError('No team stats for '+str(list(missing.itertuples(index=False,name=None))))
+        rows.append(row)
+    return rows[0],rows[1]
+
+@Instrumentation.timed('training matrix')
+def buildDesignMatrix(statMean,PCABasis,dataset,teamData,dtype=np.float64):
+    '''
+    buildDesignMatrix builds the training matrix of the logistic model: each team's PCA components
+    are computed once, and gathered for every game's visitor and home team into a single
+    preallocated array.
+
+    Inputs:
+    statMean - mean of each team season average statistical category
+    PCABasis - matrix whose columns are the PCA basis vectors
+    dataset - table (pd.DataFrame) of matchups and game outcomes (Season, Visitor/Neutral,
+              Home/Neutral, VisitorWin), e.g. from GameStore.loadGameData
+    teamData - name of file containing team season average stats (or that table)
+    dtype - np.float64 or np.float32
+
+    Outputs:
+    x - (games x 1+2n) matrix: a column of ones, then the visiting team's n PCA components, then
+        the home team's n PCA components
+    y - outcomes (1.0 if visiting team won; 0 otherwise)
+    x and y are views of one array of shape (games x 2+2n), usable directly by the trainers.
+    '''
+    data = _designArray(statMean,PCABasis,dataset,teamData,dtype)
+    return data[:,:-1],data[:,-1]
+
+def _designArray(statMean,PCABasis,dataset,teamData,dtype):
+    '''the (games x 2+2n) array of buildDesignMatrix: ones, visitor and home components, outcome'''
+    dfTeamData = _teamTable(teamData)
+    teamDataMat = (dfTeamData.loc[:,'FG':'oppPTS']).to_numpy(dtype=float)
+    teamPCA = np.dot(teamDataMat - statMean,PCABasis).astype(dtype) # one row per (season,team)
+    rows = gameRows(dataset,dfTeamData)
+
+    n = dataset.shape[0]
+    nPCA = teamPCA.shape[1]
+    data = np.empty((n,2+2*nPCA),dtype=dtype)
+    data[:,0] = 1.
+    np.take(teamPCA,rows[0],axis=0,out=data[:,1:1+nPCA])
+    np.take(teamPCA,rows[1],axis=0,out=data[:,1+nPCA:1+2*nPCA])
+    data[:,-1] = dataset['VisitorWin'].to_numpy(dtype=bool)
+    return data
+
+@Instrumentation.timed('training matrix')
+def generateInputOutputData(statMean,PCABasis,dataset,teamData,dtype=np.float64):
+    '''
+    generateInputOutputData converts tables of NBA game outcomes into a NumPy matrix giving the PCA components of each
+    team and the outcome of the game as a 1 (visitor win) or 0.
+
+    Inputs:
+    statMean - mean of each team season average statistical category
+    PCABasis - matrix whose columns are the PCA basis vectors
+    dataset - table (pd.DataFrame) of matchups and game outcomes
+    teamData - name of file containing team season average stats (or that table)
+
+    Outputs:
+    trainingData - matrix where each row is one game, and if n is number of PCA basis vectors, then
+                    - first n columns are visiting team's PCA components,
+                    - second n columns are home team's PCA components,
+                    - final column is 1.0 if visiting team won; 0 otherwise.
+    '''
+    return _designArray(statMean,PCABasis,dataset,teamData,dtype)[:,1:] # without the column of ones
+
+def sigma(a):
+    return 1./(1.+np.exp(-a))
+
+def wVel(w,t,x,y):
+    '''
+    wVel evaluates velocity dw/dt = -dE/dw of logistic model, where E is error function.
+
+    Inputs:
+    t - current integration time
+    w - array of current values of logistic model parameters
+    x - matrix of training data predictors. each row is a different data point;
+        assume first column is all ones, remaining columns are values of predictor variables
+    y - array of training data outcomes
+
+    Outputs:
+    -dE/dw - velocity of parameters (-)
+    '''
+    sigmaN = sigma(np.dot(x,w))
+    dEdw = np.dot(x.T,sigmaN-y)
+    return -dEdw
+
+@Instrumentation.timed('train (odeint)')
+def logisticInt(w0,T,x,y):
+    '''
+    logisticInt performs gradient descent (dw/dt = -dE/dw) on the logistic regression model.
+
+    Inputs:
+    w0 - initial set of parameters of the model
+    T - total time to integrate for
+    x - set of predictor data (each row is a different data point, first column is ones)
+    y - set of outcome data
+
+    Outputs:
+    w - final parameters after integration
+    dEdw - gradient of error function at the end of integration
+    Et - value of error function as a function of time
+    tt - time steps
+    '''
+    # perform gradient descent
+    nSteps = 100
+    tt = np.linspace(0,T,nSteps+1)
+    wt = odeint(wVel,w0,tt,(x,y))
+
+    # gather observables
+    w = wt[-1]
+    dEdw = -wVel(w,0,x,y)
+    # calculation of error as function of time
+    sigmaNT = sigma(wt @ x.T)
+    Et = -(np.dot(np.log(sigmaNT),y) + np.dot(np.log(1.-sigmaNT),1.-y))
+
+    return w,dEdw,Et,tt
@@ -0,0 +1,93 @@
+import time
+import numpy as np
+import pandas as pd
+import GameStore
+import GameStoreTests
+import HiFOTraining
+
+'''
+Tests and benchmark of the HiFOTraining matrix builder against the generateInputOutputData of the
+NBAHiFO_ModelTraining notebook.
+'''
+
+def notebookInputOutputData(statMean,PCABasis,dataset,statDataFile):
+    '''generateInputOutputData as written in the notebook (dict lookups of itertuples keys)'''
+    dfTeamData = pd.read_hdf(statDataFile)
+    seasonInts = dfTeamData['Season'].map(lambda x : int(x[0:4]))
+    teamAbbrev = dfTeamData['Tm']
+    dfTeamData.loc[(seasonInts <= 2001) & (teamAbbrev == 'CHH'),'Tm'] = 'CHO'
+    seasonTm = dfTeamData[['Season','Tm']]
+    keys = list(seasonTm.itertuples(index=False,name=None))
+    teamDataMat = (dfTeamData.loc[:,'FG':'oppPTS']).to_numpy()
+    teamPCA = np.dot(teamDataMat - statMean,PCABasis)
+    teamDataDict = dict(zip(keys,teamPCA))
+    x_aKeys = pd.Series(list(dataset[['Season','Visitor/Neutral']].itertuples(index=False,name=None)))
+    x_bKeys = pd.Series(list(dataset[['Season','Home/Neutral']].itertuples(index=False,name=None)))
+    y = (dataset['VisitorWin'].map(float)).to_numpy()
+    x_aPCA = np.stack(x_aKeys.map(teamDataDict))
+    x_bPCA = np.stack(x_bKeys.map(teamDataDict))
+    return np.vstack((x_aPCA.T,x_bPCA.T,y)).T
+
+def testBuildDesignMatrix():
+    '''
+    testBuildDesignMatrix checks that the vectorized builder gives the notebook's training matrix,
+    from the HDF tables and from the GameStore tables (categorical columns).
+    '''
+    statMean,topV = HiFOTraining.generatePCAVectors('pyData/regSeasonData.h5','2000-01')
+    dataset = GameStoreTests.hdfLoadGameData(2001,2021)
+    expected = notebookInputOutputData(statMean,topV,dataset,'pyData/regSeasonData.h5')
+
+    # test 1: HDF tables (includes 2000-01, where the CHH stats match the CHO games)
+    print('test 1')
+    trainingData = HiFOTraining.generateInputOutputData(statMean,topV,dataset,'pyData/regSeasonData.h5')
+    print('same training data:',np.array_equal(trainingData,expected)) # expected: True
+    x,y = HiFOTraining.buildDesignMatrix(statMean,topV,dataset,'pyData/regSeasonData.h5')
+    print('x, y are views of one array:',x.base is y.base and x.base is not None) # expected: True
+    print('column of ones:',(x[:,0] == 1.).all()) # expected: True
+
+    # test 2: GameStore tables, float32
+    print('test 2')
+    x32,y32 = HiFOTraining.buildDesignMatrix(statMean,topV,GameStore.loadGameData(2001,2021),
+                                             GameStore.loadTeamStats(),dtype=np.float32)
+    print('float32:',x32.dtype == np.float32) # expected: True
+    print('same training data:',np.allclose(x32[:,1:],expected[:,:-1],atol=1e-3)
+          and np.array_equal(y32,expected[:,-1])) # expected: True
+
+    # test 3: a team without stats raises KeyError
+    print('test 3')
+    badDataset = dataset.iloc[:3].copy()
+    badDataset.iloc[1,badDataset.columns.get_loc('Home/Neutral')] = 'XXX'
+    try:
+        HiFOTraining.buildDesignMatrix(statMean,topV,badDataset,'pyData/regSeasonData.h5')
+        print('no error raised')
+    except KeyError as e:
+        print('KeyError:',e) # expected: KeyError naming ('2000-01', 'XXX')
+
+def benchmarkBuildDesignMatrix(repeat=5):
+    '''
+    benchmarkBuildDesignMatrix times the notebook's generateInputOutputData and buildDesignMatrix
+    on every season in pyData (the team table is loaded once, outside the timing).
+    '''
+    statMean,topV = HiFOTraining.generatePCAVectors('pyData/regSeasonData.h5','2000-01')
+    dataset = GameStoreTests.hdfLoadGameData(2001,2021)
+    dfTeamData = pd.read_hdf('pyData/regSeasonData.h5')
+    storeDataset = GameStore.loadGameData(2001,2021)
+    storeTeamData = GameStore.loadTeamStats()
+    cases = [('notebook',lambda : notebookInputOutputData(statMean,topV,dataset,'pyData/regSeasonData.h5')),
+             ('buildDesignMatrix',lambda : HiFOTraining.buildDesignMatrix(statMean,topV,dataset,dfTeamData)),
+             ('buildDesignMatrix (GameStore, float32)',
+              lambda : HiFOTraining.buildDesignMatrix(statMean,topV,storeDataset,storeTeamData,np.float32))]
+    print(dataset.shape[0],'games')
+    for name,f in cases:
+        tic = time.perf_counter()
+        for _ in range(repeat):
+            f()
+        print('%s: %.1f ms' % (name,1e3*(time.perf_counter() - tic)/repeat))
+
+# run tests
+if __name__ == '__main__':
+    print('Test buildDesignMatrix()')
+    testBuildDesignMatrix()
+    print('###################################')
+    print('Benchmark buildDesignMatrix()')
+    benchmarkBuildDesignMatrix()
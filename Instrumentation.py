@@ -0,0 +1,209 @@
+import functools
+import json
+import os
+import threading
+import time
+
+'''
+Instrumentation records where the time of a run goes, for the scrape -> parse -> PCA -> predict
+pipeline (BRFetchTools, BRWebscrapeTools, HiFOPredict, and the training helpers of HiFOTraining
+and LogisticTrainer):
+
+    - stages: number of calls, wall time and bytes handled of each named stage (download, parse,
+      PCA projection, predict, training matrix, ...)
+    - URLs: number of fetches, wall time, bytes and outcome (cache, download, error) of each page
+    - counters: HTTP requests sent, revalidations (304), retries, bytes downloaded, cache hits
+      and misses
+
+It is off by default (on if the environment variable HIFO_INSTRUMENT is set to anything but 0).
+When off, stage() returns a shared do-nothing context manager and timed functions call through
+directly, so the instrumented code pays a function call and a flag test. The records are kept
+for the whole process (safe to share between threads) until reset().
+
+Usage:
+    Instrumentation.enable()
+    predictor = HiFOPredict(2022)
+    predictor.predict()
+    print(Instrumentation.toJSON(indent=2))   # or toPrometheus()
+'''
+
+_enabled = os.environ.get('HIFO_INSTRUMENT','0') not in ('','0')
+_lock = threading.Lock()
+_stages = {} # stage -> [calls, seconds, bytes]
+_urls = {} # url -> [fetches, seconds, bytes, {outcome : fetches}]
+_counters = {} # counter -> value
+
+def enable(on=True):
+    '''enable switches the recording on (or off with on=False)'''
+    global _enabled
+    _enabled = on
+
+def disable():
+    enable(False)
+
+def enabled():
+    return _enabled
+
+def reset():
+    '''reset drops everything recorded so far'''
+    with _lock:
+        _stages.clear()
+        _urls.clear()
+        _counters.clear()
+
+'''
+RECORDING
+'''
+class _Stage:
+    '''context manager timing one call of a stage'''
+    __slots__ = ('name','nBytes','_start')
+
+    def __init__(self,name):
+        self.name = name
+        self.nBytes = 0
+
+    def addBytes(self,nBytes):
+        '''addBytes counts bytes handled by this call of the stage (e.g. the size of a parsed page)'''
+        self.nBytes += nBytes
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self,*exc):
+        elapsed = time.perf_counter() - self._start
+        with _lock:
+            record = _stages.setdefault(self.name,[0,0.,0])
+            record[0] += 1
+            record[1] += elapsed
+            record[2] += self.nBytes
+        return False
+
+class _NullStage:
+    '''what stage() returns when recording is off'''
+    __slots__ = ()
+
+    def addBytes(self,nBytes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        return False
+
+_nullStage = _NullStage()
+
+def stage(name):
+    '''
+    stage returns a context manager timing the code it encloses as one call of stage name.
+
+    Usage:
+        with Instrumentation.stage('parse schedule') as s:
+            s.addBytes(len(html))
+            table = BRTableParser.parseScheduleTable(html)
+    '''
+    return _Stage(name) if _enabled else _nullStage
+
+def timed(name):
+    '''timed is a decorator timing every call of a function as one call of stage name'''
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args,**kwargs):
+            if not _enabled:
+                return function(*args,**kwargs)
+            with _Stage(name):
+                return function(*args,**kwargs)
+        return wrapper
+    return decorate
+
+def count(name,value=1):
+    '''count adds value to counter name'''
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name,0) + value
+
+def recordFetch(url,seconds,nBytes,outcome):
+    '''
+    recordFetch records one fetch of url (see BRFetchTools.BRFetcher.fetch).
+
+    Inputs:
+    seconds - wall time of the fetch (cache lookup, rate limit wait, request)
+    nBytes - size of the page (0 if the fetch failed)
+    outcome - 'cache' (served from the cache, fresh or revalidated), 'download' or 'error'
+    '''
+    if not _enabled:
+        return
+    with _lock:
+        record = _urls.get(url)
+        if record is None:
+            record = _urls[url] = [0,0.,0,{}]
+        record[0] += 1
+        record[1] += seconds
+        record[2] += nBytes
+        record[3][outcome] = record[3].get(outcome,0) + 1
+        key = 'cache hits' if outcome == 'cache' else 'cache misses'
+        _counters[key] = _counters.get(key,0) + 1
+
+'''
+EXPORT
+'''
+def report():
+    '''
+    report returns everything recorded as a dict (JSON-serializable):
+        stages - stage -> {calls, seconds, bytes}
+        urls - url -> {fetches, seconds, bytes, outcomes}
+        counters - counter -> value
+        cacheHitRate - fraction of the fetches served from the cache (None if no fetch)
+    '''
+    with _lock:
+        stages = {name : {'calls' : calls,'seconds' : seconds,'bytes' : nBytes}
+                  for name,(calls,seconds,nBytes) in _stages.items()}
+        urls = {url : {'fetches' : fetches,'seconds' : seconds,'bytes' : nBytes,'outcomes' : dict(outcomes)}
+                for url,(fetches,seconds,nBytes,outcomes) in _urls.items()}
+        counters = dict(_counters)
+    fetches = counters.get('cache hits',0) + counters.get('cache misses',0)
+    return {'stages' : stages,
+            'urls' : urls,
+            'counters' : counters,
+            'cacheHitRate' : counters.get('cache hits',0)/fetches if fetches else None}
+
+def toJSON(indent=None):
+    '''toJSON returns report() as a JSON string'''
+    return json.dumps(report(),indent=indent)
+
+def _metricName(name):
+    return ''.join(c if c.isalnum() else '_' for c in name.lower())
+
+def _label(value):
+    return '"' + str(value).replace('\\','\\\\').replace('"','\\"').replace('\n','\\n') + '"'
+
+def toPrometheus(prefix='hifo'):
+    '''
+    toPrometheus returns report() in the Prometheus text exposition format: per-stage and per-URL
+    counters with stage and url labels, one counter per entry of counters, and the cache hit rate.
+    '''
+    result = report()
+    lines = []
+    def metric(name,kind,helpText,samples):
+        lines.append('# HELP '+prefix+'_'+name+' '+helpText)
+        lines.append('# TYPE '+prefix+'_'+name+' '+kind)
+        for labels,value in samples:
+            labelText = '{'+','.join(key+'='+_label(v) for key,v in labels.items())+'}' if labels else ''
+            lines.append(prefix+'_'+name+labelText+' '+repr(float(value)))
+
+    stages = result['stages']
+    metric('stage_calls_total','counter','Calls of each stage.',[({'stage' : s},r['calls']) for s,r in stages.items()])
+    metric('stage_seconds_total','counter','Wall time spent in each stage.',
+           [({'stage' : s},r['seconds']) for s,r in stages.items()])
+    metric('stage_bytes_total','counter','Bytes handled by each stage.',[({'stage' : s},r['bytes']) for s,r in stages.items()])
+    urls = result['urls']
+    metric('url_fetches_total','counter','Fetches of each URL, by outcome.',
+           [({'url' : u,'outcome' : o},n) for u,r in urls.items() for o,n in r['outcomes'].items()])
+    metric('url_seconds_total','counter','Wall time spent fetching each URL.',[({'url' : u},r['seconds']) for u,r in urls.items()])
+    metric('url_bytes_total','counter','Bytes of each URL fetched.',[({'url' : u},r['bytes']) for u,r in urls.items()])
+    for name,value in result['counters'].items():
+        metric(_metricName(name)+'_total','counter',name[0].upper()+name[1:]+'.',[({},value)])
+    if result['cacheHitRate'] is not None:
+        metric('cache_hit_ratio','gauge','Fraction of the fetches served from the cache.',[({},result['cacheHitRate'])])
+    return '\n'.join(lines)+'\n'
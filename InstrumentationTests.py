@@ -0,0 +1,135 @@
+import json
+import tempfile
+import time
+import pandas as pd
+import BRFetchTools
+import GameStore
+import HiFOTraining
+import Instrumentation
+import LogisticTrainer
+from BRStubServer import BRStubServer
+from HiFOPredict import HiFOPredict
+
+'''
+Tests and benchmark of Instrumentation, on HiFOPredict runs against BRStubServer and on the
+training helpers.
+'''
+
+def testInstrumentation():
+    '''
+    testInstrumentation checks the stages, URLs and counters recorded for HiFOPredict runs (with a
+    cold and then a warm cache), for the training helpers, the exports, and that nothing is
+    recorded while disabled.
+    '''
+    date = pd.Timestamp('2020-12-22')
+    with BRStubServer() as server, tempfile.TemporaryDirectory() as cacheDir:
+        # test 1: nothing recorded while disabled
+        print('test 1')
+        Instrumentation.disable()
+        Instrumentation.reset()
+        fetcher = BRFetchTools.BRFetcher(BRFetchTools.ResponseCache(cacheDir))
+        HiFOPredict(2021,date,brURL=server.url,fetcher=fetcher).predict()
+        print('empty:',Instrumentation.report() == {'stages' : {},'urls' : {},'counters' : {},'cacheHitRate' : None}) # expected: True
+
+        # test 2: cold then warm cache
+        print('test 2')
+        Instrumentation.enable()
+        HiFOPredict(2021,date,brURL=server.url,fetcher=BRFetchTools.BRFetcher(BRFetchTools.ResponseCache(cacheDir,ttl=lambda url : 0)))
+        cold = Instrumentation.report()
+        print('revalidated:',cold['counters']['requests'],cold['counters']['revalidations'],cold['cacheHitRate']) # expected: 61 61 1.0
+        Instrumentation.reset()
+        server.counts = {}
+        predictor = HiFOPredict(2021,date,brURL=server.url,fetcher=fetcher)
+        predictor.predict()
+        warm = Instrumentation.report()
+        print('cache hits:',warm['counters'].get('cache hits'),'requests:',warm['counters'].get('requests',0),
+              server.counts.get('GET',0)) # expected: 61 0 0
+        print('stages:',sorted(warm['stages'])) # expected: ['PCA projection', 'download schedule', 'download team pages', 'parse schedule', 'parse team pages', 'predict']
+        print('parse calls:',warm['stages']['parse team pages']['calls'],
+              'bytes:',warm['stages']['parse team pages']['bytes'] == sum(r['bytes'] for url,r in warm['urls'].items()
+                                                                           if '/teams/' in url)) # expected: 60 True
+        print('URLs:',len(warm['urls']),all(r['outcomes'] == {'cache' : 1} for r in warm['urls'].values())) # expected: 61 True
+
+        # test 3: downloads and errors
+        print('test 3')
+        Instrumentation.reset()
+        noCache = BRFetchTools.BRFetcher()
+        noCache.fetch(server.url+'/leagues/NBA_2021_games-january.html')
+        noCache.fetch(server.url+'/leagues/NBA_202_games.html')
+        counters = Instrumentation.report()['counters']
+        outcomes = [r['outcomes'] for r in Instrumentation.report()['urls'].values()]
+        print('outcomes:',outcomes,counters['requests'],counters['cache misses'],counters['bytes downloaded'] > 0) # expected: [{'download': 1}, {'error': 1}] 2 2 True
+
+    # test 4: training helpers
+    print('test 4')
+    Instrumentation.reset()
+    dfTeamData = GameStore.loadTeamStats()
+    statMean,PCABasis = HiFOTraining.generatePCAVectors(dfTeamData,'2000-01')
+    x,y = HiFOTraining.buildDesignMatrix(statMean,PCABasis,GameStore.loadGameData(2002,2021),dfTeamData)
+    LogisticTrainer.trainNewton(x,y)
+    print('stages:',sorted(Instrumentation.report()['stages'])) # expected: ['PCA', 'train (Newton)', 'training matrix']
+
+    # test 5: exports
+    print('test 5')
+    print('JSON:',json.loads(Instrumentation.toJSON()) == Instrumentation.report()) # expected: True
+    Instrumentation.count('odd "name"\\')
+    text = Instrumentation.toPrometheus()
+    samples = [line for line in text.splitlines() if not line.startswith('#')]
+    print('Prometheus:','hifo_stage_seconds_total{stage="PCA"}' in text,
+          all(len(line.rsplit(' ',1)) == 2 and float(line.rsplit(' ',1)[1]) >= 0 for line in samples),
+          'hifo_odd__name___total 1.0' in text) # expected: True True True
+    Instrumentation.disable()
+    Instrumentation.reset()
+
+def benchmarkInstrumentation(n=200000):
+    '''
+    benchmarkInstrumentation times a stage, a timed function and a counter when disabled and
+    enabled, and a HiFOPredict run from a warm cache with and without instrumentation.
+    '''
+    def bare():
+        pass
+    timedFunction = Instrumentation.timed('benchmark')(bare)
+    for on in [False,True]:
+        Instrumentation.enable(on)
+        tic = time.perf_counter()
+        for _ in range(n):
+            bare()
+        tBare = time.perf_counter() - tic
+        tic = time.perf_counter()
+        for _ in range(n):
+            with Instrumentation.stage('benchmark'):
+                pass
+        tStage = time.perf_counter() - tic
+        tic = time.perf_counter()
+        for _ in range(n):
+            timedFunction()
+        tTimed = time.perf_counter() - tic
+        tic = time.perf_counter()
+        for _ in range(n):
+            Instrumentation.count('benchmark')
+        tCount = time.perf_counter() - tic
+        print('%s: bare call %.0f ns, stage %.0f ns, timed call %.0f ns, count %.0f ns' %
+              ('enabled' if on else 'disabled',1e9*tBare/n,1e9*tStage/n,1e9*tTimed/n,1e9*tCount/n))
+
+    date = pd.Timestamp('2020-12-22')
+    with BRStubServer() as server, tempfile.TemporaryDirectory() as cacheDir:
+        fetcher = BRFetchTools.BRFetcher(BRFetchTools.ResponseCache(cacheDir))
+        HiFOPredict(2021,date,brURL=server.url,fetcher=fetcher) # fill the cache
+        for on in [False,True,False,True]:
+            Instrumentation.enable(on)
+            Instrumentation.reset()
+            tic = time.perf_counter()
+            HiFOPredict(2021,date,brURL=server.url,fetcher=fetcher).predict()
+            print('HiFOPredict from the cache, %s: %.1f ms' % ('enabled' if on else 'disabled',
+                                                              1e3*(time.perf_counter() - tic)))
+    print(Instrumentation.toPrometheus()[:1500])
+    Instrumentation.disable()
+    Instrumentation.reset()
+
+# run tests
+if __name__ == '__main__':
+    print('Test instrumentation')
+    testInstrumentation()
+    print('###################################')
+    print('Benchmark instrumentation')
+    benchmarkInstrumentation()
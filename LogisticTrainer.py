@@ -0,0 +1,132 @@
+import numpy as np
+from scipy.optimize import minimize
+from scipy.special import expit
+import Instrumentation
+
+'''
+LogisticTrainer fits the HiFO logistic regression model (same error function E as
+HiFOTraining.logisticInt) by minimizing E directly instead of integrating the gradient flow:
+
+    trainNewton     - Newton's method (iteratively reweighted least squares), a few passes over the data
+    trainLBFGS      - L-BFGS (scipy.optimize), gradient only
+    trainStreaming  - Newton's method with the data read in mini-batches, for game sets that do not
+                      fit in memory (e.g. memory-mapped arrays); same weights as trainNewton
+
+Every trainer stops once the gradient norm, per game, is below gtol.
+x is the training matrix (each row a game, first column ones, as from
+HiFOTraining.buildDesignMatrix) and y the outcomes (1.0 if the visiting team won).
+'''
+
+def errorFunction(w,x,y):
+    '''
+    errorFunction evaluates the error function of the logistic model and its gradient.
+
+    Outputs:
+    E - -sum(y log(sigma) + (1-y) log(1-sigma)), evaluated without overflow
+    dEdw - gradient of E
+    '''
+    a = np.dot(x,w.astype(x.dtype,copy=False))
+    E = np.sum(np.logaddexp(0.,a) - y*a,dtype=np.float64)
+    dEdw = np.dot(x.T,(expit(a) - y).astype(x.dtype,copy=False)).astype(np.float64)
+    return E,dEdw
+
+def _newtonTerms(w,x,y):
+    '''error, gradient and Hessian of E for the games in x'''
+    a = np.dot(x,w.astype(x.dtype,copy=False))
+    s = expit(a)
+    E = np.sum(np.logaddexp(0.,a) - y*a,dtype=np.float64)
+    dEdw = np.dot(x.T,(s - y).astype(x.dtype,copy=False)).astype(np.float64)
+    H = np.dot(x.T,x*(s*(1.-s)).astype(x.dtype,copy=False)[:,None]).astype(np.float64)
+    return E,dEdw,H
+
+def _newton(terms,w0,nGames,gtol,maxIter):
+    '''Newton iterations on E, with the error, gradient and Hessian evaluated by terms(w)'''
+    w = np.array(w0,dtype=np.float64)
+    Et = []
+    for _ in range(maxIter):
+        E,dEdw,H = terms(w)
+        Et.append(E)
+        if np.linalg.norm(dEdw)/nGames < gtol:
+            break
+        w = w - np.linalg.solve(H,dEdw)
+    else:
+        E,dEdw,H = terms(w)
+        Et.append(E)
+    return w,dEdw,np.array(Et)
+
+@Instrumentation.timed('train (Newton)')
+def trainNewton(x,y,w0=None,gtol=1e-8,maxIter=50):
+    '''
+    trainNewton minimizes the error function of the logistic model with Newton's method.
+
+    Inputs:
+    x - set of predictor data (each row is a different data point, first column is ones)
+    y - set of outcome data
+    w0 - initial set of parameters of the model (default: zeros)
+    gtol - stop once |dE/dw| / (number of games) < gtol
+    maxIter - maximum number of Newton steps
+
+    Outputs:
+    w - final parameters
+    dEdw - gradient of error function at w
+    Et - value of error function at each iteration
+    '''
+    w0 = np.zeros(x.shape[1]) if w0 is None else w0
+    return _newton(lambda w : _newtonTerms(w,x,y),w0,x.shape[0],gtol,maxIter)
+
+@Instrumentation.timed('train (L-BFGS)')
+def trainLBFGS(x,y,w0=None,gtol=1e-8,maxIter=500):
+    '''
+    trainLBFGS minimizes the error function of the logistic model with L-BFGS.
+
+    Inputs and outputs as for trainNewton (maxIter - maximum number of L-BFGS iterations).
+    '''
+    w0 = np.zeros(x.shape[1]) if w0 is None else w0
+    n = x.shape[0]
+    Et = []
+    def meanError(w):
+        # E/n, so that the gradient tolerance is per game
+        E,dEdw = errorFunction(w,x,y)
+        Et.append(E)
+        return E/n,dEdw/n
+    result = minimize(meanError,np.array(w0,dtype=np.float64),jac=True,method='L-BFGS-B',
+                      options={'gtol' : gtol,'maxiter' : maxIter})
+    E,dEdw = errorFunction(result.x,x,y)
+    return result.x,dEdw,np.array(Et)
+
+def batches(x,y,batchSize=65536):
+    '''
+    batches returns a function giving an iterator over (x,y) mini-batches of batchSize games,
+    for trainStreaming. Slices of memory-mapped arrays are read from disk one batch at a time.
+    '''
+    def batchIterator():
+        for start in range(0,x.shape[0],batchSize):
+            yield x[start:start+batchSize],y[start:start+batchSize]
+    return batchIterator
+
+@Instrumentation.timed('train (streaming)')
+def trainStreaming(batchIterator,w0,gtol=1e-8,maxIter=50):
+    '''
+    trainStreaming minimizes the error function of the logistic model with Newton's method, with
+    the error, gradient and Hessian summed over mini-batches, so that only one batch of games is
+    in memory at a time.
+
+    Inputs:
+    batchIterator - function returning an iterator over (x,y) mini-batches (e.g. from batches()),
+                    called once per Newton step
+    w0 - initial set of parameters of the model (its length sets the number of parameters)
+    gtol, maxIter - as for trainNewton
+
+    Outputs:
+    w, dEdw, Et - as for trainNewton
+    '''
+    nGames = sum(xBatch.shape[0] for xBatch,yBatch in batchIterator())
+    def terms(w):
+        E,dEdw,H = 0.,np.zeros(len(w)),np.zeros((len(w),len(w)))
+        for xBatch,yBatch in batchIterator():
+            EBatch,dEdwBatch,HBatch = _newtonTerms(w,xBatch,yBatch)
+            E += EBatch
+            dEdw += dEdwBatch
+            H += HBatch
+        return E,dEdw,H
+    return _newton(terms,w0,nGames,gtol,maxIter)
@@ -0,0 +1,70 @@
+import time
+import tracemalloc
+import numpy as np
+import GameStoreTests
+import HiFOTraining
+import LogisticTrainer
+
+'''
+Tests and benchmark of LogisticTrainer against HiFOTraining.logisticInt (the odeint gradient flow
+of the notebooks), on the training data of NBAHiFO_ModelTraining.ipynb (2001-02 to 2020-21).
+'''
+
+def trainingMatrix(dtype=np.float64):
+    statMean,topV = HiFOTraining.generatePCAVectors('pyData/regSeasonData.h5','2000-01')
+    dataset = GameStoreTests.hdfLoadGameData(2002,2021)
+    return HiFOTraining.buildDesignMatrix(statMean,topV,dataset,'pyData/regSeasonData.h5',dtype)
+
+def testTrainers():
+    '''
+    testTrainers checks that every trainer reaches the weights of logisticInt(w0,1,x,y).
+    '''
+    x,y = trainingMatrix()
+    w0 = np.zeros(x.shape[1])
+    wInt,dEdwInt,EtInt,tt = HiFOTraining.logisticInt(w0,1,x,y)
+    cases = [('trainNewton',lambda : LogisticTrainer.trainNewton(x,y)),
+             ('trainLBFGS',lambda : LogisticTrainer.trainLBFGS(x,y)),
+             ('trainStreaming',lambda : LogisticTrainer.trainStreaming(LogisticTrainer.batches(x,y,4096),w0))]
+    for name,train in cases:
+        w,dEdw,Et = train()
+        print(name,'same weights:',np.allclose(w,wInt,rtol=1e-4,atol=1e-4)) # expected: True
+        print(name,'same error:',np.isclose(Et[-1],EtInt[-1],rtol=1e-8)) # expected: True
+    x32,y32 = trainingMatrix(np.float32)
+    w,dEdw,Et = LogisticTrainer.trainNewton(x32,y32,gtol=1e-6)
+    print('trainNewton (float32) same weights:',np.allclose(w,wInt,rtol=1e-4,atol=1e-4)) # expected: True
+
+def _measure(train):
+    tracemalloc.start()
+    tic = time.perf_counter()
+    w = train()[0]
+    elapsed = time.perf_counter() - tic
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return w,elapsed,peak
+
+def benchmarkTrainers():
+    '''
+    benchmarkTrainers measures the time and peak memory allocated by each trainer.
+    '''
+    x,y = trainingMatrix()
+    w0 = np.zeros(x.shape[1])
+    print(x.shape[0],'games,',x.nbytes/1e6,'MB training matrix')
+    cases = [('logisticInt',lambda : HiFOTraining.logisticInt(w0,1,x,y)),
+             ('trainNewton',lambda : LogisticTrainer.trainNewton(x,y)),
+             ('trainLBFGS',lambda : LogisticTrainer.trainLBFGS(x,y)),
+             ('trainStreaming (4096 games per batch)',
+              lambda : LogisticTrainer.trainStreaming(LogisticTrainer.batches(x,y,4096),w0))]
+    wInt = None
+    for name,train in cases:
+        w,elapsed,peak = _measure(train)
+        wInt = w if wInt is None else wInt
+        print('%s: %.0f ms, peak memory %.1f MB, max |w - w(logisticInt)| = %.1e'
+              % (name,1e3*elapsed,peak/1e6,np.abs(w - wInt).max()))
+
+# run tests
+if __name__ == '__main__':
+    print('Test trainers')
+    testTrainers()
+    print('###################################')
+    print('Benchmark trainers')
+    benchmarkTrainers()
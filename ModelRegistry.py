@@ -0,0 +1,122 @@
+import datetime
+import json
+import os
+import shutil
+import threading
+from collections import namedtuple
+import numpy as np
+from HiFOModel import CompiledModel
+
+'''
+ModelRegistry stores trained HiFO models as versioned artifacts:
+
+    models/v001/w.npy               logistic regression coefficients
+    models/v001/statMean.npy        mean of each statistical category
+    models/v001/PCABasis.npy        PCA basis (columns)
+    models/v001/visitorWeights.npy  compiled model (see HiFOModel.CompiledModel)
+    models/v001/homeWeights.npy
+    models/v001/metadata.json       version, training seasons, excluded season, bias, ...
+
+A version is written to a temporary directory and renamed into place, so a reader never sees a
+partial version, and is never modified afterwards. Arrays are memory-mapped when loaded.
+'''
+
+# the models directory of this repository, whatever the working directory (cron jobs, functions)
+defaultRegistryDir = os.path.join(os.path.dirname(os.path.abspath(__file__)),'models')
+
+'''
+ModelVersion: parameters of one version of the model
+    version - version number (int)
+    w, statMean, PCABasis - model parameters (read-only memory-mapped arrays)
+    compiled - HiFOModel.CompiledModel of the parameters
+    metadata - dict from metadata.json
+'''
+ModelVersion = namedtuple('ModelVersion',['version','w','statMean','PCABasis','compiled','metadata'])
+
+class ModelRegistry:
+    '''
+    ModelRegistry publishes and loads model versions in registryDir. Loaded versions are kept, so
+    that several models (e.g. for A/B tests) share one copy each. Safe to share between threads.
+    '''
+    def __init__(self,registryDir=defaultRegistryDir):
+        self.registryDir = registryDir
+        self._lock = threading.Lock()
+        self._loaded = {}
+
+    def _versionDir(self,version):
+        return os.path.join(self.registryDir,'v%03d' % version)
+
+    def versions(self):
+        '''versions returns the sorted list of published versions'''
+        if not os.path.isdir(self.registryDir):
+            return []
+        return sorted(int(d[1:]) for d in os.listdir(self.registryDir) if d.startswith('v') and d[1:].isdigit())
+
+    def latest(self):
+        '''latest returns the newest version number (None if nothing is published)'''
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def publish(self,w,statMean,PCABasis,trainingSeasons,excludedSeason,**metadata):
+        '''
+        publish writes a new version of the model.
+
+        Inputs:
+        w - logistic regression coefficients
+        statMean - mean of each statistical category
+        PCABasis - matrix whose columns are the PCA basis vectors
+        trainingSeasons - (first,last) seasons of the training games (second year of season)
+        excludedSeason - season excluded from the PCA (e.g. '2000-01')
+        metadata - any other entries for metadata.json (e.g. notes)
+
+        Outputs:
+        version - the new version number
+        '''
+        os.makedirs(self.registryDir,exist_ok=True)
+        compiled = CompiledModel.fromParameters(np.asarray(w),np.asarray(statMean),np.asarray(PCABasis))
+        with self._lock:
+            version = (self.latest() or 0) + 1
+            tmpDir = self._versionDir(version)+'.tmp'
+            shutil.rmtree(tmpDir,ignore_errors=True)
+            os.makedirs(tmpDir)
+            for name,array in [('w',w),('statMean',statMean),('PCABasis',PCABasis),
+                               ('visitorWeights',compiled.visitorWeights),('homeWeights',compiled.homeWeights)]:
+                np.save(os.path.join(tmpDir,name+'.npy'),np.asarray(array,dtype=np.float64))
+            metadata = dict(metadata,version=version,trainingSeasons=list(trainingSeasons),
+                            excludedSeason=excludedSeason,nPCA=int(np.shape(PCABasis)[1]),bias=compiled.bias,
+                            created=datetime.datetime.now().isoformat(timespec='seconds'))
+            with open(os.path.join(tmpDir,'metadata.json'),'w') as f:
+                json.dump(metadata,f,indent=1)
+            os.rename(tmpDir,self._versionDir(version))
+        return version
+
+    def load(self,version=None):
+        '''
+        load returns the ModelVersion of version (default: the latest), reading it from disk only
+        the first time.
+        '''
+        version = self.latest() if version is None else version
+        if version is None:
+            raise FileNotFoundError('No model published in '+self.registryDir)
+        with self._lock:
+            if version not in self._loaded:
+                versionDir = self._versionDir(version)
+                if not os.path.isdir(versionDir):
+                    raise FileNotFoundError('No model version '+str(version)+' in '+self.registryDir)
+                arrays = {name : np.load(os.path.join(versionDir,name+'.npy'),mmap_mode='r')
+                          for name in ['w','statMean','PCABasis','visitorWeights','homeWeights']}
+                with open(os.path.join(versionDir,'metadata.json')) as f:
+                    metadata = json.load(f)
+                compiled = CompiledModel(arrays['visitorWeights'],arrays['homeWeights'],metadata['bias'])
+                self._loaded[version] = ModelVersion(version,arrays['w'],arrays['statMean'],arrays['PCABasis'],
+                                                     compiled,metadata)
+            return self._loaded[version]
+
+_defaultRegistry = None
+
+def defaultRegistry():
+    '''defaultRegistry returns the registry in defaultRegistryDir'''
+    global _defaultRegistry
+    if _defaultRegistry is None:
+        _defaultRegistry = ModelRegistry()
+    return _defaultRegistry
@@ -0,0 +1,265 @@
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import Franchises
+from RollingStats import sideColumns, statColumns
+
+'''
+RegSeasonLoader builds pyData/regSeasonData.h5 from the regSeasonData csv files (the code of
+loadSeasonData.ipynb as a library):
+
+    dfTeamData,rebuilt = RegSeasonLoader.rebuildSeasonData()
+
+regSeasonData holds two files per team, named after the team's current abbreviation: <team>o.csv
+(the team's per-game stats of every season) and <team>d.csv (its opponents'). The files are read
+in parallel, then the files of each side are parsed together in a single pd.read_csv with explicit
+dtypes (Season, Tm and 'FG' to 'PTS' only), the seasons filtered and the two sides merged on
+(team,Season,Tm) as whole columns, and the result checked against the 44-column schema of
+regSeasonData.h5 (Season, Tm, then 'FG' to 'oppPTS' as float64).
+
+A manifest next to the h5 file records the modification time, size and sha256 of every csv file
+it was built from. A rebuild parses only the teams whose files changed (or appeared), and takes
+the rows of the other teams from the existing h5 file, matched by franchise (see Franchises).
+'''
+
+defaultDataDir = 'regSeasonData'
+defaultOutFile = 'pyData/regSeasonData.h5'
+minSeason = 2000 # shorthand for 2000-01, the earliest season kept
+labels = ['o','d'] # team (offense) and opponent (defense) files
+
+# columns read from each csv file, and their types
+csvColumns = ['Season','Tm'] + sideColumns
+csvTypes = dict({'Season' : object,'Tm' : object},**{c : np.float64 for c in sideColumns})
+
+def manifestFile(outFile):
+    '''manifestFile returns the path of the manifest of an h5 file'''
+    return os.path.splitext(outFile)[0] + '.manifest.json'
+
+def teamFiles(dataDir=defaultDataDir):
+    '''
+    teamFiles returns {team label : {'o' : path,'d' : path}} of the csv files in dataDir, in the
+    order of the labels. Raises ValueError if a team is missing one of its two files.
+    '''
+    files = {}
+    for fileName in sorted(os.listdir(dataDir)):
+        team,label = fileName[:-5],fileName[-5:-4]
+        if fileName.endswith('.csv') and label in labels:
+            files.setdefault(team,{})[label] = os.path.join(dataDir,fileName)
+    incomplete = [team for team,paths in files.items() if len(paths) != len(labels)]
+    if incomplete:
+        raise ValueError('Teams missing an o or d file in '+dataDir+': '+str(incomplete))
+    return files
+
+def _readFile(path):
+    '''returns (contents,sha256) of a file'''
+    with open(path,'rb') as f:
+        contents = f.read()
+    return contents,hashlib.sha256(contents).hexdigest()
+
+'''
+PARSING
+'''
+def parseSide(contents,label,minSeason=minSeason):
+    '''
+    parseSide parses the csv files of one side (label 'o' or 'd') of several teams together: the
+    files that share their header (normally all of them) are parsed as one by a single pd.read_csv.
+
+    Inputs:
+    contents - {team label : contents (bytes) of the team's file}
+    label - 'o', or 'd' (stat columns prefixed with 'opp')
+    minSeason - first year of the earliest season kept
+
+    Outputs:
+    DataFrame with columns team (label of the file), Season, Tm and the 21 stats of the side,
+    the files' rows in order.
+    '''
+    batches = {} # header -> (teams,rows of each team)
+    for team,content in contents.items():
+        lines = [line for line in content.splitlines() if line.strip()]
+        teams,bodies = batches.setdefault(lines[0],([],[]))
+        teams.append(team)
+        bodies.append(lines[1:])
+    dfList = []
+    for header,(teams,bodies) in batches.items():
+        try:
+            df = pd.read_csv(io.BytesIO(b'\n'.join([header] + [line for body in bodies for line in body])),
+                             usecols=csvColumns,dtype=csvTypes)
+        except ValueError as e: # missing columns, or text in a stat column
+            raise ValueError(str([team+label+'.csv' for team in teams])+': '+str(e)) from e
+        df.insert(0,'team',np.repeat(np.array(teams,dtype=object),[len(body) for body in bodies]))
+        dfList.append(df)
+    df = pd.concat(dfList,ignore_index=True)
+    if len(dfList) > 1: # back into the order of the teams
+        order = {team : i for i,team in enumerate(contents)}
+        df = df.iloc[np.argsort(df['team'].map(order).to_numpy(),kind='stable')]
+    df = df[df['Season'].str[:4].astype(np.int64).to_numpy() >= minSeason]
+    if label == 'd':
+        df = df.rename(columns={c : 'opp'+c for c in sideColumns})
+    return df
+
+def mergeSides(offense,defense):
+    '''
+    mergeSides merges the two sides (see parseSide) on (team,Season,Tm), keeping the order of the
+    offense rows. Raises ValueError if a season appears twice, or on only one side.
+    '''
+    keys = ['team','Season','Tm']
+    for df,label in zip([offense,defense],labels):
+        duplicated = df.duplicated(keys)
+        if duplicated.any():
+            raise ValueError('Duplicate seasons in '+str(sorted(set(df.loc[duplicated,'team']+label))))
+    dfMerged = pd.merge(offense,defense,on=keys)
+    if len(dfMerged) != len(offense) or len(dfMerged) != len(defense):
+        unmatched = pd.merge(offense[keys],defense[keys],how='outer',indicator=True)
+        unmatched = unmatched[unmatched['_merge'] != 'both']
+        raise ValueError('Seasons not in both files: '+str(list(zip(unmatched['team'],unmatched['Season']))))
+    return dfMerged
+
+def validateSeasonData(dfTeamData):
+    '''
+    validateSeasonData raises ValueError unless dfTeamData has the schema of regSeasonData.h5:
+    columns Season, Tm and 'FG' to 'oppPTS' (float64), one row per (Season,Tm).
+    '''
+    columns = ['Season','Tm'] + statColumns
+    if list(dfTeamData.columns) != columns:
+        missing = [c for c in columns if c not in dfTeamData.columns]
+        extra = [c for c in dfTeamData.columns if c not in columns]
+        raise ValueError('Bad regSeasonData columns: missing '+str(missing)+', unexpected '+str(extra))
+    notFloat = [c for c in statColumns if dfTeamData[c].dtype != np.float64]
+    if notFloat:
+        raise ValueError('Non-float64 regSeasonData columns: '+str(notFloat))
+    if dfTeamData.duplicated(['Season','Tm']).any():
+        raise ValueError('Duplicate (Season,Tm) rows in regSeasonData')
+
+def loadTeamFiles(files,minSeason=minSeason,maxWorkers=8,contents=None):
+    '''
+    loadTeamFiles reads the files of several teams in parallel and parses them.
+
+    Inputs:
+    files - {team label : {'o' : path,'d' : path}} (see teamFiles)
+    minSeason - first year of the earliest season kept
+    maxWorkers - number of files read simultaneously
+    contents - {path : contents} of files already read
+
+    Outputs:
+    DataFrame with columns team, Season, Tm and 'FG' to 'oppPTS', the teams in the order of files
+    '''
+    contents = dict(contents or {})
+    missing = [path for paths in files.values() for path in paths.values() if path not in contents]
+    with ThreadPoolExecutor(max_workers=maxWorkers) as pool:
+        contents.update(zip(missing,(c for c,_ in pool.map(_readFile,missing))))
+    offense,defense = (parseSide({team : contents[paths[label]] for team,paths in files.items()},label,minSeason)
+                       for label in labels)
+    return mergeSides(offense,defense)
+
+'''
+INCREMENTAL REBUILD
+'''
+def _changedTeams(files,manifest,maxWorkers):
+    '''
+    _changedTeams returns the teams whose files differ from the manifest, the signatures
+    ({'mtime','size','sha256'}) of every file, and the contents of the files it read. Only the
+    files whose time or size changed are read, and count as changed only if their sha256 did too.
+    '''
+    signatures,toRead = {},[]
+    for team,paths in files.items():
+        signatures[team] = {}
+        for label,path in paths.items():
+            stat = os.stat(path)
+            signature = {'mtime' : stat.st_mtime_ns,'size' : stat.st_size,'sha256' : None}
+            old = manifest.get(team,{}).get(label)
+            if old is not None and (old['mtime'],old['size']) == (signature['mtime'],signature['size']):
+                signature['sha256'] = old['sha256']
+            else:
+                toRead.append((team,label,path))
+            signatures[team][label] = signature
+
+    with ThreadPoolExecutor(max_workers=maxWorkers) as pool:
+        results = list(pool.map(_readFile,[path for _,_,path in toRead]))
+    changed,contents = [],{}
+    for (team,label,path),(content,sha256) in zip(toRead,results):
+        signatures[team][label]['sha256'] = sha256
+        contents[path] = content
+        if manifest.get(team,{}).get(label,{}).get('sha256') != sha256:
+            changed.append(team)
+    return [team for team in files if team in changed],signatures,contents
+
+def _storedTeams(dfStored,teams):
+    '''
+    _storedTeams returns the label of the team file each row of an existing regSeasonData table
+    came from (None for other teams), a team's file holding every era of its franchise.
+    '''
+    franchise = Franchises.index.codes(dfStored['Tm'],dfStored['Season'])
+    labelOfFranchise = np.full(len(Franchises.index)+1,None,dtype=object) # the extra None for unknown teams (-1)
+    labelOfFranchise[Franchises.index.codes(np.array(teams))] = teams
+    return labelOfFranchise[franchise]
+
+def _saveManifest(outFile,minSeason,signatures):
+    '''writes the manifest of outFile (after outFile itself, so that it never describes newer files)'''
+    tmpFile = manifestFile(outFile) + '.tmp'
+    with open(tmpFile,'w') as f:
+        json.dump({'minSeason' : minSeason,'files' : signatures},f,indent=1)
+    os.replace(tmpFile,manifestFile(outFile))
+
+def rebuildSeasonData(dataDir=defaultDataDir,outFile=defaultOutFile,minSeason=minSeason,maxWorkers=8,
+                      force=False):
+    '''
+    rebuildSeasonData writes outFile (key 'dfFull') from the csv files of dataDir, parsing only
+    the teams whose files changed since the last build (every team if force, if there is no
+    manifest, or if minSeason changed), and rewriting it only if a team changed, appeared or
+    disappeared. The file and its manifest are renamed into place.
+
+    Inputs:
+    dataDir - directory of the <team>o.csv and <team>d.csv files
+    outFile - h5 file written (its manifest is manifestFile(outFile))
+    minSeason - first year of the earliest season kept
+    maxWorkers - number of files read simultaneously
+    force - parse every team
+
+    Outputs:
+    dfTeamData - the table written: Season, Tm, 'FG' to 'oppPTS', teams in label order, each
+                 team's seasons in file order (index: row within the team, as the notebook)
+    rebuilt - list of the teams that were parsed
+    '''
+    files = teamFiles(dataDir)
+    manifest = {}
+    if not force and os.path.exists(outFile) and os.path.exists(manifestFile(outFile)):
+        with open(manifestFile(outFile)) as f:
+            manifest = json.load(f)
+    if manifest.get('minSeason') != minSeason:
+        manifest = {}
+    rebuilt,signatures,contents = _changedTeams(files,manifest.get('files',{}),maxWorkers)
+
+    pieces = []
+    kept = [team for team in files if team not in rebuilt]
+    if kept:
+        dfStored = pd.read_hdf(outFile,'dfFull')
+        if not rebuilt and list(manifest['files']) == kept: # nothing to rewrite
+            _saveManifest(outFile,minSeason,signatures)
+            return dfStored,rebuilt
+        dfStored.insert(0,'team',_storedTeams(dfStored,kept))
+        pieces.append(dfStored[dfStored['team'].isin(kept)])
+    if rebuilt:
+        pieces.append(loadTeamFiles({team : files[team] for team in rebuilt},minSeason,maxWorkers,contents))
+    dfTeamData = pd.concat(pieces)
+    if kept and rebuilt: # back into the order of the labels
+        order = {team : i for i,team in enumerate(files)}
+        dfTeamData = dfTeamData.iloc[np.argsort(dfTeamData['team'].map(order).to_numpy(),kind='stable')]
+    dfTeamData.index = dfTeamData.groupby('team',sort=False).cumcount().to_numpy()
+    dfTeamData = dfTeamData.drop(columns='team')
+    validateSeasonData(dfTeamData)
+
+    os.makedirs(os.path.dirname(outFile) or '.',exist_ok=True)
+    tmpFile = outFile + '.tmp'
+    dfTeamData.to_hdf(tmpFile,key='dfFull',mode='w')
+    os.replace(tmpFile,outFile)
+    _saveManifest(outFile,minSeason,signatures)
+    return dfTeamData,rebuilt
+
+# rebuild pyData/regSeasonData.h5 from regSeasonData
+if __name__ == '__main__':
+    dfTeamData,rebuilt = rebuildSeasonData()
+    print('Wrote',defaultOutFile,':',dfTeamData.shape[0],'rows, teams parsed:',rebuilt)
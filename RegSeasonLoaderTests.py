@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import RegSeasonLoader
+
+'''
+Tests and benchmark of RegSeasonLoader against regSeasonData and pyData/regSeasonData.h5, with the
+csv files copied to (and the h5 file written in) a temporary directory.
+'''
+
+def notebookLoad(dataDir='regSeasonData',minSeason=2000):
+    '''the loop of loadSeasonData.ipynb that RegSeasonLoader replaces'''
+    oKeys = RegSeasonLoader.sideColumns
+    addOpp = lambda x: 'opp' + x if (x != 'Season' and x != 'Tm') else x
+    dfList = []
+    for team in sorted(set(f[:3] for f in os.listdir(dataDir))):
+        odList = []
+        for label in 'od':
+            df = pd.read_csv(os.path.join(dataDir,team+label+'.csv'))
+            seasonInts = np.array([int(s[:4]) for s in list(df['Season'])])
+            df = df[seasonInts >= minSeason]
+            df = df.reindex(columns=['Season','Tm'] + oKeys)
+            if label == 'd':
+                df.rename(columns=addOpp,inplace=True)
+            odList.append(df)
+        dfList.append(pd.merge(*odList,on=['Season','Tm']))
+    return pd.concat(dfList)
+
+def _sorted(df):
+    return df.sort_values(['Season','Tm'],ignore_index=True)
+
+def _editFile(path,points=150.):
+    '''rewrites a csv file with the points of its latest season changed'''
+    df = pd.read_csv(path,dtype=str,keep_default_na=False)
+    df.loc[0,'PTS'] = str(points)
+    df.to_csv(path,index=False)
+
+def testRebuild():
+    '''
+    testRebuild checks that a full build gives the table of pyData/regSeasonData.h5, that only the
+    teams whose files changed are parsed again, and that bad files are rejected.
+    '''
+    expected = pd.read_hdf('pyData/regSeasonData.h5')
+    with tempfile.TemporaryDirectory() as tmpDir:
+        dataDir = os.path.join(tmpDir,'regSeasonData')
+        shutil.copytree('regSeasonData',dataDir)
+        outFile = os.path.join(tmpDir,'regSeasonData.h5')
+
+        # test 1: full build
+        print('test 1')
+        dfTeamData,rebuilt = RegSeasonLoader.rebuildSeasonData(dataDir,outFile)
+        print('30 teams parsed:',len(rebuilt) == 30) # expected: True
+        print('same as regSeasonData.h5:',_sorted(dfTeamData).equals(_sorted(expected))) # expected: True
+        print('same as the notebook:',dfTeamData.equals(notebookLoad(dataDir))) # expected: True
+        print('written:',pd.read_hdf(outFile,'dfFull').equals(dfTeamData)) # expected: True
+
+        # test 2: nothing changed, or only the time of a file
+        print('test 2')
+        os.utime(os.path.join(dataDir,'BOSo.csv'))
+        dfAgain,rebuilt = RegSeasonLoader.rebuildSeasonData(dataDir,outFile)
+        print('teams parsed:',rebuilt) # expected: []
+        print('same table:',dfAgain.equals(dfTeamData)) # expected: True
+
+        # test 3: changed files (a team with several eras) are the only ones parsed
+        print('test 3')
+        _editFile(os.path.join(dataDir,'BRKd.csv'))
+        _editFile(os.path.join(dataDir,'CHAo.csv'))
+        dfChanged,rebuilt = RegSeasonLoader.rebuildSeasonData(dataDir,outFile)
+        print('teams parsed:',rebuilt) # expected: ['BRK', 'CHA']
+        full,_ = RegSeasonLoader.rebuildSeasonData(dataDir,os.path.join(tmpDir,'full.h5'))
+        print('same as a full build:',dfChanged.equals(full)) # expected: True
+        print('edits loaded:',(dfChanged['oppPTS'] == 150.).sum(),(dfChanged['PTS'] == 150.).sum()) # expected: 1 1
+
+        # test 4: bad files
+        print('test 4')
+        df = pd.read_csv(os.path.join(dataDir,'ATLo.csv'))
+        df.drop(columns='3PA').to_csv(os.path.join(dataDir,'ATLo.csv'),index=False)
+        try:
+            RegSeasonLoader.rebuildSeasonData(dataDir,outFile)
+            print('missing column rejected: False')
+        except ValueError:
+            print('missing column rejected: True') # expected: True
+        df.iloc[1:].to_csv(os.path.join(dataDir,'ATLo.csv'),index=False)
+        try:
+            RegSeasonLoader.rebuildSeasonData(dataDir,outFile)
+            print('missing season rejected: False')
+        except ValueError:
+            print('missing season rejected: True') # expected: True
+        print('h5 unchanged:',pd.read_hdf(outFile,'dfFull').equals(dfChanged)) # expected: True
+
+def benchmarkRebuild(repeat=5):
+    '''
+    benchmarkRebuild times the notebook's sequential load, a full parallel build, and the rebuild
+    after one team file changed.
+    '''
+    with tempfile.TemporaryDirectory() as tmpDir:
+        dataDir = os.path.join(tmpDir,'regSeasonData')
+        shutil.copytree('regSeasonData',dataDir)
+        outFile = os.path.join(tmpDir,'regSeasonData.h5')
+        edits = iter(range(100,200))
+        cases = [('notebook (sequential, no write)',lambda : notebookLoad(dataDir)),
+                 ('full build',lambda : RegSeasonLoader.rebuildSeasonData(dataDir,outFile,force=True)),
+                 ('one team changed (edit included)',lambda : (_editFile(os.path.join(dataDir,'BOSo.csv'),next(edits)),
+                                               RegSeasonLoader.rebuildSeasonData(dataDir,outFile))),
+                 ('nothing changed',lambda : RegSeasonLoader.rebuildSeasonData(dataDir,outFile))]
+        for name,f in cases:
+            f()
+            tic = time.perf_counter()
+            for _ in range(repeat):
+                f()
+            print('%s: %.1f ms' % (name,1e3*(time.perf_counter() - tic)/repeat))
+
+# run tests
+if __name__ == '__main__':
+    print('Test RegSeasonLoader')
+    testRebuild()
+    print('###################################')
+    print('Benchmark rebuild')
+    benchmarkRebuild()
@@ -0,0 +1,234 @@
+import numpy as np
+import pandas as pd
+
+'''
+RollingStats keeps each team's season-to-date stats as running sums of its game logs (box score
+team totals of the team and of its opponent), instead of re-scraping the season-average pages:
+
+    - adding a game is O(1): the team's running sums are copied forward and incremented, and the
+      result is appended to the team's history (one row per game played)
+    - the stats as of any date (games played strictly before that date) are read from the
+      history with a binary search per team, for one date (asOf) or many at once (snapshots)
+
+Per-game averages and percentages are derived from the sums when queried, in the layout of
+regSeasonData ('FG' to 'PTS', then 'oppFG' to 'oppPTS'; percentages are ratios of the totals,
+as on BR), so snapshots can be fed to the model as the season-average stats are.
+
+Usage:
+    rolling = RollingTeamStats()
+    rolling.addGameLogs(logs)            # or addGame(...) for each new box score
+    teamStats = rolling.asOf('2021-02-01')
+'''
+
+# counting stats of a game log (box score team totals); 2P, DRB and percentages are derived
+countColumns = ['FG','FGA','3P','3PA','FT','FTA','ORB','TRB','AST','STL','BLK','TOV','PF','PTS']
+oppCountColumns = ['opp'+c for c in countColumns]
+
+# stats of a team in regSeasonData and GameStore (42 per team)
+sideColumns = ['FG','FGA','FG%','3P','3PA','3P%','2P','2PA','2P%','FT','FTA','FT%',
+               'ORB','DRB','TRB','AST','STL','BLK','TOV','PF','PTS']
+statColumns = sideColumns + ['opp'+c for c in sideColumns]
+
+def _sideMatrix():
+    '''
+    (14 x 21) matrix taking the counting stats of one side to the totals of sideColumns
+    (percentage columns are left at zero and filled in by perGameStats)
+    '''
+    derived = {'2P' : {'FG' : 1.,'3P' : -1.},
+               '2PA' : {'FGA' : 1.,'3PA' : -1.},
+               'DRB' : {'TRB' : 1.,'ORB' : -1.}}
+    A = np.zeros((len(countColumns),len(sideColumns)))
+    for j,name in enumerate(sideColumns):
+        for count,coefficient in derived.get(name,{name : 1.} if name in countColumns else {}).items():
+            A[countColumns.index(count),j] = coefficient
+    return A
+
+_totalsMatrix = np.kron(np.eye(2),_sideMatrix()) # (28 x 42): team then opponent
+# (percentage, made, attempted) column indices in statColumns
+_percentages = np.array([(statColumns.index(c+'%'),statColumns.index(c),statColumns.index(c+'A'))
+                         for c in ['FG','3P','2P','FT','oppFG','opp3P','opp2P','oppFT']])
+_nCounts = 2*len(countColumns)
+
+def perGameStats(sums,games):
+    '''
+    perGameStats converts running sums into per-game stats.
+
+    Inputs:
+    sums - array (... x 28) of the sums of countColumns then oppCountColumns
+    games - array (...) of the number of games summed
+
+    Outputs:
+    stats - array (... x 42) in the order of statColumns (NaN where games is 0)
+    '''
+    totals = sums[...,:_nCounts] @ _totalsMatrix
+    with np.errstate(divide='ignore',invalid='ignore'):
+        stats = totals/np.asarray(games,dtype=np.float64)[...,None]
+        stats[...,_percentages[:,0]] = totals[...,_percentages[:,1]]/totals[...,_percentages[:,2]]
+    return stats
+
+def _days(dates):
+    '''converts dates (strings, Timestamps, datetime64) into int64 days since 1970-01-01'''
+    return pd.to_datetime(dates).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+def _day(date):
+    '''_days of a single date (without building an array)'''
+    return pd.Timestamp(date).value // 86400000000000
+
+class RollingTeamStats:
+    '''
+    RollingTeamStats holds the running sums and per-game history of every team of a season.
+    Games of a team must be added in date order (games already added are never changed).
+    '''
+    def __init__(self,capacity=100):
+        '''
+        capacity - initial number of games per team held by the history (grows as needed)
+        '''
+        self.teams = [] # abbreviations, code = position
+        self._codes = {}
+        self._games = np.zeros(0,dtype=np.int64) # games played by each team
+        # _history[t,k] = sums (countColumns, oppCountColumns, wins) over the first k games of team t
+        self._history = np.zeros((0,capacity+1,_nCounts+1))
+        self._dates = np.zeros((0,capacity),dtype=np.int64) # _dates[t,k] = day of game k+1 of team t
+
+    def _teamCode(self,team):
+        code = self._codes.get(team)
+        if code is None:
+            code = len(self.teams)
+            self.teams.append(team)
+            self._codes[team] = code
+            self._games = np.append(self._games,0)
+            self._history = np.concatenate([self._history,np.zeros((1,)+self._history.shape[1:])])
+            self._dates = np.concatenate([self._dates,np.zeros((1,self._dates.shape[1]),dtype=np.int64)])
+        return code
+
+    def _reserve(self,nGames):
+        '''makes room in the history for nGames games per team'''
+        capacity = self._dates.shape[1]
+        if nGames <= capacity:
+            return
+        capacity = max(nGames,2*capacity)
+        history = np.zeros((len(self.teams),capacity+1,_nCounts+1))
+        history[:,:self._history.shape[1]] = self._history
+        dates = np.zeros((len(self.teams),capacity),dtype=np.int64)
+        dates[:,:self._dates.shape[1]] = self._dates
+        self._history,self._dates = history,dates
+
+    def games(self):
+        '''games returns the number of games added for each team (pd Series)'''
+        return pd.Series(self._games,index=self.teams,name='G')
+
+    '''
+    ADDING GAMES
+    '''
+    def addTeamGame(self,team,date,teamBox,oppBox):
+        '''
+        addTeamGame adds one game to a team's running sums (O(1)).
+
+        Inputs:
+        team - team abbreviation
+        date - game date
+        teamBox, oppBox - counting stats of the team and of its opponent, in the order of countColumns
+        '''
+        teamBox = np.asarray(teamBox,dtype=np.float64)
+        oppBox = np.asarray(oppBox,dtype=np.float64)
+        t = self._teamCode(team)
+        k = self._games[t]
+        day = _day(date)
+        if k > 0 and day < self._dates[t,k-1]:
+            raise ValueError('Game of '+team+' on '+str(pd.Timestamp(date).date())+' added after a later game')
+        self._reserve(k+1)
+        row = self._history[t,k+1]
+        row[:] = self._history[t,k]
+        row[:len(countColumns)] += teamBox
+        row[len(countColumns):_nCounts] += oppBox
+        row[_nCounts] += teamBox[-1] > oppBox[-1] # PTS
+        self._dates[t,k] = day
+        self._games[t] = k+1
+
+    def addGame(self,date,visitor,home,visitorBox,homeBox):
+        '''
+        addGame adds a box score (the team totals of the visitor and home teams, in the order of
+        countColumns) to the running sums of both teams.
+        '''
+        self.addTeamGame(visitor,date,visitorBox,homeBox)
+        self.addTeamGame(home,date,homeBox,visitorBox)
+
+    def addGameLog(self,team,gameLog):
+        '''
+        addGameLog adds a team's games at once (e.g. a season's game log).
+
+        Inputs:
+        team - team abbreviation
+        gameLog - pd DataFrame with columns Date, countColumns and oppCountColumns (see
+                  BRTableParser.parseGameLog), in date order
+        '''
+        if gameLog.empty:
+            return
+        t = self._teamCode(team)
+        k = self._games[t]
+        days = _days(gameLog['Date'])
+        if (np.diff(days) < 0).any() or (k > 0 and days[0] < self._dates[t,k-1]):
+            raise ValueError('Game log of '+team+' is not in date order')
+        n = len(days)
+        self._reserve(k+n)
+        box = gameLog[countColumns+oppCountColumns].to_numpy(dtype=np.float64)
+        wins = box[:,len(countColumns)-1] > box[:,-1]
+        increments = np.hstack([box,wins[:,None]])
+        self._history[t,k+1:k+n+1] = self._history[t,k] + np.cumsum(increments,axis=0)
+        self._dates[t,k:k+n] = days
+        self._games[t] = k+n
+
+    def addGameLogs(self,logs):
+        '''
+        addGameLogs adds the game logs of several teams: logs is a pd DataFrame with columns Tm,
+        Date, countColumns and oppCountColumns (one row per team and game).
+        '''
+        for team,gameLog in logs.groupby('Tm',sort=False,observed=True):
+            self.addGameLog(team,gameLog.sort_values('Date',kind='stable'))
+
+    '''
+    QUERIES
+    '''
+    def _played(self,days):
+        '''(dates x teams) number of games of each team played strictly before each day'''
+        played = np.empty((len(days),len(self.teams)),dtype=np.int64)
+        for t in range(len(self.teams)):
+            played[:,t] = np.searchsorted(self._dates[t,:self._games[t]],days,side='left')
+        return played
+
+    def snapshots(self,dates):
+        '''
+        snapshots returns every team's stats as of each date (games played strictly before it).
+
+        Inputs:
+        dates - list or array of dates
+
+        Outputs:
+        played - (dates x teams) number of games played, teams in the order of self.teams
+        stats - (dates x teams x 42) per-game stats in the order of statColumns (NaN before a
+                team's first game)
+        wins - (dates x teams) number of wins
+        '''
+        played = self._played(_days(dates))
+        sums = self._history[np.arange(len(self.teams)),played]
+        return played,perGameStats(sums,played),sums[...,_nCounts].astype(np.int64)
+
+    def asOf(self,date):
+        '''
+        asOf returns the teams' stats as of date (games played strictly before it), as a pd
+        DataFrame with columns Tm, G, W, L and statColumns, one row for each team that has played.
+        '''
+        played,stats,wins = self.snapshots([date])
+        keep = played[0] > 0
+        table = pd.DataFrame(stats[0][keep],columns=statColumns)
+        table.insert(0,'L',played[0][keep] - wins[0][keep])
+        table.insert(0,'W',wins[0][keep])
+        table.insert(0,'G',played[0][keep])
+        table.insert(0,'Tm',np.array(self.teams,dtype=object)[keep])
+        return table
+
+    def teamVector(self,team,date):
+        '''teamVector returns a team's 42 stats as of date (statColumns order)'''
+        t = self._codes[team]
+        k = np.searchsorted(self._dates[t,:self._games[t]],_day(date),side='left')
+        return perGameStats(self._history[t,k],k)
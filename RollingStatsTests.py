@@ -0,0 +1,135 @@
+import time
+import numpy as np
+import pandas as pd
+from BRStubServer import syntheticGameLogs, renderGameLogPage
+import BRTableParser
+import RollingStats
+from RollingStats import RollingTeamStats, countColumns, oppCountColumns, statColumns
+
+'''
+Tests and benchmark of RollingStats, on synthetic box scores of the 2020-21 schedule
+(BRStubServer.syntheticGameLogs, the repository has no box scores): the snapshots are compared
+with per-game averages recomputed from the game logs with pandas.
+'''
+
+def pandasAsOf(logs,date):
+    '''recomputes the stats as of date from the game logs (the per-date scrape the engine replaces)'''
+    played = logs[logs['Date'] < pd.Timestamp(date)]
+    totals = played.groupby('Tm')[countColumns+oppCountColumns].sum()
+    games = played.groupby('Tm').size()
+    stats = pd.DataFrame(index=totals.index)
+    for prefix in ['','opp']:
+        t = lambda c : totals[prefix+c]
+        for c in RollingStats.sideColumns:
+            if c.endswith('%'):
+                made,attempted = {'FG%' : ('FG','FGA'),'3P%' : ('3P','3PA'),'FT%' : ('FT','FTA'),
+                                  '2P%' : (None,None)}[c]
+                stats[prefix+c] = (t(made)/t(attempted) if made else
+                                   (t('FG') - t('3P'))/(t('FGA') - t('3PA')))
+            elif c == '2P':
+                stats[prefix+c] = (t('FG') - t('3P'))/games
+            elif c == '2PA':
+                stats[prefix+c] = (t('FGA') - t('3PA'))/games
+            elif c == 'DRB':
+                stats[prefix+c] = (t('TRB') - t('ORB'))/games
+            else:
+                stats[prefix+c] = t(c)/games
+    return stats[statColumns],games
+
+def testRollingStats():
+    '''
+    testRollingStats checks the snapshots against pandas recomputations, and that adding games one
+    box score at a time gives the same state as adding whole game logs.
+    '''
+    logs = syntheticGameLogs()
+    rolling = RollingTeamStats()
+    rolling.addGameLogs(logs)
+
+    # test 1: as-of tables match the recomputation from the logs
+    print('test 1')
+    dates = ['2020-12-23','2021-01-15','2021-03-01','2021-08-01']
+    same = True
+    for date in dates:
+        expected,games = pandasAsOf(logs,date)
+        table = rolling.asOf(date).set_index('Tm').loc[expected.index]
+        same &= np.allclose(table[statColumns].to_numpy(),expected.to_numpy()) and (table['G'] == games).all()
+    print('same as-of stats:',same) # expected: True
+    final = rolling.asOf('2021-08-01')
+    wins = logs[logs['PTS'] > logs['oppPTS']].groupby('Tm').size()
+    print('W-L:',(final.set_index('Tm')['W'].loc[wins.index] == wins).all(),final['G'].sum() == logs.shape[0]) # expected: True True
+    print('before the first game:',rolling.asOf('2020-12-22').empty) # expected: True
+
+    # test 2: snapshots of many dates, and teamVector
+    print('test 2')
+    played,stats,_ = rolling.snapshots(dates)
+    t = rolling.teams.index('GSW')
+    print('same snapshots:',np.allclose(stats[1,t],pandasAsOf(logs,dates[1])[0].loc['GSW'].to_numpy()),
+          np.allclose(stats[1,t],rolling.teamVector('GSW',dates[1]))) # expected: True True
+
+    # test 3: one box score at a time (nightly ingestion) gives the same history
+    print('test 3')
+    incremental = RollingTeamStats(capacity=4) # also exercises the history growing
+    for date,games in logs.groupby('Date'):
+        for row in games.itertuples(index=False):
+            incremental.addTeamGame(row.Tm,date,row[2:2+len(countColumns)],row[2+len(countColumns):])
+    _,incrementalStats,_ = incremental.snapshots(dates)
+    order = [incremental.teams.index(team) for team in rolling.teams]
+    print('same as game logs:',np.allclose(incrementalStats[:,order],stats,equal_nan=True)) # expected: True
+    try:
+        incremental.addTeamGame('GSW','2021-01-01',np.zeros(14),np.zeros(14))
+        print('no error raised')
+    except ValueError as e:
+        print('ValueError:',e) # expected: game added after a later game
+
+def testParseGameLog():
+    '''
+    testParseGameLog checks parseGameLog on a page with the layout of BR game logs (opponent stats
+    in columns with a '.1' suffix, header rows repeated in the table body).
+    '''
+    logs = syntheticGameLogs()
+    gameLog = logs[logs['Tm'] == 'GSW'].reset_index(drop=True)
+    table = BRTableParser.parseGameLog(renderGameLogPage('GSW',2021))
+    print('same game log:',table.drop(columns='Opp').equals(gameLog.drop(columns='Tm'))) # expected: True
+
+def benchmarkRollingStats(nQueries=100):
+    '''
+    benchmarkRollingStats times adding box scores one at a time and the as-of queries, against
+    recomputing the stats from the game logs with pandas for each date.
+    '''
+    logs = syntheticGameLogs()
+    rows = [(row.Tm,row.Date,np.array(row[2:2+len(countColumns)],dtype=np.float64),
+             np.array(row[2+len(countColumns):],dtype=np.float64)) for row in logs.itertuples(index=False)]
+    rolling = RollingTeamStats()
+    tic = time.perf_counter()
+    for team,date,teamBox,oppBox in rows:
+        rolling.addTeamGame(team,date,teamBox,oppBox)
+    print('addTeamGame: %.1f us per game log row' % (1e6*(time.perf_counter() - tic)/len(rows)))
+    tic = time.perf_counter()
+    RollingTeamStats().addGameLogs(logs)
+    print('addGameLogs (whole season): %.1f ms' % (1e3*(time.perf_counter() - tic)))
+
+    dates = pd.date_range(logs['Date'].min(),logs['Date'].max()+pd.Timedelta(days=1))
+    queries = dates[np.linspace(0,len(dates)-1,nQueries).astype(int)]
+    tic = time.perf_counter()
+    for date in queries:
+        pandasAsOf(logs,date)
+    pandasTime = (time.perf_counter() - tic)/nQueries
+    tic = time.perf_counter()
+    for date in queries:
+        rolling.asOf(date)
+    asOfTime = (time.perf_counter() - tic)/nQueries
+    print('as of one date: pandas %.2f ms, asOf %.3f ms' % (1e3*pandasTime,1e3*asOfTime))
+    tic = time.perf_counter()
+    rolling.snapshots(dates)
+    print('snapshots of all %d dates: %.2f ms' % (len(dates),1e3*(time.perf_counter() - tic)))
+
+# run tests
+if __name__ == '__main__':
+    print('Test rolling stats')
+    testRollingStats()
+    print('###################################')
+    print('Test parseGameLog')
+    testParseGameLog()
+    print('###################################')
+    print('Benchmark rolling stats')
+    benchmarkRollingStats()
@@ -0,0 +1,308 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy.stats import binom
+
+'''
+SeasonSimulator plays out the rest of a season many times from the current W-L records and the
+model's win probability of every matchup (HiFOPredict.probabilityMatrix), and gives each team's
+odds of every seed, of the play-in and playoffs, of each playoff round and of the title.
+
+    - the remaining games of a batch of simulated seasons are drawn at once (one array of
+      uniforms, sims x games), and the win totals and head-to-head records are tallied from the
+      outcomes with one matrix product
+    - ties in the standings are broken as the NBA does for two or more teams: record in the games
+      between the tied teams, then a random draw; all the simulations are ranked with one
+      np.lexsort per conference
+    - play-in (seeds 7 to 10) games and playoff series are drawn for all the simulations at once,
+      round by round; the probability of winning a best-of-7 series (2-2-1-1-1, home court to the
+      better seed, or in the Finals to the team with more wins) is computed exactly for every
+      pair of teams beforehand
+    - batches run in a process pool, each with its own random stream spawned from one
+      np.random.SeedSequence, so the results depend only on seed and chunkSize, not on the number
+      of processes
+
+Usage:
+    simulator = SeasonSimulator.fromPredictor(predictor,schedule)
+    result = simulator.simulate(1000000,seed=0)
+    print(result.odds)
+'''
+
+# conference of each team, under every abbreviation used by BR and HiFOPredict
+conferenceKey = {team : 'East' for team in ['ATL','BOS','BRK','NJN','CHA','CHO','CHH','CHI','CLE','DET','IND',
+                                            'MIA','MIL','NYK','ORL','PHI','TOR','WAS']}
+conferenceKey.update({team : 'West' for team in ['DAL','DEN','GSW','HOU','LAC','LAL','MEM','MIN','NOH','NOK',
+                                                 'NOP','OKC','SEA','PHO','POR','SAC','SAS','UTA','VAN']})
+
+# playoff rounds, in the order teams reach them
+roundNames = ['Playoffs','Second round','Conference finals','Finals','Champion']
+
+'''
+SimulationResult: output of SeasonSimulator.simulate
+    odds - pd DataFrame indexed by team: Conference, W and L so far, Mean W (final wins), then the
+           probability of Play-in (finishing 7th to 10th, if there is a play-in) and of each of
+           roundNames
+    seeds - pd DataFrame indexed by team: probability of each final conference rank (columns 1 to
+            the size of the conference)
+    wins - pd DataFrame indexed by team: probability of each final number of wins (columns)
+    nSims - number of simulated seasons
+'''
+SimulationResult = namedtuple('SimulationResult',['odds','seeds','wins','nSims'])
+
+def seriesProbability(P,games=7):
+    '''
+    seriesProbability computes the probability of winning a best-of-games series for every pair
+    of teams, the team with home court hosting the first two games, then every other game
+    (2-2-1-1-1 for 7 games).
+
+    Inputs:
+    P - (teams x teams) matrix of the visiting team's win probability (row: visitor, column: home)
+
+    Outputs:
+    S - (teams x teams) matrix, S[a,b] the probability that a, with home court, beats b
+    '''
+    need = games//2 + 1
+    nHome,nAway = need,games - need
+    k = np.arange(nHome+1)
+    m = np.arange(nAway+1)
+    homeWins = binom.pmf(k,nHome,(1. - P.T)[...,None]) # a hosts b: a wins with probability 1 - P[b,a]
+    awayWins = binom.pmf(m,nAway,P[...,None])
+    return np.einsum('abk,abm,km->ab',homeWins,awayWins,(k[:,None] + m[None,:] >= need).astype(float))
+
+class SeasonSimulator:
+    '''
+    SeasonSimulator holds the standings, the remaining schedule and the matchup probabilities of
+    a season, and simulates its end.
+    '''
+    def __init__(self,teams,wins,losses,visitor,home,P,headToHead=None,conferences=None,playIn=True):
+        '''
+        teams - team abbreviations
+        wins, losses - current W and L of each team
+        visitor, home - team indices (positions in teams) of the remaining games
+        P - (teams x teams) visitor win probability of every matchup (HiFOPredict.probabilityMatrix)
+        headToHead - (teams x teams) wins of each team over each other team in the games already
+                     played, for the tiebreaks (default: none)
+        conferences - conference of each team (default: from conferenceKey)
+        playIn - True if seeds 7 to 10 play the play-in for the last two playoff spots, False if
+                 the top 8 of each conference make the playoffs
+        '''
+        self.teams = pd.Index(teams)
+        nTeams = len(self.teams)
+        self.wins = np.asarray(wins,dtype=np.int64)
+        self.losses = np.asarray(losses,dtype=np.int64)
+        self.visitor = np.asarray(visitor,dtype=np.intp)
+        self.home = np.asarray(home,dtype=np.intp)
+        self.P = np.asarray(P,dtype=np.float64)
+        self.headToHead = np.zeros((nTeams,nTeams),dtype=np.int64) if headToHead is None else np.asarray(headToHead)
+        self.conferences = (pd.Index(conferences) if conferences is not None
+                            else pd.Index([conferenceKey[team] for team in self.teams]))
+        self.playIn = playIn
+        self.conferenceTeams = [np.flatnonzero(self.conferences == c) for c in self.conferences.unique()]
+        if min(len(teams) for teams in self.conferenceTeams) < (10 if playIn else 8):
+            raise ValueError('Not enough teams in each conference for the playoffs')
+        self._prepare()
+
+    @classmethod
+    def fromPredictor(cls,predictor,schedule,headToHead=None,playIn=True):
+        '''
+        fromPredictor builds a simulator from a HiFOPredict (W-L records and probabilities of its
+        teams) and the season's schedule (e.g. HiFOService's, columns Date, Visitor and Home): the
+        games from predictor.date on are left to play.
+        '''
+        remaining = schedule[pd.to_datetime(schedule['Date']) >= predictor.date]
+        record = predictor.teamWL.set_index('Tm').loc[predictor.teamIndex]
+        visWinProbability,_ = predictor.probabilityMatrix()
+        return cls(predictor.teamIndex,record['W'],record['L'],predictor.teamCodes(remaining['Visitor']),
+                   predictor.teamCodes(remaining['Home']),visWinProbability,headToHead,playIn=playIn)
+
+    def _prepare(self):
+        '''
+        precomputes the tally matrix of the remaining games: the product of the outcomes (1 if the
+        visitor won) with it gives each team's wins (first nTeams columns) and, for every pair of
+        teams of the same conference, the wins of the first over the second
+        '''
+        nTeams = len(self.teams)
+        nGames = len(self.visitor)
+        games = np.arange(nGames)
+        first,second = [],[]
+        for teams in self.conferenceTeams:
+            i,j = np.triu_indices(len(teams),1)
+            first.append(teams[i])
+            second.append(teams[j])
+        self.pairFirst = np.concatenate(first)
+        self.pairSecond = np.concatenate(second)
+        nPairs = len(self.pairFirst)
+        pairIndex = np.full((nTeams,nTeams),-1)
+        pairIndex[self.pairFirst,self.pairSecond] = np.arange(nPairs)
+        pairIndex[self.pairSecond,self.pairFirst] = np.arange(nPairs)
+
+        teamTally = np.zeros((nGames,nTeams))
+        teamTally[games,self.visitor] += 1.
+        teamTally[games,self.home] -= 1.
+        homeGames = np.bincount(self.home,minlength=nTeams)
+        pairTally = np.zeros((nGames,nPairs))
+        pair = pairIndex[self.visitor,self.home]
+        inPair = pair >= 0
+        firstIsVisitor = self.visitor == self.pairFirst[np.maximum(pair,0)]
+        pairTally[games[inPair],pair[inPair]] = np.where(firstIsVisitor[inPair],1.,-1.)
+        self._tally = np.hstack([teamTally,pairTally]).astype(np.float32)
+        self._firstIncidence = np.zeros((nPairs,nTeams),dtype=np.float32) # pair x team, 1 for pairFirst
+        self._firstIncidence[np.arange(nPairs),self.pairFirst] = 1.
+        self._secondIncidence = np.zeros((nPairs,nTeams),dtype=np.float32)
+        self._secondIncidence[np.arange(nPairs),self.pairSecond] = 1.
+        self._baseWins = self.wins + homeGames
+        self._basePairWins = (np.bincount(pair[inPair & ~firstIsVisitor],minlength=nPairs)
+                              + self.headToHead[self.pairFirst,self.pairSecond])
+        self.pairGames = (np.bincount(pair[inPair],minlength=nPairs) + self.headToHead[self.pairFirst,self.pairSecond]
+                          + self.headToHead[self.pairSecond,self.pairFirst])
+        self._maxWins = (self.wins + np.bincount(self.visitor,minlength=nTeams) + homeGames).max()
+        self._pGame = self.P[self.visitor,self.home].astype(np.float32)
+        self.S = seriesProbability(self.P)
+
+    '''
+    ONE BATCH OF SEASONS
+    '''
+    def _regularSeason(self,nSims,rng):
+        '''
+        Outputs:
+        wins - (sims x teams) final wins
+        pairWins - (sims x pairs) wins of pairFirst over pairSecond
+        '''
+        nTeams = len(self.teams)
+        visitorWon = (rng.random((nSims,len(self._pGame)),dtype=np.float32) < self._pGame).astype(np.float32)
+        tally = visitorWon @ self._tally # exact: integers below 2**24
+        return ((self._baseWins + tally[:,:nTeams]).astype(np.int32),
+                (self._basePairWins + tally[:,nTeams:]).astype(np.float32))
+
+    def _standings(self,wins,pairWins,draw):
+        '''
+        Outputs:
+        standings - list, for each conference, of (sims x conference teams) team indices in rank
+                    order, ties broken by the record in the games between the tied teams, then by draw
+        '''
+        tied = (wins[:,self.pairFirst] == wins[:,self.pairSecond]).astype(np.float32)
+        tiedPairWins = tied*pairWins
+        tiedPairGames = tied*self.pairGames.astype(np.float32)
+        tiedWins = tiedPairWins @ self._firstIncidence + (tiedPairGames - tiedPairWins) @ self._secondIncidence
+        tiedGames = tiedPairGames @ (self._firstIncidence + self._secondIncidence)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            tiedRecord = np.where(tiedGames > 0,tiedWins/tiedGames,0.5)
+        standings = []
+        for teams in self.conferenceTeams:
+            order = np.lexsort((-draw[:,teams],-tiedRecord[:,teams],-wins[:,teams]),axis=-1)
+            standings.append(teams[order])
+        return standings
+
+    def _game(self,home,visitor,rng):
+        '''single games between arrays of teams; returns winners and losers'''
+        homeWon = rng.random(home.shape) >= self.P[visitor,home]
+        return np.where(homeWon,home,visitor),np.where(homeWon,visitor,home)
+
+    def _series(self,a,b,aHome,rng):
+        '''best-of-7 series between arrays of teams; returns the winners'''
+        hi = np.where(aHome,a,b)
+        lo = np.where(aHome,b,a)
+        return np.where(rng.random(hi.shape) < self.S[hi,lo],hi,lo)
+
+    def _playBatch(self,nSims,seedSequence):
+        '''
+        simulates nSims seasons with the random stream of seedSequence, and returns the tallies:
+        wins (teams x possible wins), seeds (teams x ranks), playIn (teams,), rounds
+        (len(roundNames) x teams)
+        '''
+        rng = np.random.default_rng(seedSequence)
+        nTeams = len(self.teams)
+        wins,pairWins = self._regularSeason(nSims,rng)
+        draw = rng.random((nSims,nTeams))
+        standings = self._standings(wins,pairWins,draw)
+
+        nWins = self._maxWins + 1
+        maxRank = max(len(teams) for teams in self.conferenceTeams)
+        tallies = {'wins' : np.bincount((np.arange(nTeams)*nWins + wins).ravel(),
+                                        minlength=nTeams*nWins).reshape(nTeams,nWins),
+                   'seeds' : sum(np.bincount((ranked*maxRank + np.arange(ranked.shape[1])).ravel(),
+                                             minlength=nTeams*maxRank).reshape(nTeams,maxRank)
+                                 for ranked in standings),
+                   'playIn' : np.zeros(nTeams,dtype=np.int64),
+                   'rounds' : np.zeros((len(roundNames),nTeams),dtype=np.int64)}
+
+        top = np.stack([ranked[:,:10 if self.playIn else 8] for ranked in standings],axis=1) # sims x conferences x seeds
+        if self.playIn:
+            tallies['playIn'] = np.bincount(top[...,6:].ravel(),minlength=nTeams)
+            seventh,loser = self._game(top[...,6],top[...,7],rng)
+            ninthTenth,_ = self._game(top[...,8],top[...,9],rng)
+            eighth,_ = self._game(loser,ninthTenth,rng)
+            top = np.concatenate([top[...,:6],seventh[...,None],eighth[...,None]],axis=-1)
+
+        bracket = np.array([0,7,3,4,2,5,1,6]) # 1-8, 4-5, 3-6, 2-7
+        teams = top[...,bracket]
+        seed = np.broadcast_to(bracket,teams.shape)
+        tallies['rounds'][0] = np.bincount(teams.ravel(),minlength=nTeams)
+        for r in range(1,4): # conference rounds, the better seed with home court
+            a,b = teams[...,0::2],teams[...,1::2]
+            seedA,seedB = seed[...,0::2],seed[...,1::2]
+            teams = self._series(a,b,seedA < seedB,rng)
+            seed = np.where(teams == a,seedA,seedB)
+            tallies['rounds'][r] = np.bincount(teams.ravel(),minlength=nTeams)
+
+        # Finals, home court to the team with more wins, then by draw
+        rows = np.arange(nSims)
+        a,b = teams[:,0,0],teams[:,1,0]
+        aHome = (wins[rows,a] > wins[rows,b]) | ((wins[rows,a] == wins[rows,b]) & (draw[rows,a] > draw[rows,b]))
+        tallies['rounds'][4] = np.bincount(self._series(a,b,aHome,rng),minlength=nTeams)
+        return tallies
+
+    '''
+    SIMULATION
+    '''
+    def simulate(self,nSims,seed=None,maxWorkers=None,chunkSize=10000):
+        '''
+        simulate plays out the rest of the season nSims times.
+
+        Inputs:
+        nSims - number of seasons
+        seed - seed of the np.random.SeedSequence (None for a fresh one); the same seed and
+               chunkSize give the same result whatever maxWorkers
+        maxWorkers - number of worker processes (default: number of CPUs; 1 runs in this process)
+        chunkSize - seasons simulated at once (memory grows as chunkSize x remaining games)
+
+        Outputs:
+        result - SimulationResult
+        '''
+        sizes = [chunkSize]*(nSims//chunkSize) + ([nSims % chunkSize] if nSims % chunkSize else [])
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        maxWorkers = min(maxWorkers or os.cpu_count(),len(sizes))
+        if maxWorkers == 1:
+            batches = [self._playBatch(size,seedSequence) for size,seedSequence in zip(sizes,seeds)]
+        else:
+            with ProcessPoolExecutor(max_workers=maxWorkers,initializer=_setSimulator,initargs=(self,)) as pool:
+                batches = list(pool.map(_playBatch,sizes,seeds))
+        tallies = {name : sum(batch[name] for batch in batches) for name in batches[0]}
+
+        wins = pd.DataFrame(tallies['wins']/nSims,index=self.teams)
+        odds = pd.DataFrame({'Conference' : self.conferences,
+                             'W' : self.wins,
+                             'L' : self.losses,
+                             'Mean W' : wins.to_numpy() @ np.arange(wins.shape[1])},index=self.teams)
+        if self.playIn:
+            odds['Play-in'] = tallies['playIn']/nSims
+        for name,count in zip(roundNames,tallies['rounds']):
+            odds[name] = count/nSims
+        seeds = pd.DataFrame(tallies['seeds']/nSims,index=self.teams,
+                             columns=np.arange(1,tallies['seeds'].shape[1]+1))
+        return SimulationResult(odds,seeds,wins,nSims)
+
+'''
+PROCESS POOL
+'''
+_simulator = None # SeasonSimulator of the worker process
+
+def _setSimulator(simulator):
+    '''worker initializer: keeps the simulator, sent once per worker instead of once per batch'''
+    global _simulator
+    _simulator = simulator
+
+def _playBatch(nSims,seedSequence):
+    return _simulator._playBatch(nSims,seedSequence)
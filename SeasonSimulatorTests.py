@@ -0,0 +1,192 @@
+import itertools
+import time
+import numpy as np
+import pandas as pd
+import GameStore
+import ModelRegistry
+import SeasonSimulator
+
+'''
+Tests and benchmark of SeasonSimulator on the 2020-21 season of the GameStore (pyData/store),
+against seasons simulated one game at a time.
+'''
+
+def storeSimulator(cutoff='2021-04-01',season=2021,playIn=True):
+    '''
+    storeSimulator builds a SeasonSimulator for the regular season of a GameStore season as it stood
+    on cutoff: the games before cutoff are played (W-L records, head-to-head), the later ones are
+    left, and the probabilities are those of the latest model with the season's team stats.
+    '''
+    partition = GameStore.loadSeason(season,mmap=False)
+    storeTeams = np.array(GameStore.loadTeams())
+    teams = storeTeams[partition.statTeams]
+    codes = pd.Index(partition.statTeams).get_indexer
+    dates = pd.to_datetime(partition.date,unit='D')
+    nRegular = 15*72 if season == 2021 else 15*82 # the playoffs follow the regular season in the store
+    visitor,home = codes(partition.visitor[:nRegular]),codes(partition.home[:nRegular])
+    visitorWon = GameStore.visitorWin(partition)[:nRegular]
+    played = dates[:nRegular] < pd.Timestamp(cutoff)
+    winner = np.where(visitorWon,visitor,home)[played]
+    loser = np.where(visitorWon,home,visitor)[played]
+    nTeams = len(teams)
+    headToHead = np.zeros((nTeams,nTeams),dtype=np.int64)
+    np.add.at(headToHead,(winner,loser),1)
+    stats = np.asarray(partition.stats,dtype=np.float64)
+    P = ModelRegistry.defaultRegistry().load().compiled.probability(stats[:,None,:],stats[None,:,:])
+    return SeasonSimulator.SeasonSimulator(teams,np.bincount(winner,minlength=nTeams),np.bincount(loser,minlength=nTeams),
+                                           visitor[~played],home[~played],P,headToHead,playIn=playIn)
+
+def referenceStandings(simulator,wins,pairWins,draw):
+    '''ranks one simulated season with Python loops: wins, record between the tied teams, draw'''
+    h2h = np.zeros((len(simulator.teams),)*2)
+    for i,j,w,n in zip(simulator.pairFirst,simulator.pairSecond,pairWins,simulator.pairGames):
+        h2h[i,j],h2h[j,i] = w,n - w
+    standings = []
+    for teams in simulator.conferenceTeams:
+        def key(team):
+            tied = [other for other in teams if other != team and wins[other] == wins[team]]
+            games = sum(h2h[team,other] + h2h[other,team] for other in tied)
+            record = sum(h2h[team,other] for other in tied)/games if games else 0.5
+            return (wins[team],record,draw[team])
+        standings.append(sorted(teams,key=key,reverse=True))
+    return standings
+
+def loopSeason(simulator,rng):
+    '''
+    loopSeason simulates one season one game at a time (regular season, play-in, and playoff
+    series game by game, 2-2-1-1-1); returns the final wins, standings and teams reaching each of
+    SeasonSimulator.roundNames.
+    '''
+    P = simulator.P
+    nTeams = len(simulator.teams)
+    wins = simulator.wins.copy()
+    h2h = simulator.headToHead.copy()
+    for v,h in zip(simulator.visitor,simulator.home):
+        winner,loser = (v,h) if rng.random() < P[v,h] else (h,v)
+        wins[winner] += 1
+        h2h[winner,loser] += 1
+    pairWins = h2h[simulator.pairFirst,simulator.pairSecond]
+    draw = rng.random(nTeams)
+    standings = referenceStandings(simulator,wins,pairWins,draw)
+
+    def game(home,visitor):
+        return (visitor,home) if rng.random() < P[visitor,home] else (home,visitor)
+
+    def series(a,b): # a has home court
+        won = 0
+        for g,aHome in enumerate([True,True,False,False,True,False,True]):
+            won += (game(a,b) if aHome else game(b,a))[0] == a
+            if won == 4 or g + 1 - won == 4:
+                break
+        return a if won == 4 else b
+
+    reached = [[] for _ in SeasonSimulator.roundNames]
+    champions = []
+    for ranked in standings:
+        seeds = list(ranked[:8])
+        if simulator.playIn:
+            seventh,loser = game(ranked[6],ranked[7])
+            ninthTenth,_ = game(ranked[8],ranked[9])
+            seeds[6],seeds[7] = seventh,game(loser,ninthTenth)[0]
+        bracket = [(seeds[i],i) for i in [0,7,3,4,2,5,1,6]]
+        reached[0] += [team for team,_ in bracket]
+        for r in range(1,4):
+            nextRound = []
+            for better,worse in zip(bracket[0::2],bracket[1::2]):
+                if worse[1] < better[1]:
+                    better,worse = worse,better
+                nextRound.append(better if series(better[0],worse[0]) == better[0] else worse)
+            bracket = nextRound
+            reached[r] += [team for team,_ in bracket]
+        champions.append(bracket[0][0])
+    a,b = champions
+    aHome = (wins[a],draw[a]) > (wins[b],draw[b])
+    reached[4].append(series(a,b) if aHome else series(b,a))
+    return wins,standings,reached
+
+def testSeasonSimulator():
+    '''
+    testSeasonSimulator checks the series probabilities by enumeration, the vectorized tiebreaks
+    against referenceStandings, the reproducibility of the process pool, and the odds against
+    seasons simulated with loopSeason.
+    '''
+    simulator = storeSimulator()
+
+    # test 1: series probabilities
+    print('test 1')
+    P = simulator.P
+    expected = np.zeros(P.shape)
+    for outcomes in itertools.product([0,1],repeat=7): # 1 if the team with home court wins the game
+        for a,b in [(0,1),(4,17),(12,3)]:
+            aWins = [1. - P[b,a] if aHome else P[a,b] for aHome in [1,1,0,0,1,0,1]]
+            probability = np.prod([p if won else 1. - p for won,p in zip(outcomes,aWins)])
+            expected[a,b] += probability*(sum(outcomes) >= 4)
+    S = simulator.S
+    print('same as enumeration:',np.allclose([S[0,1],S[4,17],S[12,3]],[expected[0,1],expected[4,17],expected[12,3]])) # expected: True
+    even = SeasonSimulator.seriesProbability(np.full((2,2),0.5))
+    print('even teams:',np.allclose(even,0.5)) # expected: True
+
+    # test 2: standings and tiebreaks
+    print('test 2')
+    rng = np.random.default_rng(0)
+    wins,pairWins = simulator._regularSeason(500,rng)
+    draw = rng.random(wins.shape)
+    standings = simulator._standings(wins,pairWins,draw)
+    expected = [referenceStandings(simulator,wins[s],pairWins[s],draw[s]) for s in range(wins.shape[0])]
+    print('same standings:',all(np.array_equal(standings[c][s],expected[s][c]) for s in range(wins.shape[0])
+                                for c in range(2)),
+          'ties:',(np.diff(np.take_along_axis(wins,standings[0],axis=1),axis=1) == 0).any()) # expected: True True
+
+    # test 3: reproducible whatever the number of processes, consistent tallies
+    print('test 3')
+    result = simulator.simulate(30000,seed=1,maxWorkers=1)
+    parallel = simulator.simulate(30000,seed=1,maxWorkers=3)
+    print('same in the process pool:',result.odds.equals(parallel.odds),result.seeds.equals(parallel.seeds)) # expected: True True
+    odds = result.odds
+    print('totals:',odds[SeasonSimulator.roundNames + ['Play-in']].sum().round(6).tolist()) # expected: [16.0, 8.0, 4.0, 2.0, 1.0, 8.0]
+    print('seeds:',np.allclose(result.seeds.sum(axis=1),1.),np.allclose(result.seeds.sum(axis=0),2.),
+          np.allclose(result.wins.sum(axis=1),1.)) # expected: True True True
+    expectedWins = (simulator.wins + np.bincount(simulator.visitor,P[simulator.visitor,simulator.home],len(P))
+                    + np.bincount(simulator.home,1. - P[simulator.visitor,simulator.home],len(P)))
+    print('mean wins:',np.abs(odds['Mean W'] - expectedWins).max() < 0.1) # expected: True
+
+    # test 4: same odds as seasons simulated game by game
+    print('test 4')
+    rng = np.random.default_rng(2)
+    nLoop = 3000
+    counts = np.zeros((len(SeasonSimulator.roundNames),len(P)))
+    for _ in range(nLoop):
+        _,_,reached = loopSeason(simulator,rng)
+        for r,teams in enumerate(reached):
+            counts[r] += np.bincount(teams,minlength=len(P))
+    loopOdds = counts.T/nLoop
+    vectorOdds = odds[SeasonSimulator.roundNames].to_numpy()
+    error = 4*np.sqrt(loopOdds*(1 - loopOdds)/nLoop + vectorOdds*(1 - vectorOdds)/result.nSims) + 1e-3
+    print('within 4 standard errors:',(np.abs(vectorOdds - loopOdds) <= error).all()) # expected: True
+
+def benchmarkSeasonSimulator(nSims=1000000):
+    '''
+    benchmarkSeasonSimulator times nSims seasons from the start of 2020-21 (1080 games left), in
+    this process and in a process pool, against loopSeason.
+    '''
+    simulator = storeSimulator('2020-12-01')
+    rng = np.random.default_rng(0)
+    tic = time.perf_counter()
+    for _ in range(200):
+        loopSeason(simulator,rng)
+    perSeason = (time.perf_counter() - tic)/200
+    print('one game at a time: %.2f ms per season (%.0f s for %d seasons)' % (1e3*perSeason,perSeason*nSims,nSims))
+    for maxWorkers in [1,None]:
+        tic = time.perf_counter()
+        result = simulator.simulate(nSims,seed=0,maxWorkers=maxWorkers)
+        print('simulate, %d seasons, %s: %.1f s' % (nSims,'1 process' if maxWorkers == 1 else 'process pool',
+                                                    time.perf_counter() - tic))
+    print(result.odds.sort_values('Champion',ascending=False).round(3).head(10))
+
+# run tests
+if __name__ == '__main__':
+    print('Test season simulator')
+    testSeasonSimulator()
+    print('###################################')
+    print('Benchmark season simulator')
+    benchmarkSeasonSimulator()
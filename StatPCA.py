@@ -0,0 +1,120 @@
+import numpy as np
+
+'''
+StatPCA computes the PCA of the team season-average stats from streaming sufficient statistics:
+for each season it keeps the number of team rows, their sum and the sum of their outer products
+(42 + 42 x 42 numbers), so that
+
+    - adding (or replacing) a season only sums that season's rows
+    - the covariance of any set of seasons (e.g. all but one) is a sum of the kept statistics,
+      without going back over the team rows
+    - the decomposition (np.linalg.eigh of the symmetric covariance) is cached until a season
+      changes
+
+Basis vectors are in decreasing eigenvalue order, and the sign of each is fixed so that its
+largest component (in absolute value) is positive, so the same data always gives the same basis
+and the model weights trained on it keep their signs.
+
+Usage:
+    pca = StatPCA.fromTeamStats(dfTeamData)
+    statMean,PCABasis = pca.basis(7,exclude=['2000-01'])
+'''
+
+def decompose(count,statSum,outerSum):
+    '''
+    decompose computes the PCA from sufficient statistics.
+
+    Inputs:
+    count - number of rows
+    statSum - sum of the rows
+    outerSum - sum of the outer products of the rows
+
+    Outputs:
+    statMean - mean of each stat
+    eigenvalues - eigenvalues of the covariance (1/N normalization), in decreasing order
+    basis - eigenvectors (columns), in the same order, sign-normalized
+    '''
+    statMean = statSum/count
+    covMat = outerSum/count - np.outer(statMean,statMean)
+    eigenvalues,basis = np.linalg.eigh((covMat + covMat.T)/2) # increasing order
+    eigenvalues,basis = eigenvalues[::-1],basis[:,::-1]
+    largest = basis[np.argmax(np.abs(basis),axis=0),np.arange(basis.shape[1])]
+    return statMean,eigenvalues,basis*np.where(largest < 0,-1.,1.)
+
+class StatPCA:
+    '''
+    StatPCA holds the sufficient statistics of each season's team stats and the cached PCA.
+    '''
+    def __init__(self):
+        self.seasons = {} # season label -> (count, statSum, outerSum)
+        self._cache = {} # tuple of included seasons -> (statMean, eigenvalues, basis)
+
+    @classmethod
+    def fromTeamStats(cls,dfTeamData):
+        '''
+        fromTeamStats builds the statistics from a team stat table (columns Season and 'FG' to
+        'oppPTS', e.g. pyData/regSeasonData.h5 or GameStore.loadTeamStats()).
+        '''
+        pca = cls()
+        seasons = dfTeamData['Season'].astype(str).to_numpy()
+        stats = dfTeamData.loc[:,'FG':'oppPTS'].to_numpy(dtype=np.float64)
+        for season in dict.fromkeys(seasons):
+            pca.addSeason(season,stats[seasons == season])
+        return pca
+
+    def addSeason(self,season,teamRows):
+        '''
+        addSeason adds a season's team rows (teams x 42), replacing the season if already present.
+        '''
+        teamRows = np.asarray(teamRows,dtype=np.float64)
+        self.seasons[season] = (teamRows.shape[0],teamRows.sum(axis=0),teamRows.T @ teamRows)
+        self._cache = {}
+
+    def removeSeason(self,season):
+        del self.seasons[season]
+        self._cache = {}
+
+    def decomposition(self,exclude=()):
+        '''
+        decomposition returns (statMean, eigenvalues, basis) of the seasons not in exclude (see
+        decompose), computed once for each set of seasons.
+        '''
+        included = tuple(sorted(season for season in self.seasons if season not in exclude))
+        if included not in self._cache:
+            if not included:
+                raise ValueError('No seasons left for the PCA')
+            count = sum(self.seasons[season][0] for season in included)
+            statSum = sum(self.seasons[season][1] for season in included)
+            outerSum = sum(self.seasons[season][2] for season in included)
+            self._cache[included] = decompose(count,statSum,outerSum)
+        return self._cache[included]
+
+    def basis(self,nBasis=7,exclude=()):
+        '''
+        basis returns the mean of each stat and the top nBasis basis vectors (42 x nBasis) of the
+        seasons not in exclude, as HiFOTraining.generatePCAVectors.
+        '''
+        statMean,_,basis = self.decomposition(exclude)
+        return statMean,basis[:,:nBasis]
+
+    def explainedVariance(self,exclude=()):
+        '''explainedVariance returns the fraction of the variance of each basis vector'''
+        _,eigenvalues,_ = self.decomposition(exclude)
+        return eigenvalues/eigenvalues.sum()
+
+    def save(self,fileName):
+        '''save writes the sufficient statistics of every season to a .npz file'''
+        labels = list(self.seasons)
+        np.savez(fileName,seasons=np.array(labels),
+                 count=np.array([self.seasons[s][0] for s in labels]),
+                 statSum=np.array([self.seasons[s][1] for s in labels]),
+                 outerSum=np.array([self.seasons[s][2] for s in labels]))
+
+    @classmethod
+    def load(cls,fileName):
+        '''load reads the statistics written by save'''
+        pca = cls()
+        with np.load(fileName) as saved:
+            for season,count,statSum,outerSum in zip(saved['seasons'],saved['count'],saved['statSum'],saved['outerSum']):
+                pca.seasons[str(season)] = (int(count),statSum,outerSum)
+        return pca
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import StatPCA
+from StatPCA import StatPCA as SeasonStats
+
+'''
+Tests and benchmark of StatPCA against the PCA of generatePCAVectors as written in the notebooks
+(1/N Z^T Z, np.linalg.eig, argsort), on pyData/regSeasonData.h5.
+'''
+
+def notebookPCAVectors(dfTeamData,seasonToExclude):
+    '''generatePCAVectors as written in the notebooks (all eigenvalues and vectors, decreasing order)'''
+    dfTeamData = dfTeamData[dfTeamData['Season'] != seasonToExclude]
+    teamDataMat = (dfTeamData.loc[:,'FG':'oppPTS']).to_numpy(dtype=float)
+    statMean = np.mean(teamDataMat,axis=0)
+    teamDataZero = teamDataMat - statMean
+    N = teamDataZero.shape[0]
+    covMat = 1/N*np.dot(teamDataZero.T,teamDataZero)
+    covLam,covVec = np.linalg.eig(covMat)
+    inds = np.argsort(covLam)[::-1]
+    return statMean,covLam[inds].real,covVec[:,inds].real
+
+def testStatPCA():
+    '''
+    testStatPCA checks the decomposition against the notebook's, and that adding a season to the
+    statistics gives the same basis as starting from scratch.
+    '''
+    dfTeamData = pd.read_hdf('pyData/regSeasonData.h5')
+
+    # test 1: same PCA as the notebook, with the sign of each vector fixed
+    print('test 1')
+    pca = SeasonStats.fromTeamStats(dfTeamData)
+    statMean,eigenvalues,basis = pca.decomposition(exclude=['2000-01'])
+    expectedMean,expectedValues,expectedBasis = notebookPCAVectors(dfTeamData,'2000-01')
+    print('same mean and eigenvalues:',np.allclose(statMean,expectedMean),
+          np.allclose(eigenvalues,expectedValues,atol=1e-10)) # expected: True True
+    top = slice(0,10) # the smallest eigenvalues are nearly degenerate
+    print('same basis (up to sign):',np.allclose(np.abs(np.sum(basis[:,top]*expectedBasis[:,top],axis=0)),1.)) # expected: True
+    largest = basis[np.argmax(np.abs(basis),axis=0),np.arange(basis.shape[1])]
+    print('largest components positive:',(largest > 0).all()) # expected: True
+    print('generatePCAVectors:',np.array_equal(pca.basis(7,['2000-01'])[1],basis[:,:7])) # expected: True
+
+    # test 2: a new season added to the statistics
+    print('test 2')
+    previous = SeasonStats.fromTeamStats(dfTeamData[dfTeamData['Season'] != '2020-21'])
+    previous.decomposition()
+    newRows = dfTeamData[dfTeamData['Season'] == '2020-21'].loc[:,'FG':'oppPTS'].to_numpy()
+    previous.addSeason('2020-21',newRows)
+    updated = previous.decomposition()
+    full = pca.decomposition()
+    print('same as from scratch:',all(np.allclose(a,b) for a,b in zip(updated,full))) # expected: True
+    print('cached:',pca.decomposition() is full) # expected: True
+    previous.addSeason('2020-21',newRows + 1.) # revised season replaces the old rows
+    print('replaced season:',not np.allclose(previous.decomposition()[0],full[0])) # expected: True
+
+    # test 3: save and load the statistics
+    print('test 3')
+    with tempfile.TemporaryDirectory() as tmpDir:
+        fileName = os.path.join(tmpDir,'pca.npz')
+        pca.save(fileName)
+        loaded = SeasonStats.load(fileName)
+    print('same after loading:',all(np.array_equal(a,b) for a,b in zip(loaded.decomposition(['2000-01']),
+                                                                       pca.decomposition(['2000-01'])))) # expected: True
+
+def benchmarkStatPCA(nRepeats=100):
+    '''
+    benchmarkStatPCA times the notebook's PCA (recomputed from the team rows each time) against
+    adding a season to StatPCA and decomposing, and against a cached decomposition.
+    '''
+    dfTeamData = pd.read_hdf('pyData/regSeasonData.h5')
+    newRows = dfTeamData[dfTeamData['Season'] == '2020-21'].loc[:,'FG':'oppPTS'].to_numpy()
+    pca = SeasonStats.fromTeamStats(dfTeamData)
+    tic = time.perf_counter()
+    for _ in range(nRepeats):
+        notebookPCAVectors(dfTeamData,'2000-01')
+    print('notebook (eig, from the team rows): %.3f ms' % (1e3*(time.perf_counter() - tic)/nRepeats))
+    tic = time.perf_counter()
+    for _ in range(nRepeats):
+        pca.addSeason('2020-21',newRows)
+        pca.decomposition(['2000-01'])
+    print('StatPCA (add a season, eigh): %.3f ms' % (1e3*(time.perf_counter() - tic)/nRepeats))
+    tic = time.perf_counter()
+    for _ in range(nRepeats):
+        pca.decomposition(['2000-01'])
+    print('StatPCA (cached): %.4f ms' % (1e3*(time.perf_counter() - tic)/nRepeats))
+
+# run tests
+if __name__ == '__main__':
+    print('Test StatPCA')
+    testStatPCA()
+    print('###################################')
+    print('Benchmark StatPCA')
+    benchmarkStatPCA()